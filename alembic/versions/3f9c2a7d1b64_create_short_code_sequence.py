@@ -0,0 +1,26 @@
+"""Create short_code_seq sequence
+
+Revision ID: 3f9c2a7d1b64
+Revises: ea31bb950c5e
+Create Date: 2026-10-18 10:03:17.220941
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d1b64'
+down_revision: Union[str, None] = 'ea31bb950c5e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Used by the "counter" code allocation strategy to lease id blocks
+    op.execute("CREATE SEQUENCE IF NOT EXISTS short_code_seq START WITH 1 INCREMENT BY 1")
+
+
+def downgrade() -> None:
+    op.execute("DROP SEQUENCE IF EXISTS short_code_seq")
@@ -0,0 +1,120 @@
+"""Index clicks by url and time, optionally partition by month
+
+Revision ID: 5c7e1f3a9d28
+Revises: 8b2e6d4f0a13
+Create Date: 2026-10-18 12:41:05.118204
+
+Partitioning is opt-in, since it rewrites the whole table:
+
+    alembic -x partition_clicks=true upgrade head
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c7e1f3a9d28'
+down_revision: Union[str, None] = '8b2e6d4f0a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+def _partition_requested() -> bool:
+    value = context.get_x_argument(as_dictionary=True).get('partition_clicks', '')
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def _is_partitioned() -> bool:
+    return op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'clicks'"
+    )).scalar() is not None
+
+
+def _partition_clicks() -> None:
+    op.execute("ALTER TABLE clicks RENAME TO clicks_unpartitioned")
+    op.execute("ALTER TABLE clicks_unpartitioned RENAME CONSTRAINT clicks_pkey TO clicks_unpartitioned_pkey")
+    # The partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE clicks (
+            id INTEGER NOT NULL DEFAULT nextval('clicks_id_seq'),
+            url_id INTEGER NOT NULL REFERENCES urls (id),
+            ip_address VARCHAR(50),
+            user_agent TEXT,
+            referrer TEXT,
+            country VARCHAR(100),
+            clicked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, clicked_at)
+        ) PARTITION BY RANGE (clicked_at)
+    """)
+    # One partition per month from the oldest click to a few months ahead,
+    # plus a default partition so a missed month never rejects clicks
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month date;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce((SELECT min(clicked_at) FROM clicks_unpartitioned), now()) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF clicks FOR VALUES FROM (%L) TO (%L)',
+                    'clicks_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                    month, (month + interval '1 month')::date
+                );
+            END LOOP;
+        END $$
+    """)
+    op.execute("CREATE TABLE clicks_default PARTITION OF clicks DEFAULT")
+    op.execute("INSERT INTO clicks SELECT id, url_id, ip_address, user_agent, referrer, country, clicked_at FROM clicks_unpartitioned")
+    op.execute("ALTER SEQUENCE clicks_id_seq OWNED BY clicks.id")
+    op.execute("DROP TABLE clicks_unpartitioned")
+
+
+def _unpartition_clicks() -> None:
+    op.execute("ALTER TABLE clicks RENAME TO clicks_partitioned")
+    op.execute("ALTER TABLE clicks_partitioned RENAME CONSTRAINT clicks_pkey TO clicks_partitioned_pkey")
+    op.execute("""
+        CREATE TABLE clicks (
+            id INTEGER NOT NULL DEFAULT nextval('clicks_id_seq') PRIMARY KEY,
+            url_id INTEGER NOT NULL REFERENCES urls (id),
+            ip_address VARCHAR(50),
+            user_agent TEXT,
+            referrer TEXT,
+            country VARCHAR(100),
+            clicked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """)
+    op.execute("INSERT INTO clicks SELECT id, url_id, ip_address, user_agent, referrer, country, clicked_at FROM clicks_partitioned")
+    op.execute("ALTER SEQUENCE clicks_id_seq OWNED BY clicks.id")
+    op.execute("DROP TABLE clicks_partitioned")
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql' and _partition_requested():
+        _partition_clicks()
+        # Created on the parent and cascaded to every partition
+        op.create_index('ix_clicks_url_id_clicked_at', 'clicks', ['url_id', 'clicked_at'])
+        return
+    
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build without blocking click inserts on a live table
+        with context.get_context().autocommit_block():
+            op.create_index('ix_clicks_url_id_clicked_at', 'clicks', ['url_id', 'clicked_at'], postgresql_concurrently=True)
+    else:
+        op.create_index('ix_clicks_url_id_clicked_at', 'clicks', ['url_id', 'clicked_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_clicks_url_id_clicked_at', table_name='clicks')
+    if op.get_bind().dialect.name == 'postgresql' and _is_partitioned():
+        _unpartition_clicks()
@@ -0,0 +1,41 @@
+"""Index urls for keyset-paginated listing
+
+Revision ID: 6e1a3c8b5d47
+Revises: 9d4b7e2c6f15
+Create Date: 2026-10-18 17:26:43.905118
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1a3c8b5d47'
+down_revision: Union[str, None] = '9d4b7e2c6f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_urls_created_at_id', ['created_at', 'id'], {}),
+    ('ix_urls_is_active_created_at_id', ['is_active', 'created_at', 'id'], {}),
+    ('ix_urls_clicks_id', ['clicks', 'id'], {}),
+    ('ix_urls_expires_at', ['expires_at'], {'postgresql_where': sa.text('expires_at IS NOT NULL')}),
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build without blocking writes to a live table
+        with context.get_context().autocommit_block():
+            for name, columns, options in INDEXES:
+                op.create_index(name, 'urls', columns, postgresql_concurrently=True, **options)
+    else:
+        for name, columns, options in INDEXES:
+            op.create_index(name, 'urls', columns, **options)
+
+
+def downgrade() -> None:
+    for name, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='urls')
@@ -0,0 +1,56 @@
+"""Create click rollup tables
+
+Revision ID: 8b2e6d4f0a13
+Revises: 3f9c2a7d1b64
+Create Date: 2026-10-18 11:02:17.334912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e6d4f0a13'
+down_revision: Union[str, None] = '3f9c2a7d1b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('click_rollups_hourly',
+    sa.Column('url_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['url_id'], ['urls.id'], ),
+    sa.PrimaryKeyConstraint('url_id', 'bucket')
+    )
+    op.create_table('referrer_rollups_daily',
+    sa.Column('url_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('referrer', sa.String(length=512), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['url_id'], ['urls.id'], ),
+    sa.PrimaryKeyConstraint('url_id', 'day', 'referrer')
+    )
+
+    # Backfill from the existing raw clicks, bucketed in UTC like the ingestor does
+    op.execute("""
+        INSERT INTO click_rollups_hourly (url_id, bucket, clicks)
+        SELECT url_id, date_trunc('hour', clicked_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', count(*)
+        FROM clicks
+        GROUP BY 1, 2
+    """)
+    op.execute("""
+        INSERT INTO referrer_rollups_daily (url_id, day, referrer, clicks)
+        SELECT url_id, (clicked_at AT TIME ZONE 'UTC')::date, left(referrer, 512), count(*)
+        FROM clicks
+        WHERE referrer IS NOT NULL AND referrer <> ''
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('referrer_rollups_daily')
+    op.drop_table('click_rollups_hourly')
@@ -0,0 +1,27 @@
+"""Add urls.redirect_status
+
+Revision ID: 9d4b7e2c6f15
+Revises: 5c7e1f3a9d28
+Create Date: 2026-10-18 15:41:06.218457
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b7e2c6f15'
+down_revision: Union[str, None] = '5c7e1f3a9d28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A constant server default: no table rewrite on Postgres 11+
+    op.add_column('urls', sa.Column('redirect_status', sa.SmallInteger(), server_default='307', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('urls', 'redirect_status')
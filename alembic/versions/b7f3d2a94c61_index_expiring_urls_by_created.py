@@ -0,0 +1,34 @@
+"""Index expiring urls in created order
+
+Revision ID: b7f3d2a94c61
+Revises: 6e1a3c8b5d47
+Create Date: 2026-10-18 19:02:11.417630
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f3d2a94c61'
+down_revision: Union[str, None] = '6e1a3c8b5d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build without blocking writes to a live table
+        with context.get_context().autocommit_block():
+            op.create_index(
+                'ix_urls_expiring_created_at_id', 'urls', ['created_at', 'id'],
+                postgresql_where=sa.text('expires_at IS NOT NULL'), postgresql_concurrently=True,
+            )
+    else:
+        op.create_index('ix_urls_expiring_created_at_id', 'urls', ['created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_urls_expiring_created_at_id', table_name='urls')
@@ -0,0 +1,35 @@
+"""Lease short codes in blocks of one nextval each
+
+Revision ID: c4e8a1f2b9d3
+Revises: b7f3d2a94c61
+Create Date: 2026-10-18 19:48:35.602114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.config import get_settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f2b9d3'
+down_revision: Union[str, None] = 'b7f3d2a94c61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Each nextval now starts a block of CODE_BLOCK_SIZE ids. The next value
+    # jumps past everything handed out one by one before, so nothing repeats.
+    block_size = int(get_settings().code_block_size)
+    op.execute(f"ALTER SEQUENCE short_code_seq INCREMENT BY {block_size}")
+
+
+def downgrade() -> None:
+    # Skip the rest of the last leased block before counting one by one again
+    op.execute(
+        "SELECT setval('short_code_seq', last_value + increment_by) "
+        "FROM pg_sequences WHERE sequencename = 'short_code_seq' AND last_value IS NOT NULL"
+    )
+    op.execute("ALTER SEQUENCE short_code_seq INCREMENT BY 1")
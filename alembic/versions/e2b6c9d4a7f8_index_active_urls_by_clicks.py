@@ -0,0 +1,39 @@
+"""Index active urls by clicks, drop the expires_at index
+
+Revision ID: e2b6c9d4a7f8
+Revises: c4e8a1f2b9d3
+Create Date: 2026-10-18 21:14:37.268014
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b6c9d4a7f8'
+down_revision: Union[str, None] = 'c4e8a1f2b9d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build without blocking writes to a live table
+        with context.get_context().autocommit_block():
+            op.create_index(
+                'ix_urls_is_active_clicks_id', 'urls', ['is_active', 'clicks', 'id'], postgresql_concurrently=True,
+            )
+            # No listing order reads it: expires_before walks ix_urls_expiring_created_at_id
+            op.drop_index('ix_urls_expires_at', table_name='urls', postgresql_concurrently=True)
+    else:
+        op.create_index('ix_urls_is_active_clicks_id', 'urls', ['is_active', 'clicks', 'id'])
+        op.drop_index('ix_urls_expires_at', table_name='urls')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_urls_expires_at', 'urls', ['expires_at'], postgresql_where=sa.text('expires_at IS NOT NULL'),
+    )
+    op.drop_index('ix_urls_is_active_clicks_id', table_name='urls')
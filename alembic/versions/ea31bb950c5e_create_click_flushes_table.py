@@ -0,0 +1,31 @@
+"""Create click_flushes table
+
+Revision ID: ea31bb950c5e
+Revises: cd9f5a7c706a
+Create Date: 2026-10-18 09:12:44.508113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ea31bb950c5e'
+down_revision: Union[str, None] = 'cd9f5a7c706a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('click_flushes',
+    sa.Column('epoch', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.Column('flushed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('epoch')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('click_flushes')
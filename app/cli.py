@@ -0,0 +1,130 @@
+"""
+Maintenance commands.
+
+    python -m app.cli partitions create --months-ahead 3
+    python -m app.cli partitions prune --retain-months 12 [--dry-run]
+    python -m app.cli cache warm --top 10000 --days 7 [--time-budget 60]
+    python -m app.cli clicks export CODE [--format ndjson] [--since ISO] [--until ISO] [--gzip] [--include-pii] [-o FILE]
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from app.config import get_settings
+from app.database import ReadSessionLocal, close_db, init_db
+from app.redis_client import redis_manager
+from app.services.cache_warmer import warm_cache
+from app.services.click_export import MEDIA_TYPES, gzip_stream, stream_clicks
+from app.services.shortener import get_url_by_code
+from app.services.partitions import create_click_partitions, drop_click_partitions
+
+settings = get_settings()
+
+
+async def partitions_create(args: argparse.Namespace) -> None:
+    created = await create_click_partitions(args.months_ahead)
+    print(f"Created {len(created)} partition(s): {', '.join(created) or '-'}")
+
+
+async def partitions_prune(args: argparse.Namespace) -> None:
+    dropped = await drop_click_partitions(args.retain_months, dry_run=args.dry_run)
+    verb = "Would drop" if args.dry_run else "Dropped"
+    print(f"{verb} {len(dropped)} partition(s): {', '.join(dropped) or '-'}")
+
+
+async def cache_warm(args: argparse.Namespace) -> None:
+    await redis_manager.start()
+    if redis_manager.client is None:
+        raise SystemExit("REDIS_URL is not set: nothing to warm")
+    try:
+        result = await warm_cache(
+            args.top,
+            args.days,
+            batch_size=args.batch_size,
+            time_budget=args.time_budget,
+            progress=lambda warmed: print(f"  {warmed} links cached", flush=True),
+        )
+    finally:
+        await redis_manager.stop()
+    note = "" if result["complete"] else " (stopped at the time budget)"
+    print(f"Warmed {result['warmed']} link(s) in {result['seconds']:.1f}s{note}")
+
+
+async def clicks_export(args: argparse.Namespace) -> None:
+    async with ReadSessionLocal() as db:
+        url = await get_url_by_code(db, args.short_code)
+    if url is None:
+        raise SystemExit(f"No such short code: {args.short_code}")
+    
+    chunks = stream_clicks(url.id, args.since, args.until, args.format, args.batch_size, args.include_pii)
+    if args.gzip:
+        chunks = gzip_stream(chunks)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="URL shortener maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    partitions = commands.add_parser("partitions", help="Manage monthly clicks partitions")
+    actions = partitions.add_subparsers(dest="action", required=True)
+    
+    create = actions.add_parser("create", help="Create partitions ahead of time")
+    create.add_argument("--months-ahead", type=int, default=settings.click_partitions_ahead)
+    create.set_defaults(handler=partitions_create)
+    
+    prune = actions.add_parser("prune", help="Drop partitions past the retention window")
+    prune.add_argument("--retain-months", type=int, required=True)
+    prune.add_argument("--dry-run", action="store_true")
+    prune.set_defaults(handler=partitions_prune)
+    
+    cache = commands.add_parser("cache", help="Manage the URL cache")
+    cache_actions = cache.add_subparsers(dest="action", required=True)
+    
+    warm = cache_actions.add_parser("warm", help="Preload the most clicked links into Redis")
+    warm.add_argument("--top", type=int, default=settings.cache_warm_top_n)
+    warm.add_argument("--days", type=int, default=settings.cache_warm_days)
+    warm.add_argument("--batch-size", type=int, default=settings.cache_warm_batch_size)
+    warm.add_argument("--time-budget", type=float, default=None, help="Stop after this many seconds")
+    warm.set_defaults(handler=cache_warm)
+    
+    clicks = commands.add_parser("clicks", help="Raw click data")
+    clicks_actions = clicks.add_subparsers(dest="action", required=True)
+    
+    export = clicks_actions.add_parser("export", help="Stream a link's clicks as CSV or NDJSON")
+    export.add_argument("short_code")
+    export.add_argument("--format", choices=sorted(MEDIA_TYPES), default="csv")
+    export.add_argument("--since", type=datetime.fromisoformat, help="ISO timestamp, inclusive")
+    export.add_argument("--until", type=datetime.fromisoformat, help="ISO timestamp, exclusive")
+    export.add_argument("--gzip", action="store_true")
+    export.add_argument("--include-pii", action="store_true", help="Raw IP addresses and user agents instead of the visitor hash")
+    export.add_argument("--batch-size", type=int, default=settings.click_export_batch_size)
+    export.add_argument("-o", "--output", help="File to write (default: stdout)")
+    export.set_defaults(handler=clicks_export)
+    
+    return parser
+
+
+async def run(args: argparse.Namespace) -> None:
+    init_db()
+    try:
+        await args.handler(args)
+    finally:
+        await close_db()
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Literal
 
 
 class Settings(BaseSettings):
@@ -7,6 +8,138 @@ class Settings(BaseSettings):
     redis_url: str | None = None
     base_url: str = "http://localhost:8000"
 
+    # Server (python -m app.server); 0 workers means one per CPU
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    web_concurrency: int = 0
+    server_graceful_timeout: int = 20
+    forwarded_allow_ips: str = "127.0.0.1"
+
+    # Database pool; the replica (if set) serves read-only endpoints
+    database_replica_url: str | None = None
+    db_echo: bool = False
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    db_statement_cache_size: int = 100
+
+    # Shared Redis connection pool
+    redis_max_connections: int = 100
+    redis_socket_timeout: float = 5.0
+    redis_connect_timeout: float = 2.0
+    redis_health_check_interval: int = 30
+
+    # Rate limits per route: requests allowed per window (seconds), per client IP
+    rate_limit_enabled: bool = True
+    # "redis": every check hits Redis; "hybrid": local buckets synced with Redis
+    # every N requests or T ms; "local": per-worker buckets only
+    rate_limit_mode: Literal["redis", "hybrid", "local"] = "redis"
+    rate_limit_sync_every: int = 10
+    rate_limit_sync_interval_ms: int = 500
+    rate_limit_local_max_keys: int = 10000
+    rate_limit_redirect_requests: int = 10
+    rate_limit_redirect_window: int = 60
+    rate_limit_shorten_requests: int = 5
+    rate_limit_shorten_window: int = 60
+    rate_limit_bulk_requests: int = 5
+    rate_limit_bulk_window: int = 60
+    rate_limit_export_requests: int = 5
+    rate_limit_export_window: int = 60
+
+    # Short code allocation
+    code_strategy: Literal["random", "counter"] = "random"
+    code_length: int = 7
+    code_counter_backend: Literal["postgres", "redis"] = "postgres"
+    code_block_size: int = 1000
+    code_shuffle_key: str | None = None
+
+    # Bulk shortening
+    bulk_shorten_max_items: int = 10000
+
+    # Batch stats: codes per request, and per DB query / Redis MGET
+    stats_batch_max_codes: int = 10000
+    stats_batch_chunk_size: int = 500
+
+    # In-process L1 cache in front of Redis, per worker
+    l1_cache_enabled: bool = True
+    l1_cache_max_items: int = 10000
+    l1_cache_max_bytes: int = 16 * 1024 * 1024
+    l1_cache_ttl: float = 60.0
+
+    # Redis URL cache lifetime. Jitter (a fraction of the TTL) spreads the
+    # expiry of links cached together; beta > 0 enables probabilistic early
+    # refresh of entries close to expiry (0 disables it)
+    cache_ttl: int = 3600
+    cache_ttl_jitter: float = 0.1
+    cache_early_refresh_beta: float = 1.0
+
+    # Preload the most clicked links into Redis and L1 when a worker starts
+    cache_warm_on_startup: bool = False
+    cache_warm_top_n: int = 10000
+    cache_warm_days: int = 7
+    cache_warm_batch_size: int = 500
+    cache_warm_time_budget: float = 10.0
+
+    # Negative caching and the Bloom filter of existing short codes
+    negative_cache_ttl: int = 30
+    code_filter_enabled: bool = False
+    code_filter_capacity: int = 1_000_000
+    code_filter_error_rate: float = 0.001
+
+    # Click ingestion: redirects enqueue clicks, a background worker writes them in batches
+    click_queue_size: int = 10000
+    click_batch_size: int = 500
+    click_flush_interval: float = 1.0
+    click_overflow_policy: Literal["drop", "block", "spill"] = "drop"
+    click_block_timeout: float = 0.05
+    click_spill_path: str = "clicks-spill.ndjson"
+    click_drain_timeout: float = 10.0
+    click_use_copy: bool = True
+
+    # Write-back of Redis click counters into urls.clicks
+    click_counter_flush_interval: float = 30.0
+    click_counter_flush_batch_size: int = 500
+
+    # Monthly click partitions (only when clicks was migrated with -x partition_clicks=true)
+    click_partitions_ahead: int = 3
+    click_partition_check_interval: float = 6 * 3600
+
+    # Serve cache-hit redirects from a raw ASGI handler ahead of FastAPI routing
+    fast_redirect_enabled: bool = True
+
+    # HTTP caching: max-age of 301/308 redirects, and of /stats and /analytics
+    # responses (which also carry an ETag)
+    permanent_redirect_max_age: int = 86400
+    read_cache_max_age: int = 5
+
+    # Latency histograms, hot-path timers and /metrics; false removes all of it
+    metrics_enabled: bool = True
+
+    # Analytics read from the hourly/daily rollups; "raw" scans the clicks table instead
+    analytics_source: Literal["rollup", "raw"] = "rollup"
+    # Longest window /analytics accepts, in days
+    analytics_max_days: int = 365
+
+    # Analytics results cached in Redis per (url, days) and invalidated by new
+    # clicks; a positive max staleness serves results up to that many seconds
+    # old even after new clicks
+    analytics_cache_enabled: bool = True
+    analytics_cache_ttl: int = 60
+    analytics_cache_max_staleness: float = 0.0
+    # Results for a version younger than this many seconds are computed on the
+    # primary: the replica may not have the clicks that version stands for yet
+    analytics_replica_lag: float = 5.0
+
+    # Redis sketches: HyperLogLog unique visitors and top-K referrers per URL per day
+    analytics_sketches_enabled: bool = True
+    sketch_top_k: int = 100
+    sketch_ttl_days: int = 90
+
+    # Rows fetched per round trip when streaming a click export
+    click_export_batch_size: int = 1000
+
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -14,4 +147,4 @@ class Settings(BaseSettings):
 
 @lru_cache
 def get_settings() -> Settings:
-    return Settings()
\ No newline at end of file
+    return Settings()
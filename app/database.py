@@ -1,17 +1,101 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from dataclasses import dataclass
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import get_settings
+import time
 
 settings = get_settings()
 
-engine = create_async_engine(settings.database_url, echo=True)
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+# Keyed by the pool's logging name, so stats survive pool.recreate()
+POOL_STATS: dict[str, PoolStats] = {}
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        stats = POOL_STATS.setdefault(self._orig_logging_name or "default", PoolStats())
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            stats.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            stats.checkouts += 1
+            stats.wait_seconds += waited
+            stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+
+
+def build_engine(url: str, name: str) -> AsyncEngine:
+    options = {"echo": settings.db_echo}
+    if not url.startswith("sqlite"):
+        options.update(
+            poolclass=InstrumentedPool,
+            pool_logging_name=name,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_pre_ping=settings.db_pool_pre_ping,
+            pool_recycle=settings.db_pool_recycle,
+        )
+    if url.startswith("postgresql+asyncpg"):
+        # 0 disables prepared statements, needed behind pgbouncer in transaction mode
+        options["connect_args"] = {"prepared_statement_cache_size": settings.db_statement_cache_size}
+    return create_async_engine(url, **options)
+
+
+# Engines are created per process in the app lifespan (init_db), never at
+# import time, so a preloading or forking server doesn't share pools across
+# workers. The sessionmakers are bound once the engines exist.
+engine: AsyncEngine | None = None
+
+# Read-only endpoints go to the replica when one is configured
+replica_engine: AsyncEngine | None = None
 
 AsyncSessionLocal = async_sessionmaker(
-    bind=engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
 
+ReadSessionLocal = async_sessionmaker(
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+def init_db() -> AsyncEngine:
+    """Create this process's engines and bind the session factories to them."""
+    global engine, replica_engine
+    if engine is None:
+        engine = build_engine(settings.database_url, "primary")
+        if settings.database_replica_url:
+            replica_engine = build_engine(settings.database_replica_url, "replica")
+        AsyncSessionLocal.configure(bind=engine)
+        ReadSessionLocal.configure(bind=replica_engine or engine)
+    return engine
+
+
+async def close_db() -> None:
+    global engine, replica_engine
+    for db_engine in (replica_engine, engine):
+        if db_engine is not None:
+            await db_engine.dispose()
+    engine = replica_engine = None
+
 
 class Base(DeclarativeBase):
     pass
@@ -24,4 +108,42 @@ async def get_db():
             await session.commit()
         except Exception:
             await session.rollback()
-            raise
\ No newline at end of file
+            raise
+
+
+async def get_read_db():
+    """Session for read-only endpoints; nothing is committed."""
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+def is_replica_session(db: AsyncSession) -> bool:
+    return replica_engine is not None and db.bind is replica_engine
+
+
+def pool_status() -> dict[str, dict]:
+    """Current size and saturation of each instrumented pool, by name."""
+    status = {}
+    for name, db_engine in (("primary", engine), ("replica", replica_engine)):
+        if db_engine is None or not isinstance(db_engine.pool, InstrumentedPool):
+            continue
+        pool = db_engine.pool
+        stats = POOL_STATS.get(name, PoolStats())
+        status[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "capacity": pool.size() + settings.db_max_overflow,
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "wait_seconds": stats.wait_seconds,
+            "max_wait_seconds": stats.max_wait_seconds,
+        }
+    return status
+
+
+def dialect_insert(db: AsyncSession):
+    """Dialect-specific INSERT construct, for ON CONFLICT support."""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
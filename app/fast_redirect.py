@@ -0,0 +1,62 @@
+"""
+Raw ASGI fast path for GET /{short_code}.
+
+Cache-resolvable redirects are answered here, ahead of FastAPI's routing,
+dependency injection and exception handling: the code is checked against
+the app's own single-segment paths, looked up in the cache (with the
+rate-limit check in the same Redis round trip), the click is enqueued and
+the 307 is sent. Only a cache miss continues into the app, where the
+redirect_to_url route loads the link from the database, reusing the
+lookup made here instead of repeating it.
+"""
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from app.routers.urls import FAST_REDIRECT_LOOKUP, finish_redirect, lookup_redirect, redirect_to_url
+
+
+class FastRedirectMiddleware:
+    def __init__(self, app, api):
+        self.app = app
+        # The FastAPI app, read on the first request once every route is registered
+        self.api = api
+        self._reserved: set[str] | None = None
+        self._route = None
+
+    def _load_routes(self) -> None:
+        # Static one-segment paths (/health, /shorten, /docs, ...) are never short codes
+        self._reserved = {
+            route.path[1:] for route in self.api.routes
+            if "{" not in route.path and route.path.count("/") == 1
+        }
+        self._route = next(
+            route for route in self.api.routes if getattr(route, "endpoint", None) is redirect_to_url
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        if self._reserved is None:
+            self._load_routes()
+
+        short_code = scope["path"][1:]
+        if not short_code or "/" in short_code or short_code in self._reserved:
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope, receive)
+        try:
+            lookup = await lookup_redirect(short_code, request)
+            if lookup.entry is None:
+                scope[FAST_REDIRECT_LOOKUP] = lookup
+                await self.app(scope, receive, send)
+                return
+            response = await finish_redirect(short_code, request, lookup)
+        except HTTPException as e:
+            # Same body as FastAPI's HTTPException handler
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+
+        # Lets MetricsMiddleware label the request with the redirect route
+        scope["route"] = self._route
+        await response(scope, receive, send)
@@ -1,21 +1,81 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.config import get_settings
+from app.database import close_db, init_db
+from app.fast_redirect import FastRedirectMiddleware
+from app.instrumentation import MetricsMiddleware
+from app.redis_client import redis_manager
 from app.routers import urls
+from app.services.click_ingestion import click_ingestor
+from app.services.click_counters import click_counter_flusher
+from app.services.cache import invalidation_listener
+from app.services.cache_warmer import warm_cache
+from app.services.partitions import click_partition_maintainer
+from app.metrics import render_metrics
+import logging
+
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Per-process resources: each worker opens its own pools and background tasks
+    init_db()
+    await redis_manager.start()
+    await click_ingestor.start()
+    await click_counter_flusher.start()
+    # Also builds the code filter, once subscribed to new-code announcements
+    await invalidation_listener.start()
+    await click_partition_maintainer.start()
+    if settings.cache_warm_on_startup:
+        try:
+            await warm_cache(
+                settings.cache_warm_top_n,
+                settings.cache_warm_days,
+                batch_size=settings.cache_warm_batch_size,
+                time_budget=settings.cache_warm_time_budget,
+                fill_local=True,
+            )
+        except Exception as e:
+            logger.warning(f"Cache warm-up failed, starting cold: {e}")
+    yield
+    await click_partition_maintainer.stop()
+    await invalidation_listener.stop()
+    # Drain queued clicks and write back counters before the process exits
+    await click_ingestor.stop(timeout=settings.click_drain_timeout)
+    await click_counter_flusher.stop()
+    await redis_manager.stop()
+    await close_db()
+
+
 app = FastAPI(
     title="URL Shortener API",
     description="A high-performance URL shortener with analytics",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
-app.include_router(urls.router)
-
+# Registered before the URLs router so /{short_code} doesn't shadow them
 @app.get("/")
 async def root():
     return {"message": "URL Shortener API", "status": "running"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+# Added first so MetricsMiddleware wraps it and times fast redirects too
+if settings.fast_redirect_enabled:
+    app.add_middleware(FastRedirectMiddleware, api=app)
+
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    async def metrics():
+        return render_metrics()
+
+app.include_router(urls.router)
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""Prometheus text exposition of the app's internal counters and gauges."""
+from app.database import pool_status
+from app.instrumentation import INSTRUMENTS, cache_lookups
+from app.redis_client import redis_manager
+from app.services.cache import local_cache
+from app.services.click_ingestion import click_ingestor
+from app.services.code_filter import code_filter
+
+PREFIX = "url_shortener"
+
+
+def _samples():
+    """
+    Yield (name, type, help, value) for every exported metric.
+
+    `value` is a number, or a list of (labels, number) for labelled series.
+    """
+    ingest = click_ingestor.stats()
+    yield "click_ingest_queued_total", "counter", "Click events accepted into the queue", ingest["queued"]
+    yield "click_ingest_flushed_total", "counter", "Click rows written to the database", ingest["flushed"]
+    yield "click_ingest_dropped_total", "counter", "Click events dropped on overflow", ingest["dropped"]
+    yield "click_ingest_spilled_total", "counter", "Click events spilled to disk", ingest["spilled"]
+    yield "click_ingest_failed_total", "counter", "Click rows lost to write errors", ingest["failed"]
+    yield "click_ingest_quarantined_total", "counter", "Click rows set aside after failing to write", ingest["quarantined"]
+    yield "click_ingest_queue_depth", "gauge", "Click events waiting to be written", ingest["queue_depth"]
+
+    lookups = sum(cache_lookups.series.values())
+    answered = lookups - cache_lookups.value("miss") - cache_lookups.value("refresh")
+    yield "cache_hit_ratio", "gauge", "Share of URL lookups answered without the database", answered / lookups if lookups else 0
+
+    l1 = local_cache.stats()
+    yield "l1_cache_hits_total", "counter", "L1 cache hits", l1["hits"]
+    yield "l1_cache_misses_total", "counter", "L1 cache misses", l1["misses"]
+    yield "l1_cache_evictions_total", "counter", "L1 cache evictions", l1["evictions"]
+    yield "l1_cache_items", "gauge", "Entries held in the L1 cache", l1["items"]
+    yield "l1_cache_bytes", "gauge", "Approximate memory used by the L1 cache", l1["bytes"]
+
+    pools = pool_status()
+    if pools:
+        def by_pool(field):
+            return [({"pool": name}, pool[field]) for name, pool in pools.items()]
+        yield "db_pool_size", "gauge", "Persistent connections in the pool", by_pool("size")
+        yield "db_pool_capacity", "gauge", "Pool size plus max overflow", by_pool("capacity")
+        yield "db_pool_checked_out", "gauge", "Connections currently in use", by_pool("checked_out")
+        yield "db_pool_overflow", "gauge", "Overflow connections currently open", by_pool("overflow")
+        yield "db_pool_checkouts_total", "counter", "Connection checkouts", by_pool("checkouts")
+        yield "db_pool_checkout_timeouts_total", "counter", "Checkouts that timed out waiting for a connection", by_pool("timeouts")
+        yield "db_pool_checkout_wait_seconds_total", "counter", "Time spent waiting for a connection", by_pool("wait_seconds")
+        yield "db_pool_checkout_wait_seconds_max", "gauge", "Longest wait for a connection", by_pool("max_wait_seconds")
+
+    redis_pool = redis_manager.stats()
+    yield "redis_pool_connections_in_use", "gauge", "Redis connections checked out", redis_pool["connections_in_use"]
+    yield "redis_pool_connections_idle", "gauge", "Idle Redis connections in the pool", redis_pool["connections_idle"]
+    yield "redis_pool_max_connections", "gauge", "Redis connection pool limit", redis_pool["max_connections"]
+
+    if code_filter.enabled:
+        bloom = code_filter.stats()
+        yield "code_filter_ready", "gauge", "1 when the code filter answers lookups", int(bloom["ready"])
+        yield "code_filter_items", "gauge", "Estimated short codes in the filter", bloom["items"]
+        yield "code_filter_memory_bytes", "gauge", "Size of the code filter bit array", bloom["memory_bytes"]
+        yield "code_filter_false_positive_rate", "gauge", "Current false-positive probability", bloom["false_positive_rate"]
+
+
+def render_metrics() -> str:
+    lines = []
+    for name, kind, help_text, value in _samples():
+        name = f"{PREFIX}_{name}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if isinstance(value, list):
+            for labels, sample in value:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {sample}")
+        else:
+            lines.append(f"{name} {value}")
+    for instrument in INSTRUMENTS:
+        lines.extend(instrument.render(PREFIX))
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,6 @@
 from app.models.url import URL
 from app.models.click import Click
+from app.models.click_flush import ClickFlush
+from app.models.click_rollup import ClickHourly, ReferrerDaily
 
-__all__ = ["URL","Click"]
\ No newline at end of file
+__all__ = ["URL","Click","ClickFlush","ClickHourly","ReferrerDaily"]
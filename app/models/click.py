@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, DateTime, ForeignKey, Text
+from sqlalchemy import String, Integer, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 from app.database import Base
@@ -7,6 +7,10 @@ from datetime import datetime
 
 class Click(Base):
     __tablename__ = "clicks"
+    __table_args__ = (
+        # Serves per-URL analytics over a time window
+        Index("ix_clicks_url_id_clicked_at", "url_id", "clicked_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     url_id: Mapped[int] = mapped_column(Integer, ForeignKey("urls.id"), nullable=False)
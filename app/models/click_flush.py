@@ -0,0 +1,13 @@
+from sqlalchemy import BigInteger, Integer, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from app.database import Base
+from datetime import datetime
+
+
+class ClickFlush(Base):
+    __tablename__ = "click_flushes"
+
+    epoch: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    clicks: Mapped[int] = mapped_column(Integer, nullable=False)
+    flushed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,21 @@
+from sqlalchemy import Integer, DateTime, Date, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+from datetime import date, datetime
+
+
+class ClickHourly(Base):
+    __tablename__ = "click_rollups_hourly"
+
+    url_id: Mapped[int] = mapped_column(Integer, ForeignKey("urls.id"), primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    clicks: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class ReferrerDaily(Base):
+    __tablename__ = "referrer_rollups_daily"
+
+    url_id: Mapped[int] = mapped_column(Integer, ForeignKey("urls.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    referrer: Mapped[str] = mapped_column(String(512), primary_key=True)
+    clicks: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
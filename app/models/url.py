@@ -1,12 +1,21 @@
-from sqlalchemy import String, Integer, DateTime, Text, Boolean
+from sqlalchemy import String, Integer, SmallInteger, DateTime, Text, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from app.database import Base
 from datetime import datetime
 
 
 class URL(Base):
     __tablename__ = "urls"
+    __table_args__ = (
+        # Keyset pagination of GET /urls, in either sort order
+        Index("ix_urls_created_at_id", "created_at", "id"),
+        Index("ix_urls_is_active_created_at_id", "is_active", "created_at", "id"),
+        Index("ix_urls_clicks_id", "clicks", "id"),
+        Index("ix_urls_is_active_clicks_id", "is_active", "clicks", "id"),
+        # expires_before in created order walks only the links that can expire
+        Index("ix_urls_expiring_created_at_id", "created_at", "id", postgresql_where=text("expires_at IS NOT NULL")),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     short_code: Mapped[str] = mapped_column(String(20), unique=True, index=True, nullable=False)
@@ -14,5 +23,7 @@ class URL(Base):
     clicks: Mapped[int] = mapped_column(Integer, default=0)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # 307 counts every click; 301/308 let browsers and CDNs cache the redirect
+    redirect_status: Mapped[int] = mapped_column(SmallInteger, default=307, server_default="307", nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
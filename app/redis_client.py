@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import redis.asyncio as redis
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+class RedisBatch:
+    """
+    Request-scoped pipeline. Commands are awaited like on a normal client,
+    but everything queued in the same event-loop tick (e.g. from calls run
+    with asyncio.gather) is sent as one pipelined round trip.
+
+    Batching is only an optimisation: a command queued late just goes out in
+    the next round trip.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self._client = client
+        self._queued: list[tuple[str, tuple, dict, asyncio.Future]] = []
+        self._flush_task: asyncio.Task | None = None
+        self.round_trips = 0
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or not callable(getattr(self._client, name, None)):
+            raise AttributeError(name)
+
+        async def command(*args, **kwargs):
+            future = asyncio.get_running_loop().create_future()
+            self._queued.append((name, args, kwargs, future))
+            if self._flush_task is None:
+                # Runs after every task already scheduled has queued its commands
+                self._flush_task = asyncio.create_task(self._flush())
+            return await future
+
+        return command
+
+    async def _flush(self) -> None:
+        queued, self._queued, self._flush_task = self._queued, [], None
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                for name, args, kwargs, _ in queued:
+                    getattr(pipe, name)(*args, **kwargs)
+                results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            results = [e] * len(queued)
+        self.round_trips += 1
+
+        for (_, _, _, future), result in zip(queued, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class RedisManager:
+    """The app's single Redis connection pool, shared by the cache, rate limiter and workers."""
+
+    def __init__(
+        self,
+        url: str | None,
+        max_connections: int = 100,
+        socket_timeout: float | None = 5.0,
+        connect_timeout: float | None = 2.0,
+        health_check_interval: int = 30,
+    ):
+        self.url = url
+        self.max_connections = max_connections
+        self.socket_timeout = socket_timeout
+        self.connect_timeout = connect_timeout
+        self.health_check_interval = health_check_interval
+        self.client: redis.Redis | None = None
+
+    async def start(self) -> None:
+        if self.client is not None or not self.url:
+            return
+        pool = redis.ConnectionPool.from_url(
+            self.url,
+            decode_responses=True,
+            max_connections=self.max_connections,
+            socket_timeout=self.socket_timeout,
+            socket_connect_timeout=self.connect_timeout,
+            health_check_interval=self.health_check_interval,
+        )
+        self.client = redis.Redis(connection_pool=pool)
+        try:
+            await self.client.ping()
+        except Exception as e:
+            # Keep the client: callers already degrade per command while Redis is down
+            logger.warning(f"Redis not available: {e}")
+
+    async def stop(self) -> None:
+        if self.client is None:
+            return
+        client, self.client = self.client, None
+        await client.aclose()
+        await client.connection_pool.disconnect()
+
+    def batch(self) -> RedisBatch | None:
+        """A pipeline for one request, or None when Redis isn't configured."""
+        return RedisBatch(self.client) if self.client is not None else None
+
+    def stats(self) -> dict:
+        if self.client is None:
+            return {"connections_in_use": 0, "connections_idle": 0, "max_connections": self.max_connections}
+        pool = self.client.connection_pool
+        return {
+            "connections_in_use": len(getattr(pool, "_in_use_connections", ())),
+            "connections_idle": len(getattr(pool, "_available_connections", ())),
+            "max_connections": self.max_connections,
+        }
+
+
+redis_manager = RedisManager(
+    settings.redis_url,
+    max_connections=settings.redis_max_connections,
+    socket_timeout=settings.redis_socket_timeout,
+    connect_timeout=settings.redis_connect_timeout,
+    health_check_interval=settings.redis_health_check_interval,
+)
@@ -1,55 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from app.database import get_db
-from app.schemas.url import URLCreate, URLResponse, URLStats, URLAnalytics
+from typing import Literal
+import asyncio
+import base64
+import json
+from app.config import get_settings
+from app.database import AsyncSessionLocal, ReadSessionLocal, get_db, get_read_db, is_replica_session
+from app.redis_client import redis_manager
+from app.models.url import URL
+from app.schemas.url import (
+    URLCreate,
+    URLResponse,
+    URLListResponse,
+    URLStats,
+    URLAnalytics,
+    BatchStatsRequest,
+    BatchStatsResponse,
+    BulkURLResult,
+    BulkURLResponse,
+)
 from app.services.shortener import (
+    ShortCodeTakenError,
     create_short_url,
+    create_short_urls,
     get_url_by_code,
+    find_url_for_read,
+    list_urls,
+    load_url_entry,
     build_short_url,
 )
 from app.services.cache import (
-    get_cached_url,
+    MISSING,
+    get_local_url,
+    get_remote_url,
     set_cached_url,
-    delete_cached_url,
+    set_cached_urls,
+    replace_cached_url,
     increment_clicks_cache,
-    get_cached_clicks,
 )
-from app.services.rate_limiter import rate_limit_shorten, rate_limit_by_ip
-from app.services.analytics import record_click, get_click_analytics
+from app.services.click_counters import get_total_clicks, get_total_clicks_many
+from app.services.rate_limiter import (
+    RateLimitResult,
+    apply_rate_limit_headers,
+    rate_limit_shorten,
+    rate_limit_shorten_bulk,
+    rate_limit_by_ip,
+    rate_limit_export,
+)
+from app.services.analytics import click_from_request, record_click
+from app.services.analytics_cache import get_cached_click_analytics
+from app.services.sketches import get_unique_visitors, get_top_referrers
+from app.services.click_export import MEDIA_TYPES, gzip_stream, stream_clicks
+from app.services.http_cache import cache_headers, etag_matches, get_analytics_version, make_etag, not_modified
+from app.services.rollups import hour_bucket
 
 router = APIRouter(tags=["URLs"])
+settings = get_settings()
 
+# Scope key under which the ASGI fast path passes its cache lookup to the route
+FAST_REDIRECT_LOOKUP = "app.redirect_lookup"
 
-@router.post("/shorten", response_model=URLResponse, status_code=status.HTTP_201_CREATED)
-async def shorten_url(
-    url_data: URLCreate,
-    request: Request,
-    db: AsyncSession = Depends(get_db),
-):
-    # Rate limit: 5 URLs per minute
-    await rate_limit_shorten(request)
-    
-    # Check if custom code already exists
-    if url_data.custom_code:
-        existing = await get_url_by_code(db, url_data.custom_code)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Custom code already in use",
-            )
-    
-    url = await create_short_url(
-        db=db,
-        original_url=str(url_data.url),
-        custom_code=url_data.custom_code,
-        expires_at=url_data.expires_at,
+
+def to_url_stats(url: URL, clicks: int) -> URLStats:
+    return URLStats(
+        short_code=url.short_code,
+        original_url=url.original_url,
+        clicks=clicks,
+        created_at=url.created_at,
+        expires_at=url.expires_at,
+        is_active=url.is_active,
     )
-    
-    # Cache the URL immediately
-    await set_cached_url(url.short_code, url.original_url)
-    
+
+
+def to_url_response(url: URL) -> URLResponse:
     return URLResponse(
         short_code=url.short_code,
         short_url=build_short_url(url.short_code),
@@ -57,72 +85,356 @@ async def shorten_url(
         clicks=url.clicks,
         is_active=url.is_active,
         expires_at=url.expires_at,
+        redirect_status=url.redirect_status,
         created_at=url.created_at,
     )
 
 
-@router.get("/{short_code}")
-async def redirect_to_url(
-    short_code: str,
+@router.post("/shorten", response_model=URLResponse, status_code=status.HTTP_201_CREATED)
+async def shorten_url(
+    url_data: URLCreate,
     request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
 ):
-    # Rate limit: 10 requests per minute
-    await rate_limit_by_ip(request)
-    
-    # Try cache first (fast path)
-    cached_url = await get_cached_url(short_code)
-    
-    if cached_url:
-        # Increment clicks in Redis
-        await increment_clicks_cache(short_code)
-        
-        # Record detailed analytics (get url_id from db)
-        url = await get_url_by_code(db, short_code)
-        if url:
-            await record_click(db, url.id, request)
-        
-        return RedirectResponse(url=cached_url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
-    
-    # Cache miss - check database
-    url = await get_url_by_code(db, short_code)
+    # Rate limit: 5 URLs per minute by default
+    rate_limit = await rate_limit_shorten(request)
+    apply_rate_limit_headers(response, rate_limit)
     
-    if not url:
+    try:
+        url = await create_short_url(
+            db=db,
+            original_url=str(url_data.url),
+            custom_code=url_data.custom_code,
+            expires_at=url_data.expires_at,
+            redirect_status=url_data.redirect_status,
+        )
+    except ShortCodeTakenError:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="URL not found",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Custom code already in use",
         )
     
-    if not url.is_active:
+    # Cache the URL immediately
+    await set_cached_url(url)
+    
+    return to_url_response(url)
+
+
+async def read_bulk_items(request: Request) -> list:
+    """Read a JSON array or an NDJSON stream of URLCreate objects."""
+    max_items = settings.bulk_shorten_max_items
+    too_many = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"At most {max_items} URLs per request",
+    )
+    
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            items = []
+            buffer = b""
+            async for chunk in request.stream():
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                items.extend(json.loads(line) for line in lines if line.strip())
+                if len(items) > max_items:
+                    raise too_many
+            if buffer.strip():
+                items.append(json.loads(buffer))
+        else:
+            items = json.loads(await request.body())
+    except ValueError:
         raise HTTPException(
-            status_code=status.HTTP_410_GONE,
-            detail="URL has been deactivated",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body must be a JSON array or NDJSON",
         )
     
-    if url.expires_at and url.expires_at < datetime.now(timezone.utc):
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body must be a JSON array or NDJSON",
+        )
+    if len(items) > max_items:
+        raise too_many
+    return items
+
+
+def _validation_message(error: ValidationError) -> str:
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"])
+    return f"{location}: {first['msg']}" if location else first["msg"]
+
+
+@router.post("/shorten/bulk", response_model=BulkURLResponse)
+async def shorten_urls_bulk(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    # One rate-limit check for the whole batch
+    rate_limit = await rate_limit_shorten_bulk(request)
+    apply_rate_limit_headers(response, rate_limit)
+    
+    raw_items = await read_bulk_items(request)
+    
+    results = [BulkURLResult(index=i) for i in range(len(raw_items))]
+    valid = []
+    for i, raw in enumerate(raw_items):
+        try:
+            item = URLCreate.model_validate(raw)
+        except ValidationError as e:
+            results[i].error = _validation_message(e)
+            continue
+        valid.append((i, {
+            "original_url": str(item.url),
+            "custom_code": item.custom_code,
+            "expires_at": item.expires_at,
+            "redirect_status": item.redirect_status,
+        }))
+    
+    created = await create_short_urls(db, [item for _, item in valid])
+    
+    urls = []
+    for (i, _), outcome in zip(valid, created):
+        if isinstance(outcome, URL):
+            results[i].url = to_url_response(outcome)
+            urls.append(outcome)
+        elif isinstance(outcome, ShortCodeTakenError):
+            results[i].error = "Custom code already in use"
+        else:
+            results[i].error = str(outcome)
+    
+    # Warm the cache with one pipelined round trip
+    await set_cached_urls(urls)
+    
+    return BulkURLResponse(
+        created=len(urls),
+        failed=len(results) - len(urls),
+        results=results,
+    )
+
+
+def encode_cursor(sort: str, url: URL) -> str:
+    value = url.created_at.isoformat() if sort == "created" else url.clicks
+    raw = json.dumps([sort, value, url.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    """The (sort value, id) key a cursor points past. Raises 400 for cursors of another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, last_id = json.loads(raw)
+        if cursor_sort != sort:
+            raise ValueError(cursor_sort)
+        value = datetime.fromisoformat(value) if sort == "created" else int(value)
+        return value, int(last_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+# Registered before /{short_code}, which would otherwise match /urls
+@router.get("/urls", response_model=URLListResponse)
+async def list_urls_page(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+    sort: Literal["created", "clicks"] = "created",
+    is_active: bool | None = None,
+    expires_before: datetime | None = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Keyset pagination: each page seeks past the previous page's last row
+    after = decode_cursor(cursor, sort) if cursor else None
+    urls = await list_urls(db, limit + 1, sort, after, is_active, expires_before)
+    
+    next_cursor = encode_cursor(sort, urls[limit - 1]) if len(urls) > limit else None
+    return URLListResponse(
+        items=[to_url_response(url) for url in urls[:limit]],
+        next_cursor=next_cursor,
+    )
+
+
+async def collect_stats(db: AsyncSession, short_codes: list[str]) -> dict[str, URLStats]:
+    """Stats for the codes that exist: one URL query and one Redis round trip."""
+    totals = await get_total_clicks_many(db, short_codes)
+    if is_replica_session(db) and len(totals) < len(short_codes):
+        # Recheck codes a lagging replica hasn't seen yet
+        found = {url.short_code for url, _ in totals}
+        async with AsyncSessionLocal() as primary:
+            totals += await get_total_clicks_many(primary, [code for code in short_codes if code not in found])
+    return {url.short_code: to_url_stats(url, clicks) for url, clicks in totals}
+
+
+async def stream_batch_stats(short_codes: list[str]):
+    """NDJSON, one line per code in request order, computed one chunk at a time."""
+    chunk_size = settings.stats_batch_chunk_size
+    # Own session: a streamed response outlives the request's dependencies
+    async with ReadSessionLocal() as db:
+        for i in range(0, len(short_codes), chunk_size):
+            chunk = short_codes[i:i + chunk_size]
+            stats = await collect_stats(db, chunk)
+            lines = [
+                stats[code].model_dump_json() if code in stats
+                else json.dumps({"short_code": code, "error": "URL not found"})
+                for code in chunk
+            ]
+            yield ("\n".join(lines) + "\n").encode()
+
+
+@router.post("/stats/batch", response_model=BatchStatsResponse)
+async def get_url_stats_batch(
+    body: BatchStatsRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+):
+    short_codes = list(dict.fromkeys(body.short_codes))
+    max_codes = settings.stats_batch_max_codes
+    if len(short_codes) > max_codes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {max_codes} codes per request",
+        )
+    
+    # Large lists can be streamed as NDJSON instead of built up in memory
+    if request.headers.get("accept", "").startswith("application/x-ndjson"):
+        return StreamingResponse(stream_batch_stats(short_codes), media_type="application/x-ndjson")
+    
+    chunk_size = settings.stats_batch_chunk_size
+    stats = {}
+    for i in range(0, len(short_codes), chunk_size):
+        stats.update(await collect_stats(db, short_codes[i:i + chunk_size]))
+    
+    return BatchStatsResponse(
+        results=[stats[code] for code in short_codes if code in stats],
+        not_found=[code for code in short_codes if code not in stats],
+    )
+
+
+def redirect_error(is_active: bool, expires_at: datetime | None) -> str | None:
+    """Why a link can't be followed, or None if it can."""
+    if not is_active:
+        return "URL has been deactivated"
+    
+    if expires_at:
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at < datetime.now(timezone.utc):
+            return "URL has expired"
+    return None
+
+
+def ensure_redirectable(is_active: bool, expires_at: datetime | None) -> None:
+    """Raise 410 for deactivated or expired links."""
+    error = redirect_error(is_active, expires_at)
+    if error:
         raise HTTPException(
             status_code=status.HTTP_410_GONE,
-            detail="URL has expired",
+            detail=error,
+        )
+
+
+def permanent_redirect_cache_control(expires_at: datetime | None) -> str:
+    """Let browsers and CDNs keep a permanent redirect, but not past the link's expiry."""
+    max_age = settings.permanent_redirect_max_age
+    if expires_at:
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        max_age = min(max_age, int((expires_at - datetime.now(timezone.utc)).total_seconds()))
+    return f"public, max-age={max(max_age, 0)}"
+
+
+@dataclass
+class RedirectLookup:
+    # The cache entry, MISSING, or None on a cache miss
+    entry: dict | None
+    rate_limit: RateLimitResult | None
+    # Whether the click was already counted in Redis
+    counted: bool
+
+
+async def lookup_redirect(short_code: str, request: Request) -> RedirectLookup:
+    """
+    The cache part of a redirect. The rate-limit check shares one Redis round
+    trip with either the Redis cache lookup (L1 miss) or the click counter (L1 hit).
+    """
+    batch = redis_manager.batch()
+    
+    # L1 first (no I/O)
+    cached = get_local_url(short_code)
+    counted = (
+        cached is not None
+        and cached is not MISSING
+        and redirect_error(cached["is_active"], cached["expires_at"]) is None
+    )
+    
+    lookups = [rate_limit_by_ip(request, batch)]
+    if cached is None:
+        lookups.append(get_remote_url(short_code, batch))
+    elif counted:
+        lookups.append(increment_clicks_cache(short_code, batch))
+    try:
+        rate_limit, *results = await asyncio.gather(*lookups)
+    except HTTPException:
+        if counted:
+            # Rejected by the rate limiter: take back the optimistic click
+            await increment_clicks_cache(short_code, amount=-1)
+        raise
+    if cached is None:
+        cached = results[0]
+    return RedirectLookup(cached, rate_limit, counted)
+
+
+async def finish_redirect(short_code: str, request: Request, lookup: RedirectLookup) -> Response:
+    """Turn a resolved lookup into the 307, recording the click."""
+    cached = lookup.entry
+    if cached is MISSING:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="URL not found",
         )
     
-    # Cache for next time
-    await set_cached_url(short_code, url.original_url)
+    ensure_redirectable(cached["is_active"], cached["expires_at"])
     
-    # Record detailed analytics
-    await record_click(db, url.id, request)
+    await record_click(click_from_request(cached["id"], request))
+    
+    response = RedirectResponse(url=cached["original_url"], status_code=cached["redirect_status"])
+    if cached["redirect_status"] != status.HTTP_307_TEMPORARY_REDIRECT:
+        response.headers["Cache-Control"] = permanent_redirect_cache_control(cached["expires_at"])
+    apply_rate_limit_headers(response, lookup.rate_limit)
+    # Clicks are queued and written in batches off the request path
+    if not lookup.counted:
+        response.background = BackgroundTask(increment_clicks_cache, short_code)
+    return response
+
+
+@router.get("/{short_code}")
+async def redirect_to_url(
+    short_code: str,
+    request: Request,
+):
+    # Cache hits are normally answered by the ASGI fast path (app.fast_redirect),
+    # which hands over its lookup when it falls through on a miss
+    lookup = request.scope.get(FAST_REDIRECT_LOOKUP) or await lookup_redirect(short_code, request)
     
-    # Increment clicks in Redis
-    await increment_clicks_cache(short_code)
+    if lookup.entry is None:
+        # Cache miss - load from the database and cache it (or its absence);
+        # concurrent misses for the same code share the load
+        lookup.entry = await load_url_entry(short_code)
     
-    return RedirectResponse(url=url.original_url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+    return await finish_redirect(short_code, request, lookup)
 
 
 @router.get("/{short_code}/stats", response_model=URLStats)
 async def get_url_stats(
     short_code: str,
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    url = await get_url_by_code(db, short_code)
+    url = await find_url_for_read(db, short_code)
     
     if not url:
         raise HTTPException(
@@ -130,29 +442,28 @@ async def get_url_stats(
             detail="URL not found",
         )
     
-    # Get clicks from Redis cache
-    cached_clicks = await get_cached_clicks(short_code)
+    # Combined clicks (DB + Redis counters not yet written back)
+    total_clicks = await get_total_clicks(db, url)
     
-    # Return combined clicks (DB + Redis)
-    total_clicks = url.clicks + cached_clicks
+    # The row and the counter are needed anyway; the ETag spares the body
+    etag = make_etag("stats", url.id, url.original_url, url.is_active, url.expires_at, total_clicks)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
     
-    return URLStats(
-        short_code=url.short_code,
-        original_url=url.original_url,
-        clicks=total_clicks,
-        created_at=url.created_at,
-        expires_at=url.expires_at,
-        is_active=url.is_active,
-    )
+    return to_url_stats(url, total_clicks)
 
 
 @router.get("/{short_code}/analytics", response_model=URLAnalytics)
 async def get_url_analytics(
     short_code: str,
-    days: int = 7,
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    response: Response,
+    days: int = Query(7, ge=1, le=settings.analytics_max_days),
+    approximate: bool = False,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    url = await get_url_by_code(db, short_code)
+    url = await find_url_for_read(db, short_code)
     
     if not url:
         raise HTTPException(
@@ -160,17 +471,78 @@ async def get_url_analytics(
             detail="URL not found",
         )
     
-    analytics = await get_click_analytics(db, url.id, days)
+    # Answer a matching poll before running any aggregation. The hour is part
+    # of the tag because the window slides even when no clicks come in
+    version = await get_analytics_version(url.id)
+    window = hour_bucket(datetime.now(timezone.utc))
+    if version is not None:
+        etag = make_etag("analytics", url.id, version, days, approximate, window)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+    
+    # Cached per (url, days) until new clicks change the version
+    analytics, served_version = await get_cached_click_analytics(url.id, days, version)
+    if served_version is not None:
+        # Tagged with the version the body was computed for: older than
+        # `version` when a result within the staleness bound is served
+        etag = make_etag("analytics", url.id, served_version, days, approximate, window)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+        response.headers.update(cache_headers(etag))
+    unique_visitors = await get_unique_visitors(url.id, days)
+    
+    # Heavy-hitter referrers from the top-K sketch instead of the rollup tables
+    top_referrers = await get_top_referrers(url.id, days) if approximate else None
     
     return URLAnalytics(
         short_code=url.short_code,
         original_url=url.original_url,
         total_clicks=analytics["total_clicks"],
         daily_clicks=analytics["daily_clicks"],
-        top_referrers=analytics["top_referrers"],
+        top_referrers=top_referrers if top_referrers is not None else analytics["top_referrers"],
+        unique_visitors=unique_visitors,
+        approximate=unique_visitors is not None or top_referrers is not None,
     )
 
 
+@router.get("/{short_code}/clicks/export")
+async def export_clicks(
+    short_code: str,
+    request: Request,
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+):
+    rate_limit = await rate_limit_export(request)
+    url = await find_url_for_read(db, short_code)
+    
+    if not url:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="URL not found",
+        )
+    
+    # Never raw IPs or user agents over HTTP; those are only in the CLI export.
+    # Streamed from a server-side cursor, so memory stays flat for any number of clicks
+    chunks = stream_clicks(url.id, since, until, export_format, settings.click_export_batch_size)
+    filename = f"{short_code}-clicks.{export_format}"
+    media_type = MEDIA_TYPES[export_format]
+    if gzip:
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    response = StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+    apply_rate_limit_headers(response, rate_limit)
+    return response
+
+
 @router.delete("/{short_code}", status_code=status.HTTP_204_NO_CONTENT)
 async def deactivate_url(
     short_code: str,
@@ -185,9 +557,8 @@ async def deactivate_url(
         )
     
     url.is_active = False
-    await db.flush()
-    
-    # Remove from cache
-    await delete_cached_url(short_code)
+    # Committed before the cache changes, or a miss in between would reload the active row
+    await db.commit()
+    await replace_cached_url(url)
     
     return None
\ No newline at end of file
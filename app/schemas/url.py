@@ -1,5 +1,10 @@
-from pydantic import BaseModel, HttpUrl, Field
+from pydantic import BaseModel, HttpUrl, Field, field_validator
 from datetime import datetime
+from typing import Literal
+
+# Static one-segment routes: a custom code with one of these names would
+# never be reached by its redirect
+RESERVED_CODES = frozenset({"docs", "health", "metrics", "openapi.json", "redoc", "shorten", "urls"})
 
 
 # Request schemas
@@ -7,6 +12,15 @@ class URLCreate(BaseModel):
     url: HttpUrl
     custom_code: str | None = Field(default=None, min_length=3, max_length=20)
     expires_at: datetime | None = None
+    # 301/308 are cached by browsers and CDNs, so later clicks aren't counted
+    redirect_status: Literal[301, 307, 308] = 307
+
+    @field_validator("custom_code")
+    @classmethod
+    def not_reserved(cls, code: str | None) -> str | None:
+        if code in RESERVED_CODES:
+            raise ValueError(f"'{code}' is reserved")
+        return code
 
 
 # Response schemas
@@ -17,12 +31,31 @@ class URLResponse(BaseModel):
     clicks: int
     is_active: bool
     expires_at: datetime | None
+    redirect_status: int
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class URLListResponse(BaseModel):
+    items: list[URLResponse]
+    # Pass back as ?cursor= for the next page; null on the last page
+    next_cursor: str | None
+
+
+class BulkURLResult(BaseModel):
+    index: int
+    url: URLResponse | None = None
+    error: str | None = None
+
+
+class BulkURLResponse(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkURLResult]
+
+
 class URLStats(BaseModel):
     short_code: str
     original_url: str
@@ -35,6 +68,15 @@ class URLStats(BaseModel):
         from_attributes = True
 
 
+class BatchStatsRequest(BaseModel):
+    short_codes: list[str] = Field(min_length=1)
+
+
+class BatchStatsResponse(BaseModel):
+    results: list[URLStats]
+    not_found: list[str]
+
+
 class DailyClicks(BaseModel):
     date: str
     clicks: int
@@ -50,4 +92,7 @@ class URLAnalytics(BaseModel):
     original_url: str
     total_clicks: int
     daily_clicks: list[DailyClicks]
-    top_referrers: list[ReferrerStats]
\ No newline at end of file
+    top_referrers: list[ReferrerStats]
+    unique_visitors: int | None = None
+    # True when any figure comes from a sketch rather than an exact count
+    approximate: bool = False
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+Production server entry point.
+
+    python -m app.server --workers 4
+
+Runs uvicorn with uvloop and httptools and one process per worker. Each
+worker builds its own DB engines, Redis pool and background tasks in the app
+lifespan. On SIGTERM a worker stops accepting connections, finishes in-flight
+requests, then drains queued clicks and writes back Redis counters before
+exiting.
+"""
+import argparse
+import os
+import uvicorn
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def default_workers() -> int:
+    return settings.web_concurrency or os.cpu_count() or 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.server", description="Run the API with multiple workers")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=default_workers(), help="Defaults to WEB_CONCURRENCY or the CPU count")
+    parser.add_argument("--log-level", default="info")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    uvicorn.run(
+        # An import string, so every worker imports the app itself
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        log_level=args.log_level,
+        # Behind a load balancer: trust X-Forwarded-For for client IPs (rate limits, analytics)
+        proxy_headers=True,
+        forwarded_allow_ips=settings.forwarded_allow_ips,
+        # Requests get this long to finish; the lifespan's click drain runs after
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
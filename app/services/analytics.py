@@ -2,39 +2,104 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from fastapi import Request
 from app.models.click import Click
+from app.models.click_rollup import ClickHourly, ReferrerDaily
+from app.services.click_ingestion import click_ingestor
+from app.services.rollups import hour_bucket
+from app.config import get_settings
+from app.instrumentation import timed
 from datetime import datetime, timedelta, timezone
 
+settings = get_settings()
 
-async def record_click(
+
+def click_from_request(url_id: int, request: Request) -> dict:
+    """Capture the click details we need before the request goes away."""
+    return {
+        "url_id": url_id,
+        "ip_address": request.client.host if request.client else None,
+        "user_agent": request.headers.get("user-agent"),
+        "referrer": request.headers.get("referer"),
+        "clicked_at": datetime.now(timezone.utc),
+    }
+
+
+@timed("record_click")
+async def record_click(click: dict) -> None:
+    """Record detailed click analytics. Rows are written in batches by the click ingestor."""
+    await click_ingestor.enqueue(click)
+
+
+def click_window(url_id: int, since: datetime | None = None, until: datetime | None = None) -> list:
+    """WHERE clauses selecting a URL's raw clicks in [since, until)."""
+    clauses = [Click.url_id == url_id]
+    if since is not None:
+        clauses.append(Click.clicked_at >= since)
+    if until is not None:
+        clauses.append(Click.clicked_at < until)
+    return clauses
+
+
+async def get_click_analytics(
     db: AsyncSession,
     url_id: int,
-    request: Request,
-) -> None:
-    """Record detailed click analytics."""
-    click = Click(
-        url_id=url_id,
-        ip_address=request.client.host if request.client else None,
-        user_agent=request.headers.get("user-agent"),
-        referrer=request.headers.get("referer"),
+    days: int = 7,
+) -> dict:
+    """Get click analytics for the past N days from the rollup tables."""
+    if settings.analytics_source == "raw":
+        return await get_click_analytics_raw(db, url_id, days)
+    
+    # Rollups are hourly, so the window starts at the top of the hour
+    since = hour_bucket(datetime.now(timezone.utc) - timedelta(days=days))
+    
+    # Total clicks
+    total_result = await db.execute(
+        select(func.coalesce(func.sum(ClickHourly.clicks), 0)).where(
+            ClickHourly.url_id == url_id,
+            ClickHourly.bucket >= since,
+        )
     )
-    db.add(click)
-    await db.flush()
+    total_clicks = total_result.scalar()
+    
+    # Clicks per day
+    daily_result = await db.execute(
+        select(
+            func.date(ClickHourly.bucket).label("date"),
+            func.sum(ClickHourly.clicks).label("clicks"),
+        )
+        .where(ClickHourly.url_id == url_id, ClickHourly.bucket >= since)
+        .group_by(func.date(ClickHourly.bucket))
+        .order_by(func.date(ClickHourly.bucket))
+    )
+    daily_clicks = [{"date": str(row.date), "clicks": row.clicks} for row in daily_result]
+    
+    # Top referrers
+    referrer_result = await db.execute(
+        select(ReferrerDaily.referrer, func.sum(ReferrerDaily.clicks).label("count"))
+        .where(ReferrerDaily.url_id == url_id, ReferrerDaily.day >= since.date())
+        .group_by(ReferrerDaily.referrer)
+        .order_by(func.sum(ReferrerDaily.clicks).desc())
+        .limit(5)
+    )
+    top_referrers = [{"referrer": row.referrer, "count": row.count} for row in referrer_result]
+    
+    return {
+        "total_clicks": total_clicks,
+        "daily_clicks": daily_clicks,
+        "top_referrers": top_referrers,
+    }
 
 
-async def get_click_analytics(
+async def get_click_analytics_raw(
     db: AsyncSession,
     url_id: int,
     days: int = 7,
 ) -> dict:
-    """Get click analytics for the past N days."""
-    since = datetime.now(timezone.utc) - timedelta(days=days)
+    """Get click analytics for the past N days by scanning the clicks table."""
+    window = click_window(url_id, datetime.now(timezone.utc) - timedelta(days=days))
     
     # Total clicks
     total_result = await db.execute(
-        select(func.count()).select_from(Click).where(
-            Click.url_id == url_id,
-            Click.clicked_at >= since,
-        )
+        select(func.count()).select_from(Click).where(*window)
     )
     total_clicks = total_result.scalar()
     
@@ -44,7 +109,7 @@ async def get_click_analytics(
             func.date(Click.clicked_at).label("date"),
             func.count().label("clicks"),
         )
-        .where(Click.url_id == url_id, Click.clicked_at >= since)
+        .where(*window)
         .group_by(func.date(Click.clicked_at))
         .order_by(func.date(Click.clicked_at))
     )
@@ -53,7 +118,7 @@ async def get_click_analytics(
     # Top referrers
     referrer_result = await db.execute(
         select(Click.referrer, func.count().label("count"))
-        .where(Click.url_id == url_id, Click.clicked_at >= since, Click.referrer.isnot(None))
+        .where(*window, Click.referrer.isnot(None))
         .group_by(Click.referrer)
         .order_by(func.count().desc())
         .limit(5)
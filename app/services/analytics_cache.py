@@ -0,0 +1,121 @@
+"""
+Redis cache of analytics results, keyed by (url_id, days).
+
+Each result is stored with the URL's analytics version (see http_cache),
+which the click ingestor replaces whenever it writes new clicks. A cached
+result is served while its version is current, or, with
+ANALYTICS_CACHE_MAX_STALENESS, while it is younger than that many seconds.
+Concurrent misses for the same key are computed once per worker.
+
+Results are computed on the replica unless the version is younger than
+ANALYTICS_REPLICA_LAG: a replica behind the clicks that version stands for
+would otherwise store an old result under the new version.
+"""
+from app.config import get_settings
+from app.database import AsyncSessionLocal, ReadSessionLocal
+from app.instrumentation import analytics_cache_lookups, record_redis_error
+from app.redis_client import redis_manager
+from app.services.analytics import get_click_analytics
+from app.services.rollups import hour_bucket
+from app.utils.singleflight import SingleFlight
+from datetime import datetime, timezone
+import json
+import time
+
+settings = get_settings()
+
+_analytics_loads = SingleFlight()
+
+
+def analytics_cache_key(url_id: int, days: int) -> str:
+    return f"analytics:result:{url_id}:{days}"
+
+
+def pack_analytics(analytics: dict, version: str | None, window: int) -> str:
+    """Compact form: rows as [date, clicks] / [referrer, count] pairs."""
+    return json.dumps(
+        {
+            "v": version,
+            "w": window,
+            "t": round(time.time(), 3),
+            "total": analytics["total_clicks"],
+            "daily": [[row["date"], row["clicks"]] for row in analytics["daily_clicks"]],
+            "refs": [[row["referrer"], row["count"]] for row in analytics["top_referrers"]],
+        },
+        separators=(",", ":"),
+    )
+
+
+def unpack_analytics(raw: str) -> tuple[dict, dict]:
+    """The analytics dict and its metadata (version, window, computed-at time)."""
+    data = json.loads(raw)
+    analytics = {
+        "total_clicks": data["total"],
+        "daily_clicks": [{"date": date, "clicks": clicks} for date, clicks in data["daily"]],
+        "top_referrers": [{"referrer": referrer, "count": count} for referrer, count in data["refs"]],
+    }
+    return analytics, {"version": data["v"], "window": data["w"], "computed_at": data["t"]}
+
+
+def _replica_caught_up(version: str | None) -> bool:
+    """Whether the replica can be trusted to have the clicks behind `version`."""
+    if version is None:
+        return True
+    try:
+        stamped_at = int(version) / 1e9
+    except ValueError:
+        return False
+    return time.time() - stamped_at >= settings.analytics_replica_lag
+
+
+async def _compute(url_id: int, days: int, version: str | None, window: int) -> tuple[dict, str | None]:
+    session_factory = ReadSessionLocal if _replica_caught_up(version) else AsyncSessionLocal
+    # Own session: the computation is shared by every request waiting for it
+    async with session_factory() as db:
+        analytics = await get_click_analytics(db, url_id, days)
+
+    redis_client = redis_manager.client
+    if redis_client and version is not None:
+        try:
+            await redis_client.set(
+                analytics_cache_key(url_id, days),
+                pack_analytics(analytics, version, window),
+                ex=settings.analytics_cache_ttl,
+            )
+        except Exception:
+            record_redis_error("set")
+    return analytics, version
+
+
+async def get_cached_click_analytics(url_id: int, days: int, version: str | None) -> tuple[dict, str | None]:
+    """
+    get_click_analytics through the result cache. `version` is the URL's
+    current analytics version; None (Redis unavailable) skips the cache.
+    Returns the analytics and the version they were computed for, which is
+    older than `version` for a result served within the staleness bound.
+    """
+    # The window slides with the hour even when no clicks come in
+    window = int(hour_bucket(datetime.now(timezone.utc)).timestamp())
+    key = analytics_cache_key(url_id, days)
+
+    redis_client = redis_manager.client
+    if settings.analytics_cache_enabled and redis_client and version is not None:
+        try:
+            raw = await redis_client.get(key)
+        except Exception:
+            record_redis_error("get")
+            raw = None
+        if raw:
+            analytics, meta = unpack_analytics(raw)
+            if meta["window"] == window:
+                if meta["version"] == version:
+                    analytics_cache_lookups.inc("hit")
+                    return analytics, version
+                if time.time() - meta["computed_at"] <= settings.analytics_cache_max_staleness:
+                    analytics_cache_lookups.inc("stale")
+                    return analytics, meta["version"]
+        analytics_cache_lookups.inc("miss")
+    else:
+        version = None
+
+    return await _analytics_loads.do(key, lambda: _compute(url_id, days, version, window))
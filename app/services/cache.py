@@ -1,65 +1,461 @@
-import redis.asyncio as redis
 from app.config import get_settings
+from app.instrumentation import cache_lookups, record_redis_error, timed
+from app.redis_client import RedisBatch, redis_manager
+from app.services.code_filter import code_filter, rebuild_code_filter
+from collections import OrderedDict
+from datetime import datetime, timezone
+import asyncio
+import json
 import logging
+import math
+import random
+import time
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-redis_client = None
+INVALIDATION_CHANNEL = "cache:invalidate"
+NEW_CODES_CHANNEL = "cache:new_codes"
 
-try:
-    if settings.redis_url:
-        redis_client = redis.from_url(settings.redis_url, decode_responses=True)
-except Exception as e:
-    logger.warning(f"Redis not available: {e}")
+# Returned by get_cached_url for codes known not to exist
+MISSING: dict = {"missing": True}
+MISSING_RAW = "!"
 
+# Rough per-entry overhead (dict, key, OrderedDict node) on top of the payload
+ENTRY_OVERHEAD_BYTES = 400
 
-async def get_cached_url(short_code: str) -> str | None:
-    """Get original URL from cache."""
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with per-entry TTL.
+
+    Sits in front of Redis so the hottest codes are served without a network
+    round trip. Evicts least recently used entries when either max_items or
+    max_bytes is exceeded; expired entries are dropped on read.
+    """
+
+    def __init__(self, max_items: int = 10000, max_bytes: int = 16 * 1024 * 1024, ttl: float = 60.0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, int, object]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        deadline, _, value = entry
+        if deadline <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value, size: int, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.max_items <= 0:
+            return
+        size += ENTRY_OVERHEAD_BYTES
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self.size_bytes += size
+        while len(self._entries) > self.max_items or self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self._entries),
+            "bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+
+
+local_cache = LocalCache(
+    max_items=settings.l1_cache_max_items if settings.l1_cache_enabled else 0,
+    max_bytes=settings.l1_cache_max_bytes,
+    ttl=settings.l1_cache_ttl,
+)
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    """Treat naive datetimes (e.g. from SQLite) as UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def serialize_url(url, cached_until: float | None = None, load_seconds: float = 0.0) -> str:
+    """
+    Pack everything the redirect and click recording need into one cache value.
+    cached_until (epoch seconds) and load_seconds drive the early refresh.
+    """
+    expires_at = _as_utc(url.expires_at)
+    return json.dumps(
+        {
+            "id": url.id,
+            "original_url": url.original_url,
+            "is_active": url.is_active,
+            "expires_at": expires_at.isoformat() if expires_at else None,
+            "redirect_status": url.redirect_status or 307,
+            "cached_until": cached_until,
+            "load_seconds": round(load_seconds, 6),
+        },
+        separators=(",", ":"),
+    )
+
+
+def deserialize_url(raw: str) -> dict | None:
+    """Unpack a cache value. Returns None for entries in an unknown format."""
+    if raw == MISSING_RAW:
+        return MISSING
+    try:
+        data = json.loads(raw)
+        expires_at = data["expires_at"]
+        return {
+            "id": data["id"],
+            "original_url": data["original_url"],
+            "is_active": data["is_active"],
+            "expires_at": datetime.fromisoformat(expires_at) if expires_at else None,
+            "redirect_status": data.get("redirect_status", 307),
+            "cached_until": data.get("cached_until"),
+            "load_seconds": data.get("load_seconds", 0.0),
+        }
+    except (ValueError, TypeError, KeyError):
+        # Plain-string entries written before the payload format existed
+        return None
+
+
+def _local_ttl(entry: dict) -> float | None:
+    """Keep L1 entries no longer than the link itself lives."""
+    expires_at = entry["expires_at"]
+    if expires_at is None:
+        return None
+    return (_as_utc(expires_at) - datetime.now(timezone.utc)).total_seconds()
+
+
+def cache_ttl(expires_at: datetime | None) -> int:
+    """Redis TTL for a URL entry: CACHE_TTL with random jitter, never past the link's own expiry."""
+    jitter = settings.cache_ttl_jitter
+    ttl = settings.cache_ttl * (1 + random.uniform(-jitter, jitter))
+    expires_at = _as_utc(expires_at)
+    if expires_at is not None:
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        # Already expired: keep the 410 answer only as long as a negative entry
+        ttl = min(ttl, remaining) if remaining > 0 else settings.negative_cache_ttl
+    return max(1, int(ttl))
+
+
+def should_refresh_early(entry: dict) -> bool:
+    """
+    Probabilistic early expiration (XFetch): as an entry nears the end of its
+    TTL, each read is increasingly likely to be treated as a miss, so one
+    request reloads it before it expires for everyone at once. Entries that
+    were slow to load are refreshed earlier.
+    """
+    beta = settings.cache_early_refresh_beta
+    cached_until = entry.get("cached_until")
+    if beta <= 0 or not cached_until:
+        return False
+    # -log(u) for u in (0, 1] is an exponential sample, mean 1
+    gap = -entry["load_seconds"] * beta * math.log(1.0 - random.random())
+    return time.time() + gap >= cached_until
+
+
+def get_local_url(short_code: str) -> dict | None:
+    """The in-process part of get_cached_url (L1); never does I/O."""
+    entry = local_cache.get(short_code)
+    if entry is not None:
+        cache_lookups.inc("l1")
+    return entry
+
+
+@timed("get_remote_url")
+async def get_remote_url(short_code: str, batch: RedisBatch | None = None) -> dict | None:
+    """
+    The Redis part of get_cached_url; fills L1 on a hit. A code missing from
+    Redis that the code filter rules out is MISSING: creating a code caches
+    it in Redis, so one made by another worker whose announcement hasn't
+    reached this worker's filter yet is still found here.
+    """
+    redis_client = batch or redis_manager.client
     if not redis_client:
+        cache_lookups.inc("miss")
         return None
     try:
-        return await redis_client.get(f"url:{short_code}")
+        raw = await redis_client.get(f"url:{short_code}")
     except Exception:
+        record_redis_error("get")
+        cache_lookups.inc("miss")
+        return None
+    if not raw and not code_filter.might_exist(short_code):
+        cache_lookups.inc("filter")
+        return MISSING
+    entry = deserialize_url(raw) if raw else None
+    if entry is not None and entry is not MISSING and should_refresh_early(entry):
+        # This request reloads the entry; others keep being served from Redis
+        cache_lookups.inc("refresh")
         return None
+    cache_lookups.inc("redis" if raw else "miss")
+    if entry is MISSING:
+        local_cache.set(short_code, MISSING, size=len(raw), ttl=settings.negative_cache_ttl)
+    elif entry is not None:
+        local_cache.set(short_code, entry, size=len(raw), ttl=_local_ttl(entry))
+    return entry
+
+
+@timed("get_cached_url")
+async def get_cached_url(short_code: str, batch: RedisBatch | None = None) -> dict | None:
+    """
+    Get cached URL entry (id, original_url, is_active, expires_at). L1 first, then Redis.
+    Returns MISSING for codes known not to exist, None when the cache can't tell.
+    """
+    entry = get_local_url(short_code)
+    if entry is not None:
+        return entry
+    return await get_remote_url(short_code, batch)
 
 
-async def set_cached_url(short_code: str, original_url: str, expire_seconds: int = 3600) -> None:
-    """Cache original URL for 1 hour by default."""
+async def set_cached_url(url, expire_seconds: int | None = None, load_seconds: float = 0.0) -> dict:
+    """
+    Cache a URL entry, for about CACHE_TTL by default (see cache_ttl).
+    load_seconds is how long the DB load took. Returns the cached entry.
+    """
+    if expire_seconds is None:
+        expire_seconds = cache_ttl(url.expires_at)
+    raw = serialize_url(url, time.time() + expire_seconds, load_seconds)
+    entry = deserialize_url(raw)
+    local_cache.set(url.short_code, entry, size=len(raw), ttl=_local_ttl(entry))
+    
+    redis_client = redis_manager.client
     if not redis_client:
+        return entry
+    try:
+        await redis_client.set(f"url:{url.short_code}", raw, ex=expire_seconds)
+    except Exception:
+        record_redis_error("set")
+    return entry
+
+
+async def set_cached_urls(urls: list) -> None:
+    """
+    Cache many URL entries with a single pipelined round trip.
+    Only Redis is warmed: a bulk import shouldn't push hot codes out of L1.
+    Each entry gets its own jittered TTL, so a bulk import doesn't expire at once.
+    """
+    redis_client = redis_manager.client
+    if not redis_client or not urls:
         return
+    now = time.time()
     try:
-        await redis_client.set(f"url:{short_code}", original_url, ex=expire_seconds)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for url in urls:
+                ttl = cache_ttl(url.expires_at)
+                pipe.set(f"url:{url.short_code}", serialize_url(url, now + ttl), ex=ttl)
+            await pipe.execute()
     except Exception:
-        pass
+        record_redis_error("set")
 
 
-async def delete_cached_url(short_code: str) -> None:
-    """Remove URL from cache."""
+def fill_local_cache(urls: list) -> None:
+    """Put URL entries in this worker's L1 only, e.g. to warm a fresh worker."""
+    for url in urls:
+        raw = serialize_url(url)
+        entry = deserialize_url(raw)
+        local_cache.set(url.short_code, entry, size=len(raw), ttl=_local_ttl(entry))
+
+
+async def set_missing_url(short_code: str) -> None:
+    """Remember briefly that a code doesn't exist, so repeated lookups skip the DB."""
+    local_cache.set(short_code, MISSING, size=len(MISSING_RAW), ttl=settings.negative_cache_ttl)
+    
+    redis_client = redis_manager.client
     if not redis_client:
         return
     try:
-        await redis_client.delete(f"url:{short_code}")
+        # NX: never overwrite a real entry written by a concurrent create
+        await redis_client.set(f"url:{short_code}", MISSING_RAW, ex=settings.negative_cache_ttl, nx=True)
     except Exception:
-        pass
+        record_redis_error("set")
 
 
-async def increment_clicks_cache(short_code: str) -> int:
-    """Increment click count in Redis. Returns new count."""
+async def announce_new_url(short_code: str) -> None:
+    """Add a new code to every worker's code filter and drop stale negative entries."""
+    code_filter.add(short_code)
+    local_cache.delete(short_code)
+    
+    redis_client = redis_manager.client
     if not redis_client:
-        return 0
+        return
     try:
-        return await redis_client.incr(f"clicks:{short_code}")
+        await redis_client.publish(NEW_CODES_CHANNEL, short_code)
     except Exception:
-        return 0
+        record_redis_error("publish")
 
 
-async def get_cached_clicks(short_code: str) -> int:
-    """Get click count from cache."""
+async def announce_new_urls(short_codes: list[str]) -> None:
+    """announce_new_url for many codes, published in one pipeline."""
+    for short_code in short_codes:
+        code_filter.add(short_code)
+        local_cache.delete(short_code)
+    
+    redis_client = redis_manager.client
+    if not redis_client or not short_codes:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for short_code in short_codes:
+                pipe.publish(NEW_CODES_CHANNEL, short_code)
+            await pipe.execute()
+    except Exception:
+        record_redis_error("publish")
+
+
+async def replace_cached_url(url) -> None:
+    """
+    Cache a URL's committed new state everywhere: Redis and this worker's L1
+    get the new entry, and every other worker drops its L1 copy. Unlike
+    deleting the entry, this leaves no gap for a miss to re-cache the old row.
+    """
+    expire_seconds = cache_ttl(url.expires_at)
+    raw = serialize_url(url, time.time() + expire_seconds)
+    entry = deserialize_url(raw)
+    local_cache.set(url.short_code, entry, size=len(raw), ttl=_local_ttl(entry))
+    
+    redis_client = redis_manager.client
+    if not redis_client:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(f"url:{url.short_code}", raw, ex=expire_seconds)
+            pipe.publish(INVALIDATION_CHANNEL, url.short_code)
+            await pipe.execute()
+    except Exception:
+        record_redis_error("set")
+
+
+async def delete_cached_url(short_code: str) -> None:
+    """Remove URL from cache, including every worker's L1."""
+    local_cache.delete(short_code)
+    
+    redis_client = redis_manager.client
+    if not redis_client:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.delete(f"url:{short_code}")
+            pipe.publish(INVALIDATION_CHANNEL, short_code)
+            await pipe.execute()
+    except Exception:
+        record_redis_error("delete")
+
+
+async def increment_clicks_cache(short_code: str, batch: RedisBatch | None = None, amount: int = 1) -> int:
+    """Increment click count in Redis. Returns new count."""
+    redis_client = batch or redis_manager.client
     if not redis_client:
         return 0
     try:
-        clicks = await redis_client.get(f"clicks:{short_code}")
-        return int(clicks) if clicks else 0
+        return await redis_client.incr(f"clicks:{short_code}", amount)
     except Exception:
-        return 0
\ No newline at end of file
+        record_redis_error("incr")
+        return 0
+
+
+class InvalidationListener:
+    """
+    Evicts L1 entries when any worker publishes on the invalidation channel,
+    and adds codes created by other workers to the local code filter.
+
+    The code filter is (re)built after every subscription. If the subscription
+    drops, messages may have been missed, so the whole L1 is cleared and the
+    filter is switched off until the rebuild after resubscribing.
+    """
+
+    def __init__(self, reconnect_delay: float = 1.0):
+        self.reconnect_delay = reconnect_delay
+        self._task: asyncio.Task | None = None
+        self._rebuild: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        if not redis_manager.client:
+            logger.warning("Redis not configured: L1 cache invalidation is local to this worker, code filter off")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        for task in (self._task, self._rebuild):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._rebuild = None
+        code_filter.listening = False
+
+    async def _rebuild_code_filter(self) -> None:
+        try:
+            await rebuild_code_filter()
+        except Exception as e:
+            logger.warning(f"Code filter not built, lookups fall through to the cache: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with redis_manager.client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL, NEW_CODES_CHANNEL)
+                    # Built only once subscribed, so no new code falls between
+                    # the table scan and the first announcement
+                    code_filter.listening = True
+                    self._rebuild = asyncio.create_task(self._rebuild_code_filter())
+                    while True:
+                        # Polled with a short timeout: a blocking read would trip the pool's socket timeout
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message is None:
+                            continue
+                        if message["channel"] == NEW_CODES_CHANNEL:
+                            code_filter.add(message["data"])
+                        local_cache.delete(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                record_redis_error("subscribe")
+                logger.warning(f"Cache invalidation subscription lost: {e}")
+            local_cache.clear()
+            code_filter.listening = False
+            code_filter.invalidate()
+            await asyncio.sleep(self.reconnect_delay)
+
+
+invalidation_listener = InvalidationListener()
@@ -0,0 +1,91 @@
+"""
+Cache warm-up: preload the most clicked links so a deploy or a Redis flush
+doesn't send every redirect to the database until the cache refills.
+"""
+from sqlalchemy import Select, select, func
+from app.config import get_settings
+from app.database import ReadSessionLocal
+from app.models.click import Click
+from app.models.click_rollup import ClickHourly
+from app.models.url import URL
+from app.redis_client import redis_manager
+from app.services.cache import fill_local_cache, local_cache, set_cached_urls
+from app.services.rollups import hour_bucket
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def top_links_query(top_n: int, days: int) -> Select:
+    """Active URLs ordered by clicks over the past N days, most clicked first."""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    if settings.analytics_source == "raw":
+        recent = (
+            select(Click.url_id, func.count(Click.id).label("recent_clicks"))
+            .where(Click.clicked_at >= since)
+            .group_by(Click.url_id)
+        )
+    else:
+        recent = (
+            select(ClickHourly.url_id, func.sum(ClickHourly.clicks).label("recent_clicks"))
+            .where(ClickHourly.bucket >= hour_bucket(since))
+            .group_by(ClickHourly.url_id)
+        )
+    recent = recent.subquery()
+    return (
+        select(URL)
+        .join(recent, URL.id == recent.c.url_id)
+        .where(URL.is_active.is_(True))
+        .order_by(recent.c.recent_clicks.desc(), URL.id)
+        .limit(top_n)
+    )
+
+
+async def warm_cache(
+    top_n: int,
+    days: int,
+    batch_size: int = 500,
+    time_budget: float | None = None,
+    fill_local: bool = False,
+    progress: Callable[[int], None] | None = None,
+) -> dict:
+    """
+    Stream the top-N links from the database and cache them with one
+    pipelined SET per batch. Hottest links go first, so stopping at the time
+    budget still leaves the most important ones cached. With fill_local,
+    this worker's L1 is seeded too, up to its item limit.
+
+    Returns how many links were warmed, how long it took and whether the
+    whole list was covered.
+    """
+    start = time.monotonic()
+    warmed = 0
+    complete = True
+    if redis_manager.client is None and not fill_local:
+        return {"warmed": 0, "seconds": 0.0, "complete": complete}
+
+    async with ReadSessionLocal() as db:
+        result = await db.stream_scalars(top_links_query(top_n, days).execution_options(yield_per=batch_size))
+        try:
+            async for urls in result.partitions():
+                await set_cached_urls(urls)
+                # Only what L1 can hold, or the coldest links would evict the hottest
+                if fill_local and warmed < local_cache.max_items:
+                    fill_local_cache(urls[:local_cache.max_items - warmed])
+                warmed += len(urls)
+                if progress:
+                    progress(warmed)
+
+                if time_budget is not None and time.monotonic() - start > time_budget:
+                    complete = False
+                    break
+        finally:
+            await result.close()
+
+    seconds = time.monotonic() - start
+    logger.info(f"Cache warm-up: {warmed} links in {seconds:.1f}s{'' if complete else ' (time budget reached)'}")
+    return {"warmed": warmed, "seconds": seconds, "complete": complete}
@@ -0,0 +1,306 @@
+"""
+Write-back of the Redis click counters (clicks:{code}) into urls.clicks.
+
+Each flush batch is tagged with an epoch. Counters are moved atomically into
+a pending hash under that epoch, added to urls.clicks together with a
+click_flushes row for the epoch in one transaction, and only then cleared
+from Redis. Readers compare the pending epoch with the latest epoch recorded
+in Postgres to know whether the pending clicks are already part of
+urls.clicks, so totals stay exact while a flush runs and a batch is never
+applied twice, even if the process dies between the commit and the cleanup.
+"""
+import asyncio
+import logging
+import uuid
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.database import AsyncSessionLocal, is_replica_session
+from app.models.click_flush import ClickFlush
+from app.models.url import URL
+from app.redis_client import redis_manager
+from app.services.shortener import add_clicks, short_code_in
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+COUNTER_PREFIX = "clicks:"
+PENDING_KEY = "clickflush:pending"
+PENDING_EPOCH_KEY = "clickflush:pending_epoch"
+EPOCH_KEY = "clickflush:epoch"
+LOCK_KEY = "clickflush:lock"
+LOCK_TTL_MS = 60_000
+
+# KEYS: pending hash, pending epoch, epoch counter, then the counters to move
+# ARGV: counter prefix, last epoch applied in Postgres
+# Returns the epoch of the new pending batch, or 0 if nothing was moved.
+MOVE_TO_PENDING = """
+local moved = 0
+for i = 4, #KEYS do
+    local value = redis.call('GETDEL', KEYS[i])
+    if value then
+        local code = string.sub(KEYS[i], string.len(ARGV[1]) + 1)
+        redis.call('HINCRBY', KEYS[1], code, value)
+        moved = moved + 1
+    end
+end
+if moved == 0 then
+    return 0
+end
+local epoch = redis.call('INCR', KEYS[3])
+local applied = tonumber(ARGV[2])
+if epoch <= applied then
+    -- Redis lost the counter (restart, flush); never reuse an applied epoch
+    epoch = applied + 1
+    redis.call('SET', KEYS[3], epoch)
+end
+redis.call('SET', KEYS[2], epoch)
+return epoch
+"""
+
+# Extends the lock only while we still hold it; 0 means another flush took over
+RENEW_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+async def get_total_clicks(db: AsyncSession, url: URL, attempts: int = 5) -> int:
+    """Exact click total: urls.clicks plus counters not yet written back."""
+    redis_client = redis_manager.client
+    if not redis_client:
+        return url.clicks
+    
+    total = url.clicks
+    replica = is_replica_session(db)
+    for attempt in range(attempts):
+        if replica and attempt == attempts - 1:
+            # A replica can lag a flush for longer than the retries; the primary can't
+            async with AsyncSessionLocal() as primary:
+                total, consistent = await _read_total_clicks(primary, url)
+        else:
+            total, consistent = await _read_total_clicks(db, url)
+        if consistent:
+            break
+    return total
+
+
+async def _read_total_clicks(db: AsyncSession, url: URL) -> tuple[int, bool]:
+    """One read of the total, and whether it is consistent."""
+    result = await db.execute(
+        select(URL.clicks, select(func.coalesce(func.max(ClickFlush.epoch), 0)).scalar_subquery())
+        .where(URL.id == url.id)
+    )
+    db_clicks, applied = result.one()
+    
+    try:
+        async with redis_manager.client.pipeline(transaction=True) as pipe:
+            pipe.get(f"{COUNTER_PREFIX}{url.short_code}")
+            pipe.hget(PENDING_KEY, url.short_code)
+            pipe.get(PENDING_EPOCH_KEY)
+            pipe.get(EPOCH_KEY)
+            live, pending, pending_epoch, epoch = await pipe.execute()
+    except Exception:
+        return db_clicks, True
+    
+    pending_epoch = int(pending_epoch or 0)
+    epoch = int(epoch or 0)
+    
+    total = db_clicks + int(live or 0)
+    if pending_epoch > applied:
+        # Pending batch not committed as of our DB read
+        total += int(pending or 0)
+    
+    # Consistent unless a whole batch was applied between the two reads
+    return total, epoch <= applied or (pending_epoch == epoch == applied + 1)
+
+
+async def get_total_clicks_many(db: AsyncSession, short_codes: list[str], attempts: int = 5) -> list[tuple[URL, int]]:
+    """
+    get_total_clicks for many codes at once: one query for the URLs (with the
+    applied epoch) and one Redis round trip with an MGET of their counters.
+    Returns (url, exact total) for the codes that exist.
+    """
+    totals = []
+    replica = is_replica_session(db)
+    for attempt in range(attempts):
+        if replica and attempt == attempts - 1:
+            # Same primary fallback as get_total_clicks
+            async with AsyncSessionLocal() as primary:
+                totals, consistent = await _read_total_clicks_many(primary, short_codes)
+        else:
+            totals, consistent = await _read_total_clicks_many(db, short_codes)
+        if consistent:
+            break
+    return totals
+
+
+async def _read_total_clicks_many(db: AsyncSession, short_codes: list[str]) -> tuple[list[tuple[URL, int]], bool]:
+    applied_epoch = select(func.coalesce(func.max(ClickFlush.epoch), 0)).scalar_subquery()
+    stmt = (
+        select(URL, applied_epoch)
+        .where(short_code_in(db, short_codes))
+        .execution_options(populate_existing=True)
+    )
+    rows = (await db.execute(stmt)).all()
+    urls = [url for url, _ in rows]
+    applied = rows[0][1] if rows else 0
+    totals = [(url, url.clicks) for url in urls]
+    
+    redis_client = redis_manager.client
+    if not redis_client or not urls:
+        return totals, True
+    codes = [url.short_code for url in urls]
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.mget([f"{COUNTER_PREFIX}{code}" for code in codes])
+            pipe.hmget(PENDING_KEY, codes)
+            pipe.get(PENDING_EPOCH_KEY)
+            pipe.get(EPOCH_KEY)
+            live, pending, pending_epoch, epoch = await pipe.execute()
+    except Exception:
+        return totals, True
+    
+    pending_epoch = int(pending_epoch or 0)
+    epoch = int(epoch or 0)
+    
+    totals = []
+    for url, url_live, url_pending in zip(urls, live, pending):
+        total = url.clicks + int(url_live or 0)
+        if pending_epoch > applied:
+            total += int(url_pending or 0)
+        totals.append((url, total))
+    
+    # Same consistency check as get_total_clicks
+    return totals, epoch <= applied or (pending_epoch == epoch == applied + 1)
+
+
+async def flush_click_counters(batch_size: int = 500) -> int:
+    """
+    Move Redis click counters into urls.clicks, one SCAN batch at a time.
+    Returns the number of clicks written back.
+    """
+    redis_client = redis_manager.client
+    if not redis_client:
+        return 0
+    
+    token = uuid.uuid4().hex
+    if not await redis_client.set(LOCK_KEY, token, nx=True, px=LOCK_TTL_MS):
+        # Another worker is flushing
+        return 0
+    
+    flushed = 0
+    try:
+        applied = await _last_applied_epoch()
+        
+        # Finish a batch left behind by a failed or interrupted flush
+        pending_epoch = int(await redis_client.get(PENDING_EPOCH_KEY) or 0)
+        if pending_epoch and pending_epoch <= applied:
+            await redis_client.delete(PENDING_KEY, PENDING_EPOCH_KEY)
+        elif pending_epoch:
+            flushed += await _apply_pending(pending_epoch)
+            applied = pending_epoch
+        
+        async for keys in _scan_batches(f"{COUNTER_PREFIX}*", batch_size):
+            # The pending hash is shared, so two flushes must never overlap:
+            # keep the lock alive per batch and stop if it expired under us
+            if not await redis_client.eval(RENEW_LOCK, 1, LOCK_KEY, token, LOCK_TTL_MS):
+                logger.warning("Click counter flush lost its lock, stopping early")
+                break
+            epoch = await redis_client.eval(
+                MOVE_TO_PENDING,
+                3 + len(keys),
+                PENDING_KEY, PENDING_EPOCH_KEY, EPOCH_KEY, *keys,
+                COUNTER_PREFIX, applied,
+            )
+            if epoch:
+                flushed += await _apply_pending(int(epoch))
+                applied = int(epoch)
+    finally:
+        await redis_client.eval(RELEASE_LOCK, 1, LOCK_KEY, token)
+    return flushed
+
+
+async def _last_applied_epoch() -> int:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(func.coalesce(func.max(ClickFlush.epoch), 0)))
+        return result.scalar_one()
+
+
+async def _scan_batches(pattern: str, batch_size: int):
+    batch = []
+    async for key in redis_manager.client.scan_iter(match=pattern, count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _apply_pending(epoch: int) -> int:
+    redis_client = redis_manager.client
+    pending = await redis_client.hgetall(PENDING_KEY)
+    deltas = {code: int(value) for code, value in pending.items() if int(value)}
+    
+    # urls.clicks and the epoch marker commit together
+    async with AsyncSessionLocal() as session:
+        await add_clicks(session, deltas)
+        session.add(ClickFlush(epoch=epoch, clicks=sum(deltas.values())))
+        await session.commit()
+    
+    await redis_client.delete(PENDING_KEY, PENDING_EPOCH_KEY)
+    return sum(deltas.values())
+
+
+class ClickCounterFlusher:
+    """Runs flush_click_counters every `interval` seconds in the background."""
+
+    def __init__(self, interval: float = 30.0, batch_size: int = 500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None and redis_manager.client:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the loop and write back whatever has accumulated."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await flush_click_counters(self.batch_size)
+        except Exception as e:
+            logger.warning(f"Final click counter flush failed: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                flushed = await flush_click_counters(self.batch_size)
+                if flushed:
+                    logger.info(f"Wrote back {flushed} clicks from Redis counters")
+            except Exception as e:
+                logger.warning(f"Click counter flush failed: {e}")
+
+
+click_counter_flusher = ClickCounterFlusher(
+    interval=settings.click_counter_flush_interval,
+    batch_size=settings.click_counter_flush_batch_size,
+)
@@ -0,0 +1,407 @@
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models.click import Click
+from app.services.http_cache import bump_analytics_versions
+from app.services.rollups import apply_rollups
+from app.services.sketches import update_sketches
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CLICK_COLUMNS = ["url_id", "ip_address", "user_agent", "referrer", "country", "clicked_at"]
+
+# Spilled clicks whose write keeps failing go to the quarantine file after this many tries
+MAX_SPILL_ATTEMPTS = 10
+
+# Queue markers understood by the worker
+_FLUSH = object()
+_STOP = object()
+
+
+def is_bad_data(error: Exception) -> bool:
+    """Errors caused by the rows themselves (constraint violations, invalid values), which retrying can't fix."""
+    if isinstance(error, (IntegrityError, DataError)):
+        return True
+    # asyncpg errors from COPY: SQLSTATE classes 22 (data) and 23 (integrity)
+    sqlstate = getattr(error, "sqlstate", None)
+    return bool(sqlstate) and sqlstate[:2] in ("22", "23")
+
+
+class ClickIngestor:
+    """
+    Bounded in-process queue of click events, drained by a background worker.
+
+    Redirects call enqueue() and return immediately. The worker writes rows in
+    batches of up to batch_size, or whatever has arrived after flush_interval
+    seconds, using COPY on Postgres and a multi-row INSERT elsewhere.
+
+    When the queue is full the overflow policy decides what happens:
+    "drop" discards the event, "block" waits up to block_timeout for room,
+    "spill" appends it to an NDJSON file that is replayed once the queue drains.
+    Spilled events are buffered in memory and appended off the event loop by a
+    background task, so an overflowing redirect never waits on file I/O.
+
+    With the spill policy, a batch that fails to write is spilled too. A batch
+    rejected for its data is split in halves until the good rows land, and the
+    rows that still fail on their own go to `{spill_path}.quarantine`, as do
+    spilled rows that failed MAX_SPILL_ATTEMPTS times.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        overflow_policy: str = "drop",
+        block_timeout: float = 0.05,
+        spill_path: str = "clicks-spill.ndjson",
+        use_copy: bool = True,
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+        self.use_copy = use_copy
+
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.failed = 0
+        self.quarantined = 0
+
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._overflow: list[dict] = []
+        self._spiller: asyncio.Task | None = None
+        # Replay only while writes succeed, so an outage doesn't use up spill attempts
+        self._writable = True
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "failed": self.failed,
+            "quarantined": self.quarantined,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+        }
+
+    async def start(self) -> None:
+        """
+        Start the background worker. Events spilled by a previous run are
+        replayed first, including replays a dead worker left unfinished.
+        """
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Write everything still queued, then stop the worker."""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._worker, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Click ingestion did not drain within {timeout}s, {self._queue.qsize()} events lost")
+        self._worker = None
+        await self.flush_overflow()
+
+    async def flush(self) -> None:
+        """Write everything enqueued so far without waiting for the flush interval."""
+        if not self.running:
+            return
+        await self._queue.put(_FLUSH)
+        await self._queue.join()
+
+    async def enqueue(self, click: dict) -> None:
+        """Hand a click event to the worker, applying the overflow policy when full."""
+        if self._queue is None:
+            self.dropped += 1
+            return
+
+        try:
+            self._queue.put_nowait(click)
+            self.queued += 1
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.overflow_policy == "block":
+            try:
+                await asyncio.wait_for(self._queue.put(click), self.block_timeout)
+                self.queued += 1
+                return
+            except asyncio.TimeoutError:
+                pass
+        elif self.overflow_policy == "spill":
+            # Bounded like the queue, in case the disk can't keep up either
+            if len(self._overflow) < self.max_size:
+                self._overflow.append(click)
+                if self._spiller is None or self._spiller.done():
+                    self._spiller = asyncio.create_task(self._spill_overflow())
+                return
+
+        self.dropped += 1
+
+    async def flush_overflow(self) -> None:
+        """Wait until buffered overflow events are on disk."""
+        if self._spiller is not None:
+            await self._spiller
+
+    async def _spill_overflow(self) -> None:
+        while self._overflow:
+            clicks, self._overflow = self._overflow, []
+            if not await asyncio.to_thread(self._spill, clicks):
+                self.dropped += len(clicks)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        await self._replay_abandoned()
+        await self._replay_spill()
+        while True:
+            item = await self._queue.get()
+            taken = 1
+            batch = []
+            stop = False
+            deadline = loop.time() + self.flush_interval
+
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if item is _FLUSH:
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                taken += 1
+
+            if batch:
+                await self._write_batch(batch)
+            for _ in range(taken):
+                self._queue.task_done()
+
+            if stop:
+                return
+            if self._queue.empty() and self._writable:
+                await self._replay_spill()
+
+    async def _write_batch(self, batch: list[dict]) -> None:
+        try:
+            await self._insert(batch)
+        except Exception as e:
+            if is_bad_data(e) and len(batch) > 1:
+                # One bad row fails the whole statement: retry in halves so the good rows land
+                middle = len(batch) // 2
+                await self._write_batch(batch[:middle])
+                await self._write_batch(batch[middle:])
+                return
+            logger.warning(f"Failed to write {len(batch)} clicks: {e}")
+            if self.overflow_policy != "spill":
+                self.failed += len(batch)
+                return
+            if is_bad_data(e):
+                await self._quarantine(batch)
+                return
+            self._writable = False
+            for click in batch:
+                click["_attempts"] = click.get("_attempts", 0) + 1
+            exhausted = [click for click in batch if click["_attempts"] >= MAX_SPILL_ATTEMPTS]
+            retry = [click for click in batch if click["_attempts"] < MAX_SPILL_ATTEMPTS]
+            if exhausted:
+                await self._quarantine(exhausted)
+            if retry and not await asyncio.to_thread(self._spill, retry):
+                self.failed += len(retry)
+            return
+        self._writable = True
+        self.flushed += len(batch)
+        # Only after the commit, so a spilled and replayed batch isn't counted twice
+        await update_sketches(batch)
+        await bump_analytics_versions({click["url_id"] for click in batch})
+
+    async def _insert(self, batch: list[dict]) -> None:
+        rows = [{column: click.get(column) for column in CLICK_COLUMNS} for click in batch]
+        async with AsyncSessionLocal() as session:
+            # Rollups commit with the raw rows, so they can't drift apart.
+            # They go first: asyncpg only opens the transaction on the first
+            # statement, and a COPY on the driver connection before that
+            # would commit on its own.
+            await apply_rollups(session, batch)
+            if self.use_copy and session.bind.dialect.name == "postgresql":
+                connection = await session.connection()
+                raw = await connection.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(
+                    Click.__tablename__,
+                    records=[tuple(row.values()) for row in rows],
+                    columns=CLICK_COLUMNS,
+                )
+            else:
+                # Rendered as multi-row INSERT ... VALUES by SQLAlchemy's insertmanyvalues
+                await session.execute(insert(Click), rows)
+            await session.commit()
+
+    async def _quarantine(self, clicks: list[dict]) -> None:
+        """Set clicks aside for inspection; move the file back to the spill path to retry them."""
+        quarantine_path = f"{self.spill_path}.quarantine"
+        if await asyncio.to_thread(self._append, quarantine_path, clicks):
+            logger.error(f"Quarantined {len(clicks)} clicks that can't be written in {quarantine_path}")
+            self.quarantined += len(clicks)
+        else:
+            self.failed += len(clicks)
+
+    def _spill(self, clicks: list[dict]) -> bool:
+        if not self._append(self.spill_path, clicks):
+            return False
+        # Clicks spilled again after a failed replay were counted the first time
+        self.spilled += sum(1 for click in clicks if click.get("_attempts", 0) <= 1)
+        return True
+
+    def _append(self, path: str, clicks: list[dict]) -> bool:
+        lines = "".join(json.dumps(click, default=datetime.isoformat) + "\n" for click in clicks)
+        try:
+            # One append per batch, so workers sharing the file don't interleave lines
+            with open(path, "a") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning(f"Failed to write clicks to {path}: {e}")
+            return False
+        return True
+
+    async def _replay_spill(self) -> None:
+        # Move the file aside so new spills don't interleave with the replay.
+        # The rename is atomic, so with several workers exactly one claims it.
+        replay_path = f"{self.spill_path}.replay.{uuid.uuid4().hex}"
+        try:
+            await asyncio.to_thread(os.replace, self.spill_path, replay_path)
+        except OSError:
+            return
+        await self._replay_file(replay_path)
+
+    async def _replay_abandoned(self) -> None:
+        """Finish replays whose worker died mid-way; its lock died with it."""
+        prefix = f"{self.spill_path}.replay."
+        paths = await asyncio.to_thread(glob.glob, f"{glob.escape(prefix)}*")
+        for path in paths:
+            # Skip the .offset files kept next to them
+            if "." not in path[len(prefix):]:
+                await self._replay_file(path)
+
+    async def _replay_file(self, replay_path: str) -> None:
+        f = await asyncio.to_thread(_lock_replay_file, replay_path)
+        if f is None:
+            # Being replayed by a live worker, or already done
+            return
+        offset_path = f"{replay_path}.offset"
+        try:
+            # Resume after the last batch a previous attempt got through
+            offset = await asyncio.to_thread(_read_offset, offset_path)
+            await asyncio.to_thread(f.seek, offset)
+            while True:
+                batch, offset = await asyncio.to_thread(self._read_batch, f)
+                if not batch:
+                    break
+                await self._write_batch(batch)
+                await asyncio.to_thread(_write_offset, offset_path, offset)
+            await asyncio.to_thread(_remove_files, replay_path, offset_path)
+        finally:
+            f.close()
+        logger.info(f"Replayed spilled clicks from {replay_path}")
+
+    def _read_batch(self, f) -> tuple[list[dict], int]:
+        """Up to batch_size spilled clicks from f, and the offset after them."""
+        batch = []
+        while len(batch) < self.batch_size:
+            line = f.readline()
+            if not line:
+                break
+            try:
+                click = json.loads(line)
+            except ValueError:
+                # Torn write from a crash mid-spill
+                continue
+            if click.get("clicked_at"):
+                click["clicked_at"] = datetime.fromisoformat(click["clicked_at"])
+            batch.append(click)
+        return batch, f.tell()
+
+
+def _lock_replay_file(path: str):
+    """Open a replay file holding an exclusive lock, or None if someone else holds it."""
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    if os.fstat(f.fileno()).st_nlink == 0:
+        # Finished and removed by the worker we waited for
+        f.close()
+        return None
+    return f
+
+
+def _read_offset(path: str) -> int:
+    try:
+        with open(path) as f:
+            return int(f.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_offset(path: str, offset: int) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(offset))
+    os.replace(tmp_path, path)
+
+
+def _remove_files(*paths: str) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+click_ingestor = ClickIngestor(
+    max_size=settings.click_queue_size,
+    batch_size=settings.click_batch_size,
+    flush_interval=settings.click_flush_interval,
+    overflow_policy=settings.click_overflow_policy,
+    block_timeout=settings.click_block_timeout,
+    spill_path=settings.click_spill_path,
+    use_copy=settings.click_use_copy,
+)
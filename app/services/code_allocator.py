@@ -0,0 +1,107 @@
+"""
+Short code allocation strategies.
+
+"random" draws random codes and relies on the unique index (INSERT ... ON
+CONFLICT DO NOTHING) to reject collisions. "counter" leases blocks of ids
+from a Postgres sequence or a Redis INCRBY and base62-encodes them, so codes
+never collide with each other; an optional keyed shuffle keeps them from
+being guessable.
+"""
+import asyncio
+from collections import deque
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.redis_client import redis_manager
+from app.utils.base62 import ALPHABET, BASE, encode, generate_short_code
+from app.utils.feistel import permute
+
+settings = get_settings()
+
+SEQUENCE_NAME = "short_code_seq"
+REDIS_COUNTER_KEY = "short_code:counter"
+
+
+class RandomCodeAllocator:
+    def __init__(self, length: int = 7):
+        self.length = length
+
+    async def allocate(self, db: AsyncSession, count: int = 1, attempt: int = 0) -> list[str]:
+        # Every 10 failed attempts, grow the code by one character
+        length = self.length + attempt // 10
+        return [generate_short_code(length) for _ in range(count)]
+
+
+class CounterCodeAllocator:
+    """Hands out ids from leased blocks; one round trip per block_size codes."""
+
+    def __init__(
+        self,
+        backend: str = "postgres",
+        block_size: int = 1000,
+        min_length: int = 7,
+        shuffle_key: str | None = None,
+    ):
+        self.backend = backend
+        self.block_size = block_size
+        self.min_length = min_length
+        self.shuffle_key = shuffle_key.encode() if shuffle_key else None
+        self._ids: deque[int] = deque()
+        self._lock = asyncio.Lock()
+        # The sequence's INCREMENT BY, read once: each nextval is the start of a block that size
+        self._sequence_block: int | None = None
+
+    async def allocate(self, db: AsyncSession, count: int = 1, attempt: int = 0) -> list[str]:
+        async with self._lock:
+            while len(self._ids) < count:
+                self._ids.extend(await self._lease(db, max(self.block_size, count - len(self._ids))))
+            return [self.encode_id(self._ids.popleft()) for _ in range(count)]
+
+    def encode_id(self, num: int) -> str:
+        """
+        Map an id to a code. Ids fill every min_length code first, then every
+        min_length + 1 code, and so on, so the mapping stays one-to-one.
+        """
+        length = self.min_length
+        while num >= BASE ** length:
+            num -= BASE ** length
+            length += 1
+        if self.shuffle_key:
+            num = permute(num, BASE ** length, self.shuffle_key)
+        return encode(num).rjust(length, ALPHABET[0])
+
+    async def _lease(self, db: AsyncSession, size: int) -> list[int]:
+        if self.backend == "redis":
+            if not redis_manager.client:
+                raise RuntimeError("Counter code allocation with the redis backend needs REDIS_URL")
+            end = await redis_manager.client.incrby(REDIS_COUNTER_KEY, size)
+            return list(range(end - size, end))
+        
+        # Blocks come from the sequence's increment rather than block_size, so
+        # workers configured differently still never lease overlapping ids
+        if self._sequence_block is None:
+            result = await db.execute(
+                text("SELECT increment_by FROM pg_sequences WHERE sequencename = :name"),
+                {"name": SEQUENCE_NAME},
+            )
+            self._sequence_block = result.scalar_one()
+        block = self._sequence_block
+        result = await db.execute(
+            text(f"SELECT nextval('{SEQUENCE_NAME}') FROM generate_series(1, :blocks)"),
+            {"blocks": -(-size // block)},
+        )
+        return [num for (start,) in result for num in range(start, start + block)]
+
+
+def build_allocator():
+    if settings.code_strategy == "counter":
+        return CounterCodeAllocator(
+            backend=settings.code_counter_backend,
+            block_size=settings.code_block_size,
+            min_length=settings.code_length,
+            shuffle_key=settings.code_shuffle_key,
+        )
+    return RandomCodeAllocator(length=settings.code_length)
+
+
+code_allocator = build_allocator()
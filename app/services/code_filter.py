@@ -0,0 +1,96 @@
+"""
+Bloom filter of every existing short code, per worker.
+
+A code the filter has never seen doesn't exist, unless another worker has
+just created it, so a lookup the filter rules out is answered 404 from
+Redis alone, never from Postgres. The filter is rebuilt from the urls table
+each time the cache listener subscribes; codes created afterwards are added
+locally and announced to the other workers through its pub/sub channel.
+Without that subscription (no Redis) the filter stays off, since it would
+never learn about codes created by other workers.
+"""
+import logging
+import time
+from sqlalchemy import select
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models.url import URL
+from app.utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class CodeFilter:
+    def __init__(self, capacity: int, error_rate: float, enabled: bool = True):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom: BloomFilter | None = None
+        self.ready = False
+        # Set by the cache listener while it receives new-code announcements
+        self.listening = False
+
+    @property
+    def bloom(self) -> BloomFilter:
+        # Allocated on first use, so disabled workers never hold the bit array
+        if self._bloom is None:
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+        return self._bloom
+
+    def might_exist(self, short_code: str) -> bool:
+        """False only when the code certainly doesn't exist."""
+        if not self.enabled or not self.ready:
+            return True
+        return short_code in self.bloom
+
+    def add(self, short_code: str) -> None:
+        if self.enabled:
+            self.bloom.add(short_code)
+
+    def invalidate(self) -> None:
+        """Stop answering from the filter until the next rebuild (e.g. missed updates)."""
+        self.ready = False
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "items": self.bloom.approximate_count,
+            "capacity": self.bloom.capacity,
+            "hashes": self.bloom.num_hashes,
+            "memory_bytes": self.bloom.size_bytes,
+            "false_positive_rate": self.bloom.false_positive_rate,
+        }
+
+
+async def rebuild_code_filter(batch_size: int = 10000) -> None:
+    """Load every short code from the urls table into the filter."""
+    if not code_filter.enabled:
+        return
+    
+    start = time.perf_counter()
+    # Codes are never deleted, so the rebuild only adds bits; codes created
+    # while it streams are kept
+    async with AsyncSessionLocal() as session:
+        result = await session.stream_scalars(
+            select(URL.short_code).execution_options(yield_per=batch_size)
+        )
+        async for short_code in result:
+            code_filter.bloom.add(short_code)
+    # Lost the subscription while streaming: the filter may already be behind
+    code_filter.ready = code_filter.listening
+    
+    count = code_filter.bloom.approximate_count
+    if count > code_filter.bloom.capacity:
+        logger.warning(
+            f"Code filter holds ~{count} codes, over its capacity of "
+            f"{code_filter.bloom.capacity}; false-positive rate is {code_filter.bloom.false_positive_rate:.4f}"
+        )
+    logger.info(f"Rebuilt code filter with ~{count} codes in {time.perf_counter() - start:.2f}s")
+
+
+code_filter = CodeFilter(
+    capacity=settings.code_filter_capacity,
+    error_rate=settings.code_filter_error_rate,
+    enabled=settings.code_filter_enabled,
+)
@@ -0,0 +1,80 @@
+"""
+ETag / If-None-Match and Cache-Control for the read endpoints.
+
+Analytics only change when the click ingestor writes a batch, and each batch
+stamps the affected URLs with a new version in Redis. The analytics ETag is
+derived from that stamp, so a poll whose If-None-Match still matches gets a
+304 before any aggregation query runs.
+"""
+from fastapi import Response
+from app.config import get_settings
+from app.instrumentation import record_redis_error
+from app.redis_client import redis_manager
+import hashlib
+import time
+
+settings = get_settings()
+
+# A lost stamp is simply recreated; it only costs one recomputation
+VERSION_TTL = 86400
+
+
+def analytics_version_key(url_id: int) -> str:
+    return f"analytics:version:{url_id}"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+async def bump_analytics_versions(url_ids: set[int]) -> None:
+    """Give each URL a new analytics version, in one pipeline."""
+    redis_client = redis_manager.client
+    if not redis_client or not url_ids:
+        return
+    # Time-based rather than INCR: a stamp recreated after a Redis flush
+    # can't repeat one a client still holds
+    version = time.time_ns()
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for url_id in url_ids:
+                pipe.set(analytics_version_key(url_id), version, ex=VERSION_TTL)
+            await pipe.execute()
+    except Exception:
+        record_redis_error("set")
+
+
+async def get_analytics_version(url_id: int) -> str | None:
+    """Current analytics version of a URL, or None when Redis can't tell."""
+    redis_client = redis_manager.client
+    if not redis_client:
+        return None
+    key = analytics_version_key(url_id)
+    try:
+        version = await redis_client.get(key)
+        if version is None:
+            await redis_client.set(key, time.time_ns(), ex=VERSION_TTL, nx=True)
+            version = await redis_client.get(key)
+        return version
+    except Exception:
+        record_redis_error("get")
+        return None
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def cache_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={settings.read_cache_max_age}"}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
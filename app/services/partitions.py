@@ -0,0 +1,148 @@
+"""
+Monthly range partitions for the clicks table (Postgres only).
+
+The partitioning itself is opt-in at migration time
+(`alembic -x partition_clicks=true upgrade head`). Once clicks is
+partitioned, partitions are created a few months ahead of time and old
+months are dropped whole instead of being DELETEd row by row.
+"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+PARTITION_NAME = re.compile(r"^clicks_y(\d{4})m(\d{2})$")
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def current_month() -> date:
+    return datetime.now(timezone.utc).date().replace(day=1)
+
+
+def partition_name(month: date) -> str:
+    return f"clicks_y{month.year:04d}m{month.month:02d}"
+
+
+async def clicks_partitioned(db: AsyncSession) -> bool:
+    """Whether the clicks table has been converted to a partitioned table."""
+    if db.bind.dialect.name != "postgresql":
+        return False
+    result = await db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'clicks' AND c.relnamespace = 'public'::regnamespace"
+    ))
+    return result.scalar() is not None
+
+
+async def list_click_partitions(db: AsyncSession) -> list[str]:
+    result = await db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'public.clicks'::regclass "
+        "ORDER BY c.relname"
+    ))
+    return list(result.scalars())
+
+
+async def create_click_partitions(months_ahead: int) -> list[str]:
+    """Create the partitions for this month and the next `months_ahead` months."""
+    async with AsyncSessionLocal() as session:
+        if not await clicks_partitioned(session):
+            return []
+        existing = set(await list_click_partitions(session))
+        created = []
+        
+        month = current_month()
+        for offset in range(months_ahead + 1):
+            start = add_months(month, offset)
+            name = partition_name(start)
+            if name in existing:
+                continue
+            await session.execute(text(
+                # IF NOT EXISTS: every worker runs this, possibly at the same time
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF clicks "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+            ))
+            created.append(name)
+        
+        await session.commit()
+        return created
+
+
+async def drop_click_partitions(retain_months: int, dry_run: bool = False) -> list[str]:
+    """
+    Drop monthly partitions older than `retain_months` full months.
+
+    The rollup tables are not touched, so aggregate analytics survive.
+    """
+    if retain_months < 1:
+        raise ValueError("retain_months must be at least 1")
+    cutoff = add_months(current_month(), -retain_months)
+    
+    async with AsyncSessionLocal() as session:
+        if not await clicks_partitioned(session):
+            return []
+        expired = []
+        for name in await list_click_partitions(session):
+            match = PARTITION_NAME.match(name)
+            if match and date(int(match[1]), int(match[2]), 1) < cutoff:
+                expired.append(name)
+        
+        if not dry_run:
+            for name in expired:
+                await session.execute(text(f"ALTER TABLE clicks DETACH PARTITION {name}"))
+                await session.execute(text(f"DROP TABLE {name}"))
+            await session.commit()
+        return expired
+
+
+class ClickPartitionMaintainer:
+    """Keeps `months_ahead` months of click partitions created, checking every `interval` seconds."""
+
+    def __init__(self, months_ahead: int = 3, interval: float = 6 * 3600):
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None and self.months_ahead > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                created = await create_click_partitions(self.months_ahead)
+                if created:
+                    logger.info(f"Created click partitions: {', '.join(created)}")
+            except Exception as e:
+                logger.warning(f"Click partition maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+click_partition_maintainer = ClickPartitionMaintainer(
+    months_ahead=settings.click_partitions_ahead,
+    interval=settings.click_partition_check_interval,
+)
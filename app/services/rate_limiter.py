@@ -1,59 +1,304 @@
-import redis.asyncio as redis
-from fastapi import HTTPException, status, Request
+from redis.exceptions import NoScriptError
+from fastapi import HTTPException, status, Request, Response
 from app.config import get_settings
+from app.instrumentation import record_redis_error, timed
+from app.redis_client import RedisBatch, redis_manager
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import math
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-redis_client = None
 
-try:
-    if settings.redis_url:
-        redis_client = redis.from_url(settings.redis_url, decode_responses=True)
-except Exception as e:
-    logger.warning(f"Redis not available for rate limiting: {e}")
+# GCRA (generic cell rate algorithm): a sliding token bucket stored as a single
+# "theoretical arrival time" per key. Check and update happen atomically in one
+# round trip, using the Redis clock so every worker agrees on "now".
+# KEYS[1]: bucket key. ARGV: limit, window (ms), cost.
+# Returns {allowed, remaining, retry_after_ms, reset_after_ms}.
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local interval = window / limit
 
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + tonumber(time[2]) / 1000
 
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + cost * interval
+local allow_at = new_tat - window
+if now < allow_at then
+    return {0, 0, math.ceil(allow_at - now), math.ceil(tat - now)}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.max(1, math.ceil(new_tat - now)))
+return {1, math.floor((now - allow_at) / interval), 0, math.ceil(new_tat - now)}
+"""
+GCRA_SHA = hashlib.sha1(GCRA_SCRIPT.encode()).hexdigest()
+
+# Hybrid mode sync: record requests a worker already admitted locally. Always
+# records (saturating at a full window) and reports the shared remaining quota.
+# KEYS[1]: bucket key. ARGV: limit, window (ms), admitted count.
+# Returns {remaining, reset_after_ms}.
+SYNC_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local interval = window / limit
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + tonumber(time[2]) / 1000
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = math.min(tat + cost * interval, now + window)
+if cost > 0 then
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.max(1, math.ceil(new_tat - now)))
+end
+return {math.floor((now + window - new_tat) / interval), math.ceil(new_tat - now)}
+"""
+SYNC_SHA = hashlib.sha1(SYNC_SCRIPT.encode()).hexdigest()
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the next request would be allowed (0 when allowed)
+    retry_after: float
+    # Seconds until the full quota is available again
+    reset_after: float
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "pending", "since_sync", "synced_at", "syncing")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        # Requests admitted locally and not yet reported to Redis
+        self.pending = 0
+        self.since_sync = 0
+        # Never synced: a new key checks in with Redis on its first request
+        self.synced_at = float("-inf")
+        self.syncing = False
+
+
+class LocalRateLimiter:
+    """
+    Per-worker token buckets, one per client key.
+
+    Used on its own ("local" mode, or whenever Redis is unreachable) and as
+    the pre-filter of "hybrid" mode. Memory is bounded by max_keys; the least
+    recently used (idle) keys are evicted first.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self.evictions = 0
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, limit: int, window: float) -> tuple[RateLimitResult, TokenBucket]:
+        now = time.monotonic()
+        rate = limit / window
+        
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(float(limit), now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(float(limit), bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+        
+        allowed = bucket.tokens >= 1
+        if allowed:
+            bucket.tokens -= 1
+            bucket.pending += 1
+            bucket.since_sync += 1
+        
+        result = RateLimitResult(
+            allowed=allowed,
+            limit=limit,
+            remaining=int(bucket.tokens),
+            retry_after=0 if allowed else (1 - bucket.tokens) / rate,
+            reset_after=(limit - bucket.tokens) / rate,
+        )
+        return result, bucket
+
+
+local_limiter = LocalRateLimiter(max_keys=settings.rate_limit_local_max_keys)
+
+
+def apply_rate_limit_headers(response: Response, result: RateLimitResult | None) -> None:
+    if result is not None:
+        response.headers.update(result.headers())
+
+
+async def _run_script(client, script: str, sha: str, key: str, *args) -> list:
+    try:
+        return await client.evalsha(sha, 1, key, *args)
+    except NoScriptError:
+        return await client.eval(script, 1, key, *args)
+
+
+async def _check_redis(client, key: str, max_requests: int, window_seconds: int) -> RateLimitResult:
+    """Shared limit: one atomic GCRA round trip per check."""
+    allowed, remaining, retry_after_ms, reset_after_ms = await _run_script(
+        client, GCRA_SCRIPT, GCRA_SHA, key, max_requests, window_seconds * 1000, 1
+    )
+    return RateLimitResult(
+        allowed=bool(allowed),
+        limit=max_requests,
+        remaining=int(remaining),
+        retry_after=retry_after_ms / 1000,
+        reset_after=reset_after_ms / 1000,
+    )
+
+
+async def _check_hybrid(client, key: str, max_requests: int, window_seconds: int) -> RateLimitResult:
+    """
+    Decide locally; report to the shared Redis bucket only every
+    rate_limit_sync_every requests or rate_limit_sync_interval_ms per key.
+
+    Between syncs each worker can admit at most rate_limit_sync_every
+    requests the shared limit wouldn't have, so the overshoot is bounded
+    by workers * rate_limit_sync_every per key.
+    """
+    result, bucket = local_limiter.take(key, max_requests, window_seconds)
+    
+    now = time.monotonic()
+    due = (
+        bucket.since_sync >= settings.rate_limit_sync_every
+        or (now - bucket.synced_at) * 1000 >= settings.rate_limit_sync_interval_ms
+    )
+    if not due or bucket.syncing:
+        return result
+    
+    admitted, bucket.pending = bucket.pending, 0
+    bucket.since_sync = 0
+    bucket.synced_at = now
+    bucket.syncing = True
+    try:
+        remaining, _ = await _run_script(
+            client, SYNC_SCRIPT, SYNC_SHA, key, max_requests, window_seconds * 1000, admitted
+        )
+        # Adopt the shared view: other workers' requests count against us too
+        bucket.tokens = min(bucket.tokens, float(remaining))
+        bucket.updated = time.monotonic()
+    except Exception:
+        # Redis down: this worker's bucket keeps enforcing on its own
+        record_redis_error("rate_limit_sync")
+    finally:
+        bucket.syncing = False
+    return result
+
+
+@timed("check_rate_limit")
 async def check_rate_limit(
     key: str,
     max_requests: int = 10,
     window_seconds: int = 60,
-) -> None:
+    batch: RedisBatch | None = None,
+) -> RateLimitResult | None:
     """
     Check if rate limit exceeded.
-    Skip if Redis not available.
+    Skip if Redis is not configured (unless in "local" mode); if Redis is
+    configured but failing, enforce the limit per worker instead.
+    A request-scoped batch lets the check share a round trip with other commands.
     """
-    if not redis_client:
-        return
+    if not settings.rate_limit_enabled:
+        return None
     
-    try:
-        current = await redis_client.get(key)
-        
-        if current is None:
-            await redis_client.set(key, 1, ex=window_seconds)
-        elif int(current) >= max_requests:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate limit exceeded. Try again in {window_seconds} seconds.",
-            )
-        else:
-            await redis_client.incr(key)
-    except HTTPException:
-        raise
-    except Exception:
-        pass
+    mode = settings.rate_limit_mode
+    client = batch or redis_manager.client
+    if mode == "local":
+        result, _ = local_limiter.take(key, max_requests, window_seconds)
+    elif not client:
+        return None
+    elif mode == "hybrid":
+        result = await _check_hybrid(client, key, max_requests, window_seconds)
+    else:
+        try:
+            result = await _check_redis(client, key, max_requests, window_seconds)
+        except Exception as e:
+            record_redis_error("rate_limit")
+            logger.debug(f"Rate limit falling back to local bucket: {e}")
+            result, _ = local_limiter.take(key, max_requests, window_seconds)
+    
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded. Try again in {math.ceil(result.retry_after)} seconds.",
+            headers=result.headers(),
+        )
+    return result
+
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def rate_limit_by_ip(request: Request, batch: RedisBatch | None = None) -> RateLimitResult | None:
+    """Rate limit redirects by IP address."""
+    return await check_rate_limit(
+        f"rate_limit:{_client_ip(request)}",
+        settings.rate_limit_redirect_requests,
+        settings.rate_limit_redirect_window,
+        batch,
+    )
+
+
+async def rate_limit_shorten(request: Request) -> RateLimitResult | None:
+    """Stricter rate limit for creating URLs."""
+    return await check_rate_limit(
+        f"rate_limit:shorten:{_client_ip(request)}",
+        settings.rate_limit_shorten_requests,
+        settings.rate_limit_shorten_window,
+    )
 
 
-async def rate_limit_by_ip(request: Request, max_requests: int = 10, window_seconds: int = 60) -> None:
-    """Rate limit by IP address."""
-    client_ip = request.client.host if request.client else "unknown"
-    key = f"rate_limit:{client_ip}"
-    await check_rate_limit(key, max_requests, window_seconds)
+async def rate_limit_export(request: Request) -> RateLimitResult | None:
+    """Click exports stream whole tables: limited per request, like bulk creation."""
+    return await check_rate_limit(
+        f"rate_limit:export:{_client_ip(request)}",
+        settings.rate_limit_export_requests,
+        settings.rate_limit_export_window,
+    )
 
 
-async def rate_limit_shorten(request: Request) -> None:
-    """Stricter rate limit for creating URLs: 5 per minute."""
-    client_ip = request.client.host if request.client else "unknown"
-    key = f"rate_limit:shorten:{client_ip}"
-    await check_rate_limit(key, max_requests=5, window_seconds=60)
\ No newline at end of file
+async def rate_limit_shorten_bulk(request: Request) -> RateLimitResult | None:
+    """Bulk creation: limited per request, however many URLs each carries."""
+    return await check_rate_limit(
+        f"rate_limit:shorten_bulk:{_client_ip(request)}",
+        settings.rate_limit_bulk_requests,
+        settings.rate_limit_bulk_window,
+    )
@@ -0,0 +1,60 @@
+"""
+Incremental click rollups, maintained by the click ingestion worker.
+
+Every batch of raw clicks is folded into per-hour click counts and per-day
+referrer counts in the same transaction that inserts the rows, so the
+rollups never drift from the clicks table.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import dialect_insert
+from app.models.click_rollup import ClickHourly, ReferrerDaily
+
+# Longer referrers are truncated to fit the rollup key
+MAX_REFERRER_LENGTH = 512
+
+
+def hour_bucket(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def aggregate_clicks(clicks: list[dict]) -> tuple[Counter, Counter]:
+    """Count a batch of click events per (url_id, hour) and per (url_id, day, referrer)."""
+    hourly = Counter()
+    referrers = Counter()
+    for click in clicks:
+        bucket = hour_bucket(click.get("clicked_at") or datetime.now(timezone.utc))
+        hourly[(click["url_id"], bucket)] += 1
+        if click.get("referrer"):
+            referrers[(click["url_id"], bucket.date(), click["referrer"][:MAX_REFERRER_LENGTH])] += 1
+    return hourly, referrers
+
+
+async def apply_rollups(db: AsyncSession, clicks: list[dict]) -> None:
+    """Add a batch of clicks to the rollup tables (upsert, clicks += n)."""
+    hourly, referrers = aggregate_clicks(clicks)
+    insert = dialect_insert(db)
+    
+    # Sorted so concurrent writers lock rows in the same order
+    if hourly:
+        stmt = insert(ClickHourly).values([
+            {"url_id": url_id, "bucket": bucket, "clicks": n}
+            for (url_id, bucket), n in sorted(hourly.items())
+        ])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[ClickHourly.url_id, ClickHourly.bucket],
+            set_={"clicks": ClickHourly.clicks + stmt.excluded.clicks},
+        ))
+    
+    if referrers:
+        stmt = insert(ReferrerDaily).values([
+            {"url_id": url_id, "day": day, "referrer": referrer, "clicks": n}
+            for (url_id, day, referrer), n in sorted(referrers.items())
+        ])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[ReferrerDaily.url_id, ReferrerDaily.day, ReferrerDaily.referrer],
+            set_={"clicks": ReferrerDaily.clicks + stmt.excluded.clicks},
+        ))
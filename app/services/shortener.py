@@ -1,46 +1,149 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, values, column, bindparam, any_, func, literal, tuple_, String, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.database import AsyncSessionLocal, dialect_insert, is_replica_session
+from app.instrumentation import timed, url_loads
 from app.models.url import URL
-from app.utils.base62 import generate_short_code
+from app.services.cache import MISSING, announce_new_url, announce_new_urls, set_cached_url, set_missing_url
+from app.services.code_allocator import code_allocator
+from app.utils.singleflight import SingleFlight
 from app.config import get_settings
+from datetime import datetime
+import time
 
 settings = get_settings()
 
 
+class ShortCodeTakenError(Exception):
+    """Raised when a custom short code is already in use."""
+
+
+# Give up after this many conflicting codes in a row
+MAX_ALLOCATION_ATTEMPTS = 30
+
+
+# Rows per multi-row INSERT; keeps bind parameters well under driver limits
+INSERT_CHUNK_SIZE = 1000
+
+
+async def _insert_urls(db: AsyncSession, rows: list[dict]) -> dict[str, URL]:
+    """
+    Insert URLs with multi-row INSERT ... ON CONFLICT DO NOTHING.
+    Returns the inserted URLs by short code; taken codes are missing.
+    """
+    inserted = {}
+    for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+        stmt = (
+            dialect_insert(db)(URL)
+            .values(rows[i:i + INSERT_CHUNK_SIZE])
+            .on_conflict_do_nothing(index_elements=[URL.short_code])
+            .returning(URL)
+        )
+        for url in await db.scalars(stmt):
+            inserted[url.short_code] = url
+    return inserted
+
+
+async def _insert_url(db: AsyncSession, short_code: str, original_url: str, expires_at, redirect_status: int) -> URL | None:
+    """Insert a URL, or return None if the short code is already taken."""
+    row = {
+        "short_code": short_code,
+        "original_url": original_url,
+        "expires_at": expires_at,
+        "redirect_status": redirect_status,
+    }
+    return (await _insert_urls(db, [row])).get(short_code)
+
+
 async def create_short_url(
     db: AsyncSession,
     original_url: str,
     custom_code: str | None = None,
     expires_at = None,
+    redirect_status: int = 307,
 ) -> URL:
-    # Use custom code or generate one
+    # Use custom code or allocate one; the unique index catches collisions
     if custom_code:
-        short_code = custom_code
+        url = await _insert_url(db, custom_code, original_url, expires_at, redirect_status)
+        if url is None:
+            raise ShortCodeTakenError(custom_code)
     else:
-        short_code = await generate_unique_code(db)
+        for attempt in range(MAX_ALLOCATION_ATTEMPTS):
+            short_code = (await code_allocator.allocate(db, 1, attempt))[0]
+            url = await _insert_url(db, short_code, original_url, expires_at, redirect_status)
+            if url is not None:
+                break
+        else:
+            raise RuntimeError(f"No free short code after {MAX_ALLOCATION_ATTEMPTS} attempts")
     
-    url = URL(
-        short_code=short_code,
-        original_url=original_url,
-        expires_at=expires_at,
-    )
-    db.add(url)
-    await db.flush()
-    await db.refresh(url)
+    await announce_new_url(url.short_code)
     return url
 
 
-async def generate_unique_code(db: AsyncSession, length: int = 7) -> str:
-    """Generate a unique short code that doesn't exist in DB."""
-    for _ in range(10):  # Max 10 attempts
-        code = generate_short_code(length)
-        existing = await get_url_by_code(db, code)
-        if not existing:
-            return code
-    # If still colliding, increase length
-    return await generate_unique_code(db, length + 1)
+def _url_row(short_code: str, item: dict) -> dict:
+    return {
+        "short_code": short_code,
+        "original_url": item["original_url"],
+        "expires_at": item["expires_at"],
+        "redirect_status": item["redirect_status"],
+    }
+
 
+async def create_short_urls(db: AsyncSession, items: list[dict]) -> list[URL | Exception]:
+    """
+    Create many URLs at once. Each item has original_url, custom_code,
+    expires_at and redirect_status. Returns, in item order, the created URL
+    or the error for it.
+    """
+    results: list[URL | Exception | None] = [None] * len(items)
+    
+    # Custom codes: first occurrence wins, the rest of the batch is a conflict
+    custom_rows = {}
+    for i, item in enumerate(items):
+        code = item["custom_code"]
+        if not code:
+            continue
+        if code in custom_rows:
+            results[i] = ShortCodeTakenError(code)
+        else:
+            custom_rows[code] = (i, item)
+    inserted = await _insert_urls(db, [
+        _url_row(code, item) for code, (_, item) in custom_rows.items()
+    ])
+    for code, (i, _) in custom_rows.items():
+        results[i] = inserted.get(code) or ShortCodeTakenError(code)
+    
+    # Generated codes: allocate in bulk, retry only the rows that collided
+    pending = [i for i, item in enumerate(items) if not item["custom_code"]]
+    for attempt in range(MAX_ALLOCATION_ATTEMPTS):
+        if not pending:
+            break
+        codes = await code_allocator.allocate(db, len(pending), attempt)
+        inserted = await _insert_urls(db, [
+            _url_row(code, items[i]) for i, code in zip(pending, codes)
+        ])
+        retry = []
+        for i, code in zip(pending, codes):
+            # pop: a code drawn twice in one batch is only inserted once
+            url = inserted.pop(code, None)
+            if url is None:
+                retry.append(i)
+            else:
+                results[i] = url
+        pending = retry
+    for i in pending:
+        results[i] = RuntimeError(f"No free short code after {MAX_ALLOCATION_ATTEMPTS} attempts")
+    
+    await announce_new_urls([url.short_code for url in results if isinstance(url, URL)])
+    return results
 
+
+async def generate_unique_code(db: AsyncSession) -> str:
+    """Allocate a short code from the configured strategy (not yet inserted)."""
+    return (await code_allocator.allocate(db, 1))[0]
+
+
+@timed("get_url_by_code")
 async def get_url_by_code(db: AsyncSession, short_code: str) -> URL | None:
     result = await db.execute(
         select(URL).where(URL.short_code == short_code)
@@ -48,9 +151,117 @@ async def get_url_by_code(db: AsyncSession, short_code: str) -> URL | None:
     return result.scalar_one_or_none()
 
 
-async def increment_clicks(db: AsyncSession, url: URL) -> None:
-    url.clicks += 1
-    await db.flush()
+def short_code_in(db: AsyncSession, short_codes: list[str]):
+    """WHERE clause matching any of the codes."""
+    if db.bind.dialect.name == "postgresql":
+        # short_code = ANY($1): one array parameter, one statement for any list length
+        return URL.short_code == any_(bindparam("short_codes", short_codes, type_=ARRAY(String)))
+    return URL.short_code.in_(short_codes)
+
+
+# Keyset columns for each listing order; the trailing id makes the key unique
+LIST_ORDERS = {
+    "created": (URL.created_at, URL.id),
+    "clicks": (URL.clicks, URL.id),
+}
+
+
+def _seek_past(db: AsyncSession, key: tuple, after: tuple):
+    value, last_id = after
+    if db.bind.dialect.name == "sqlite" and isinstance(value, datetime):
+        # SQLite keeps timestamps as text, and CURRENT_TIMESTAMP has no
+        # fractional seconds, so equal times can compare unequal as strings
+        return tuple_(func.julianday(key[0]), key[1]) < tuple_(func.julianday(literal(value, key[0].type)), last_id)
+    return tuple_(*key) < tuple_(value, last_id)
+
+
+async def list_urls(
+    db: AsyncSession,
+    limit: int,
+    order: str = "created",
+    after: tuple | None = None,
+    is_active: bool | None = None,
+    expires_before: datetime | None = None,
+) -> list[URL]:
+    """
+    One page of URLs, newest (or most clicked) first. `after` is the
+    (sort value, id) key of the previous page's last row: seeking past it on
+    an index costs the same at any depth, unlike OFFSET. expires_before in
+    created order reads the links that have an expiry and skips those
+    expiring later, so a narrow cutoff reads more than a page.
+    """
+    key = LIST_ORDERS[order]
+    stmt = select(URL)
+    if is_active is not None:
+        stmt = stmt.where(URL.is_active == is_active)
+    if expires_before is not None:
+        stmt = stmt.where(URL.expires_at < expires_before)
+    if after is not None:
+        stmt = stmt.where(_seek_past(db, key, after))
+    stmt = stmt.order_by(*(column.desc() for column in key)).limit(limit)
+    return list(await db.scalars(stmt))
+
+
+async def find_url_for_read(db: AsyncSession, short_code: str) -> URL | None:
+    """Look up a code on a read session, rechecking the primary if a lagging replica hasn't seen it yet."""
+    url = await get_url_by_code(db, short_code)
+    if url is None and is_replica_session(db):
+        async with AsyncSessionLocal() as primary:
+            url = await get_url_by_code(primary, short_code)
+    return url
+
+
+# In-flight cache fills, so a hot code that just expired is loaded once per worker
+_url_loads = SingleFlight()
+
+
+async def _load_url_entry(short_code: str) -> dict:
+    # Own session: the load outlives any single request awaiting it. On the
+    # primary, because a lagging replica could re-cache a link that was just
+    # deactivated as active for a whole CACHE_TTL
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        url = await get_url_by_code(db, short_code)
+    if url is None:
+        await set_missing_url(short_code)
+        return MISSING
+    return await set_cached_url(url, load_seconds=time.perf_counter() - start)
+
+
+async def load_url_entry(short_code: str) -> dict:
+    """
+    Fill the cache for a code after a miss and return its entry (MISSING if
+    the code doesn't exist). Concurrent misses for the same code share one DB load.
+    """
+    url_loads.inc("shared" if short_code in _url_loads else "loaded")
+    return await _url_loads.do(short_code, lambda: _load_url_entry(short_code))
+
+
+async def add_clicks(db: AsyncSession, deltas: dict[str, int]) -> None:
+    """Add click counts to many URLs, keyed by short code, in one statement."""
+    if not deltas:
+        return
+    
+    if db.bind.dialect.name == "postgresql":
+        # UPDATE urls ... FROM (VALUES (...), (...)) AS v(short_code, delta)
+        v = values(
+            column("short_code", String),
+            column("delta", Integer),
+            name="v",
+        ).data(list(deltas.items()))
+        await db.execute(
+            update(URL)
+            .where(URL.short_code == v.c.short_code)
+            .values(clicks=URL.clicks + v.c.delta, updated_at=URL.updated_at)
+        )
+    else:
+        # SQLite can't name VALUES columns; fall back to executemany
+        await db.execute(
+            update(URL.__table__)
+            .where(URL.short_code == bindparam("code"))
+            .values(clicks=URL.clicks + bindparam("delta"), updated_at=URL.updated_at),
+            [{"code": code, "delta": delta} for code, delta in deltas.items()],
+        )
 
 
 def build_short_url(short_code: str) -> str:
@@ -0,0 +1,106 @@
+"""
+Streaming sketches for approximate analytics, kept in Redis.
+
+Per URL and UTC day the click ingestor maintains:
+- a HyperLogLog of visitors (`hll:{url_id}:{day}`), keyed by a hash of
+  IP + user agent, so unique visitors over any window is one PFCOUNT
+- a sorted set of referrer counts (`topref:{url_id}:{day}`), trimmed to the
+  top `sketch_top_k` after every batch, so heavy hitters stay bounded in
+  size no matter how many distinct referrers a link sees
+"""
+import hashlib
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from app.config import get_settings
+from app.instrumentation import record_redis_error
+from app.redis_client import redis_manager
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+def visitor_id(ip_address: str | None, user_agent: str | None) -> str | None:
+    """Hash of IP + user agent, so raw IPs never reach Redis."""
+    if not ip_address and not user_agent:
+        return None
+    raw = f"{ip_address or ''}|{user_agent or ''}".encode()
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def _day(value: datetime | None) -> str:
+    value = value or datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).date().isoformat()
+
+
+def _days(days: int) -> list[str]:
+    # Older sketches have expired, so there is nothing to read past the TTL
+    days = max(0, min(days, settings.sketch_ttl_days))
+    today = datetime.now(timezone.utc).date()
+    return [(today - timedelta(days=offset)).isoformat() for offset in range(days + 1)]
+
+
+async def update_sketches(clicks: list[dict]) -> None:
+    """Fold a batch of clicks into the per-day sketches. Best effort: failures are only logged."""
+    redis_client = redis_manager.client
+    if not redis_client or not settings.analytics_sketches_enabled:
+        return
+    
+    visitors = defaultdict(set)
+    referrers = defaultdict(Counter)
+    for click in clicks:
+        key = (click["url_id"], _day(click.get("clicked_at")))
+        visitor = visitor_id(click.get("ip_address"), click.get("user_agent"))
+        if visitor:
+            visitors[key].add(visitor)
+        if click.get("referrer"):
+            referrers[key][click["referrer"]] += 1
+    
+    ttl = settings.sketch_ttl_days * 86400
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for (url_id, day), ids in visitors.items():
+                pipe.pfadd(f"hll:{url_id}:{day}", *ids)
+                pipe.expire(f"hll:{url_id}:{day}", ttl)
+            for (url_id, day), counts in referrers.items():
+                key = f"topref:{url_id}:{day}"
+                for referrer, count in counts.items():
+                    pipe.zincrby(key, count, referrer)
+                # Keep only the heaviest hitters
+                pipe.zremrangebyrank(key, 0, -(settings.sketch_top_k + 1))
+                pipe.expire(key, ttl)
+            await pipe.execute()
+    except Exception as e:
+        record_redis_error("pfadd")
+        logger.warning(f"Failed to update analytics sketches: {e}")
+
+
+async def get_unique_visitors(url_id: int, days: int) -> int | None:
+    """Approximate unique visitors over the past N days, or None without Redis."""
+    redis_client = redis_manager.client
+    if not redis_client or not settings.analytics_sketches_enabled:
+        return None
+    try:
+        return await redis_client.pfcount(*(f"hll:{url_id}:{day}" for day in _days(days)))
+    except Exception as e:
+        record_redis_error("pfcount")
+        logger.warning(f"Unique visitor lookup failed: {e}")
+        return None
+
+
+async def get_top_referrers(url_id: int, days: int, limit: int = 5) -> list[dict] | None:
+    """Approximate top referrers over the past N days, or None without Redis."""
+    redis_client = redis_manager.client
+    if not redis_client or not settings.analytics_sketches_enabled:
+        return None
+    try:
+        merged = await redis_client.zunion([f"topref:{url_id}:{day}" for day in _days(days)], withscores=True)
+    except Exception as e:
+        record_redis_error("zunion")
+        logger.warning(f"Top referrer lookup failed: {e}")
+        return None
+    top = sorted(merged, key=lambda item: item[1], reverse=True)[:limit]
+    return [{"referrer": referrer, "count": int(count)} for referrer, count in top]
@@ -0,0 +1,55 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Sized for `capacity` items at the target `error_rate`. Uses double hashing
+    on a single blake2b digest to derive the k bit positions.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.num_bits / 8))
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def clear(self) -> None:
+        self.bits = bytearray(len(self.bits))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.bits)
+
+    def _fill_ratio(self) -> float:
+        return int.from_bytes(self.bits, "little").bit_count() / self.num_bits
+
+    @property
+    def false_positive_rate(self) -> float:
+        """Current false-positive probability, from the fraction of bits set."""
+        return self._fill_ratio() ** self.num_hashes
+
+    @property
+    def approximate_count(self) -> int:
+        """Estimated number of distinct items added."""
+        fill = self._fill_ratio()
+        if fill >= 1:
+            return self.capacity * 100
+        return round(-self.num_bits / self.num_hashes * math.log(1 - fill))
@@ -0,0 +1,49 @@
+import hashlib
+
+
+def _round(value: int, round_index: int, key: bytes, bits: int) -> int:
+    digest = hashlib.blake2b(
+        value.to_bytes(8, "little") + bytes([round_index]),
+        key=key,
+        digest_size=8,
+    ).digest()
+    return int.from_bytes(digest, "little") & ((1 << bits) - 1)
+
+
+def _feistel(num: int, half_bits: int, key: bytes, rounds: int, reverse: bool) -> int:
+    mask = (1 << half_bits) - 1
+    left, right = num >> half_bits, num & mask
+    order = range(rounds - 1, -1, -1) if reverse else range(rounds)
+    for i in order:
+        if reverse:
+            left, right = right ^ _round(left, i, key, half_bits), left
+        else:
+            left, right = right, left ^ _round(right, i, key, half_bits)
+    return (left << half_bits) | right
+
+
+def _half_bits(domain: int) -> int:
+    return max(1, ((domain - 1).bit_length() + 1) // 2)
+
+
+def permute(num: int, domain: int, key: bytes, rounds: int = 4) -> int:
+    """
+    Keyed bijection of range(domain) onto itself.
+
+    A balanced Feistel network over the smallest even bit width that covers
+    the domain, with cycle walking to stay inside it.
+    """
+    half_bits = _half_bits(domain)
+    while True:
+        num = _feistel(num, half_bits, key, rounds, reverse=False)
+        if num < domain:
+            return num
+
+
+def unpermute(num: int, domain: int, key: bytes, rounds: int = 4) -> int:
+    """Inverse of permute()."""
+    half_bits = _half_bits(domain)
+    while True:
+        num = _feistel(num, half_bits, key, rounds, reverse=True)
+        if num < domain:
+            return num
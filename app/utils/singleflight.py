@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one.
+
+    The first caller starts the work as a task; everyone who asks for that key
+    while it runs awaits the same result (or exception). State is per process,
+    so there is at most one call in flight per key per worker.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._tasks
+
+    async def do(self, key: str, func: Callable[[], Awaitable]):
+        task = self._tasks.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.create_task(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        # Shielded: a caller that goes away doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller was cancelled
+            task.exception()
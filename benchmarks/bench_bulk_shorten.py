@@ -0,0 +1,55 @@
+"""
+Throughput of POST /shorten/bulk against looping over POST /shorten.
+
+    python -m benchmarks.bench_bulk_shorten --urls 5000 --batch 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import asgi_request, connect_redis, create_schema
+
+from app.config import get_settings
+from app.main import app
+
+JSON = [(b"content-type", b"application/json")]
+
+
+async def one_by_one(urls: list[str]) -> float:
+    start = time.perf_counter()
+    for url in urls:
+        status_code, _ = await asgi_request(app, "POST", "/shorten", JSON, json.dumps({"url": url}).encode())
+        assert status_code == 201, status_code
+    return time.perf_counter() - start
+
+
+async def bulk(urls: list[str], batch: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(urls), batch):
+        body = json.dumps([{"url": url} for url in urls[i:i + batch]]).encode()
+        status_code, _ = await asgi_request(app, "POST", "/shorten/bulk", JSON, body)
+        assert status_code == 200, status_code
+    return time.perf_counter() - start
+
+
+async def main(count: int, batch: int) -> None:
+    await connect_redis()
+    # Measure creation cost, not the per-IP limits
+    get_settings().rate_limit_enabled = False
+    await create_schema()
+
+    looped = await one_by_one([f"https://example.com/single/{i}" for i in range(count)])
+    batched = await bulk([f"https://example.com/bulk/{i}" for i in range(count)], batch)
+
+    for label, elapsed in ((f"POST /shorten x{count}", looped), (f"POST /shorten/bulk, batch {batch}", batched)):
+        print(f"{label:<32} {count / elapsed:>10.0f} URLs/s ({elapsed:.2f}s)")
+    print(f"speedup: {looped / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--urls", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.urls, args.batch))
@@ -0,0 +1,122 @@
+"""
+Latency of get_click_analytics on a seeded clicks table, with and without
+the (url_id, clicked_at) index, and from the rollup tables.
+
+    python -m benchmarks.bench_click_analytics --clicks 2000000 --urls 1000
+
+Point DATABASE_URL at Postgres for representative numbers; the SQLite
+default is fine for a quick local comparison.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import create_schema, print_summary, summarize
+
+from sqlalchemy import insert, text
+
+from app.database import AsyncSessionLocal, init_db
+from app.models import URL, Click
+from app.services.analytics import get_click_analytics, get_click_analytics_raw
+from app.services.rollups import apply_rollups
+
+CHUNK = 50_000
+REFERRERS = [None, None, "https://twitter.com", "https://news.ycombinator.com", "https://www.google.com"]
+
+
+def fake_clicks(url_count: int, count: int, days: int, rng: random.Random):
+    now = datetime.now(timezone.utc)
+    for _ in range(count):
+        yield {
+            "url_id": rng.randint(1, url_count),
+            "ip_address": f"10.0.{rng.randint(0, 255)}.{rng.randint(0, 255)}",
+            "user_agent": "bench",
+            "referrer": rng.choice(REFERRERS),
+            "clicked_at": now - timedelta(seconds=rng.randint(0, days * 86400)),
+        }
+
+
+async def seed(url_count: int, click_count: int, days: int) -> None:
+    rng = random.Random(42)
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(URL), [
+            {"short_code": f"b{i:06d}", "original_url": f"https://example.com/{i}"} for i in range(1, url_count + 1)
+        ])
+        await session.commit()
+    
+    # Index dropped while loading, like any bulk load; it's measured separately below
+    await drop_index()
+    clicks = fake_clicks(url_count, click_count, days, rng)
+    written = 0
+    start = time.perf_counter()
+    while written < click_count:
+        chunk = [next(clicks) for _ in range(min(CHUNK, click_count - written))]
+        async with AsyncSessionLocal() as session:
+            if session.bind.dialect.name == "postgresql":
+                await copy_clicks(session, chunk)
+            else:
+                await session.execute(Click.__table__.insert(), chunk)
+            await apply_rollups(session, chunk)
+            await session.commit()
+        written += len(chunk)
+        print(f"\rseeded {written}/{click_count} clicks", end="", flush=True)
+    print(f" in {time.perf_counter() - start:.1f}s")
+
+
+async def copy_clicks(session, chunk: list[dict]) -> None:
+    connection = await session.connection()
+    raw = await connection.get_raw_connection()
+    columns = list(chunk[0])
+    await raw.driver_connection.copy_records_to_table(
+        "clicks", records=[tuple(click[c] for c in columns) for click in chunk], columns=columns,
+    )
+
+
+async def drop_index() -> None:
+    async with init_db().begin() as conn:
+        await conn.execute(text("DROP INDEX IF EXISTS ix_clicks_url_id_clicked_at"))
+
+
+async def create_index() -> None:
+    start = time.perf_counter()
+    async with init_db().begin() as conn:
+        await conn.execute(text("CREATE INDEX ix_clicks_url_id_clicked_at ON clicks (url_id, clicked_at)"))
+        await conn.execute(text("ANALYZE clicks"))
+    print(f"built ix_clicks_url_id_clicked_at in {time.perf_counter() - start:.1f}s")
+
+
+async def measure(name: str, analytics, url_count: int, queries: int, days: int) -> dict:
+    rng = random.Random(7)
+    samples = []
+    async with AsyncSessionLocal() as session:
+        for _ in range(queries):
+            url_id = rng.randint(1, url_count)
+            start = time.perf_counter()
+            await analytics(session, url_id, days)
+            samples.append(time.perf_counter() - start)
+    return summarize(name, samples)
+
+
+async def main(click_count: int, url_count: int, queries: int, days: int) -> None:
+    await create_schema()
+    await seed(url_count, click_count, days)
+    
+    results = [await measure("raw, no index", get_click_analytics_raw, url_count, queries, 7)]
+    await create_index()
+    results.append(await measure("raw, (url_id, clicked_at)", get_click_analytics_raw, url_count, queries, 7))
+    results.append(await measure("rollups", get_click_analytics, url_count, queries, 7))
+    
+    for result in results:
+        print_summary(result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clicks", type=int, default=2_000_000)
+    parser.add_argument("--urls", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--days", type=int, default=90, help="Spread of seeded click timestamps")
+    args = parser.parse_args()
+    asyncio.run(main(args.clicks, args.urls, args.queries, args.days))
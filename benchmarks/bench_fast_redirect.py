@@ -0,0 +1,81 @@
+"""
+Cache-hit redirects per core: the raw ASGI fast path vs the FastAPI route.
+
+Both variants run in this one process (one core) against the same app,
+database and cache. The app is built with FAST_REDIRECT_ENABLED=false, so
+the baseline goes through FastAPI routing and dependency injection; the
+fast variant wraps the same app in FastRedirectMiddleware, as app.main does.
+
+    python -m benchmarks.bench_fast_redirect --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.common import asgi_request, connect_redis, create_schema, print_summary, summarize, write_results
+
+
+async def run(app, paths: list[str], requests: int, concurrency: int) -> tuple[float, list[float]]:
+    """Requests per second over the whole run, and each request's latency."""
+    samples = []
+
+    async def worker(offset: int):
+        for i in range(offset, requests, concurrency):
+            status_code, elapsed = await asgi_request(app, "GET", paths[i % len(paths)])
+            assert status_code == 307, status_code
+            samples.append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    return requests / (time.perf_counter() - start), samples
+
+
+async def main(requests: int, concurrency: int, links: int, output: str | None) -> None:
+    # Before the app (and its settings) is imported
+    os.environ["FAST_REDIRECT_ENABLED"] = "false"
+    from app.config import get_settings
+    from app.database import AsyncSessionLocal
+    from app.fast_redirect import FastRedirectMiddleware
+    from app.main import app
+    from app.services.click_ingestion import click_ingestor
+    from app.services.shortener import create_short_url
+
+    await connect_redis()
+    # Keep the limiter check on the path, but never trip it
+    get_settings().rate_limit_redirect_requests = 10**9
+    await create_schema()
+    await click_ingestor.start()
+
+    async with AsyncSessionLocal() as session:
+        paths = [f"/{(await create_short_url(session, f'https://example.com/{i}')).short_code}" for i in range(links)]
+        await session.commit()
+
+    variants = {"fastapi route": app, "asgi fast path": FastRedirectMiddleware(app, api=app)}
+    # Warm up: fills the cache and builds the middleware stack
+    for variant in variants.values():
+        for path in paths:
+            await asgi_request(variant, "GET", path)
+
+    results = []
+    for name, variant in variants.items():
+        rps, samples = await run(variant, paths, requests, concurrency)
+        result = summarize(name, samples)
+        result["rps"] = round(rps, 1)
+        print_summary(result)
+        results.append(result)
+
+    baseline, fast = results
+    print(f"requests per core: {baseline['rps']:.0f} -> {fast['rps']:.0f} ({fast['rps'] / baseline['rps']:.2f}x)")
+    write_results(output, "fast_redirect", results, requests=requests, concurrency=concurrency, links=links)
+    await click_ingestor.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--links", type=int, default=100)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.links, args.output))
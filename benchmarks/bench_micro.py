@@ -0,0 +1,118 @@
+"""
+Micro-benchmarks for base62, code allocation, serialization and analytics.
+
+Analytics run against a small seeded clicks table.
+
+    python -m benchmarks.bench_micro --output micro.json
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import connect_redis, create_schema, write_results
+
+from sqlalchemy import insert
+
+from app.database import AsyncSessionLocal
+from app.models import Click
+from app.routers.urls import to_url_response
+from app.services.analytics import get_click_analytics, get_click_analytics_raw
+from app.services.cache import deserialize_url, serialize_url
+from app.services.rollups import apply_rollups
+from app.services.shortener import create_short_url, generate_unique_code
+from app.utils.base62 import decode, encode, generate_short_code
+
+
+def report(name: str, per_op: list[float]) -> dict:
+    """Median and best time per operation over the repeats."""
+    result = {
+        "name": name,
+        "ns_per_op": round(statistics.median(per_op) * 1e9, 1),
+        "best_ns_per_op": round(min(per_op) * 1e9, 1),
+    }
+    result["ops_per_sec"] = round(1e9 / result["ns_per_op"]) if result["ns_per_op"] else None
+    print(f"{name:<32} {result['ns_per_op']:>12.1f} ns/op  (best {result['best_ns_per_op']:.1f})")
+    return result
+
+
+def bench(name: str, func, args: list, repeat: int) -> dict:
+    per_op = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            func(arg)
+        per_op.append((time.perf_counter() - start) / len(args))
+    return report(name, per_op)
+
+
+async def bench_async(name: str, func, args: list, repeat: int) -> dict:
+    per_op = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            await func(arg)
+        per_op.append((time.perf_counter() - start) / len(args))
+    return report(name, per_op)
+
+
+async def seed_clicks(url_id: int, count: int) -> None:
+    now = datetime.now(timezone.utc)
+    clicks = [
+        {
+            "url_id": url_id,
+            "ip_address": "10.0.0.1",
+            "user_agent": "bench",
+            "referrer": random.choice([None, "https://twitter.com", "https://www.google.com"]),
+            "clicked_at": now - timedelta(minutes=random.randint(0, 14 * 24 * 60)),
+        }
+        for _ in range(count)
+    ]
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Click), clicks)
+        await apply_rollups(session, clicks)
+        await session.commit()
+
+
+async def main(iterations: int, repeat: int, clicks: int, output: str | None) -> None:
+    random.seed(42)
+    await connect_redis()
+    await create_schema()
+    results = []
+    
+    numbers = [random.randrange(62 ** 7) for _ in range(iterations)]
+    codes = [encode(n) for n in numbers]
+    results.append(bench("base62.encode", encode, numbers, repeat))
+    results.append(bench("base62.decode", decode, codes, repeat))
+    results.append(bench("base62.generate_short_code", lambda _: generate_short_code(), numbers, repeat))
+    
+    async with AsyncSessionLocal() as session:
+        url = await create_short_url(session, "https://example.com/some/long/path?utm_source=bench")
+        await session.commit()
+        results.append(await bench_async(
+            "generate_unique_code", lambda _: generate_unique_code(session), numbers[:1000], repeat,
+        ))
+    
+    results.append(bench("URLResponse.model_dump_json", lambda u: to_url_response(u).model_dump_json(), [url] * iterations, repeat))
+    payload = serialize_url(url)
+    results.append(bench("cache.serialize_url", serialize_url, [url] * iterations, repeat))
+    results.append(bench("cache.deserialize_url", deserialize_url, [payload] * iterations, repeat))
+    
+    await seed_clicks(url.id, clicks)
+    async with AsyncSessionLocal() as session:
+        for name, analytics in (("get_click_analytics", get_click_analytics), ("get_click_analytics_raw", get_click_analytics_raw)):
+            results.append(await bench_async(name, lambda days: analytics(session, url.id, days), [7] * 50, repeat))
+    
+    write_results(output, "micro", results, iterations=iterations, repeat=repeat, clicks=clicks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--clicks", type=int, default=20000, help="Clicks seeded for the analytics benchmarks")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.repeat, args.clicks, args.output))
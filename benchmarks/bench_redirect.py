@@ -0,0 +1,79 @@
+"""
+Redirect latency on a cache hit: the previous path vs the zero-DB fast path.
+
+The previous path looked the link up in Postgres and committed a Click row
+before returning the 307. It is reproduced here as /legacy/{short_code} so
+both paths run against the same app, database and cache.
+
+    python -m benchmarks.bench_redirect --requests 2000
+"""
+import argparse
+import asyncio
+
+from benchmarks.common import asgi_request, connect_redis, create_schema, print_summary, summarize
+
+from fastapi import Depends, Request, status
+from fastapi.responses import RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal, get_db
+from app.main import app
+from app.models.click import Click
+from app.services import cache
+from app.services.click_ingestion import click_ingestor
+from app.services.shortener import create_short_url, get_url_by_code
+
+
+@app.get("/legacy/{short_code}", include_in_schema=False)
+async def legacy_redirect(short_code: str, request: Request, db: AsyncSession = Depends(get_db)):
+    cached = await cache.get_cached_url(short_code)
+    await cache.increment_clicks_cache(short_code)
+    url = await get_url_by_code(db, short_code)
+    db.add(Click(url_id=url.id, ip_address=request.client.host, user_agent=request.headers.get("user-agent")))
+    await db.flush()
+    return RedirectResponse(url=cached["original_url"], status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+
+async def main(requests: int, links: int) -> None:
+    await connect_redis()
+    # Keep the limiter check on the path, but never trip it
+    get_settings().rate_limit_redirect_requests = 10**9
+    await create_schema()
+    await click_ingestor.start()
+
+    codes = []
+    async with AsyncSessionLocal() as session:
+        for i in range(links):
+            url = await create_short_url(session, f"https://example.com/{i}")
+            codes.append(url.short_code)
+        await session.commit()
+        for code in codes:
+            await cache.set_cached_url(await get_url_by_code(session, code))
+
+    # Warm up both paths
+    for code in codes:
+        await asgi_request(app, "GET", f"/{code}")
+        await asgi_request(app, "GET", f"/legacy/{code}")
+
+    results = {}
+    for name, prefix in (("legacy (db lookup + insert)", "/legacy/"), ("fast path (cache only)", "/")):
+        samples = []
+        for i in range(requests):
+            status_code, elapsed = await asgi_request(app, "GET", f"{prefix}{codes[i % links]}")
+            assert status_code == 307, status_code
+            samples.append(elapsed)
+        results[name] = summarize(name, samples)
+        print_summary(results[name])
+
+    legacy, fast = results.values()
+    print(f"p50 speedup: {legacy['p50_ms'] / fast['p50_ms']:.1f}x, p99 speedup: {legacy['p99_ms'] / fast['p99_ms']:.1f}x")
+    await click_ingestor.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--links", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.links))
@@ -0,0 +1,142 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against whatever DATABASE_URL / REDIS_URL point at. When they
+are unset, a throwaway SQLite file and an in-process fakeredis are used so the
+scripts work on a laptop without Docker.
+"""
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+_BENCH_DB = os.path.join(tempfile.gettempdir(), "url_shortener_bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_BENCH_DB}")
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, samples: list[float]) -> dict:
+    """Latency summary in milliseconds."""
+    return {
+        "name": name,
+        "requests": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def print_summary(result: dict) -> None:
+    print(
+        f"{result['name']:<28} n={result['requests']:<6} "
+        f"p50={result['p50_ms']:.3f}ms p95={result['p95_ms']:.3f}ms "
+        f"p99={result['p99_ms']:.3f}ms mean={result['mean_ms']:.3f}ms"
+    )
+
+
+async def connect_redis() -> None:
+    """Connect the app's shared Redis client, or use fakeredis when REDIS_URL is not configured."""
+    from app.redis_client import redis_manager
+
+    if os.environ.get("REDIS_URL"):
+        await redis_manager.start()
+        return
+    import fakeredis
+
+    redis_manager.client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+async def create_schema() -> None:
+    from app.database import Base, init_db
+    import app.models  # noqa: F401
+
+    # Benchmarks drive the app without its lifespan, so set up the engine here
+    async with init_db().begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def asgi_request(app, method: str, path: str, headers: list | None = None, body: bytes = b"") -> tuple[int, float]:
+    """
+    Drive one request through an ASGI app.
+
+    Returns the status code and the time until the final response body was
+    sent, which is what a client observes. Work scheduled after the response
+    (background tasks) is still awaited, but not counted.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")] + (headers or []),
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    status = 0
+    elapsed = 0.0
+    start = time.perf_counter()
+
+    async def send(message):
+        nonlocal status, elapsed
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            elapsed = time.perf_counter() - start
+
+    await app(scope, receive, send)
+    return status, elapsed
+
+
+def environment() -> dict:
+    """Where a result came from, so runs are only compared like for like."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+        "redis": "redis" if os.environ.get("REDIS_URL") else "fakeredis",
+    }
+
+
+def write_results(path: str | None, suite: str, results: list[dict], **params) -> None:
+    """Write a suite's results as JSON, for benchmarks.compare."""
+    if not path:
+        return
+    with open(path, "w") as f:
+        json.dump({"suite": suite, "environment": environment(), "params": params, "results": results}, f, indent=2)
+    print(f"wrote {path}")
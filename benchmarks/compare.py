@@ -0,0 +1,69 @@
+"""
+Compare two benchmark result files written with --output.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+
+Exits with status 1 when any metric regressed by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+# Metric -> True when higher is better
+METRICS = {
+    "ns_per_op": False,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "rps": True,
+}
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[str]:
+    """Print a table of changes and return the regressions beyond threshold percent."""
+    before = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in candidate["results"]:
+        old = before.get(result["name"])
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in result or not old.get(metric):
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = "REGRESSED" if worse > threshold else ""
+            print(f"{result['name']:<32} {metric:<10} {old[metric]:>14} -> {result[metric]:<14} {change:+7.1f}% {flag}")
+            if flag:
+                regressions.append(f"{result['name']} {metric}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+    
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    if baseline["suite"] != candidate["suite"]:
+        sys.exit(f"Can't compare a {baseline['suite']} run with a {candidate['suite']} run")
+    for key in ("database", "redis"):
+        if baseline["environment"].get(key) != candidate["environment"].get(key):
+            print(f"warning: {key} differs ({baseline['environment'].get(key)} vs {candidate['environment'].get(key)})")
+    print(f"{baseline['environment'].get('commit')} -> {candidate['environment'].get('commit')}")
+    
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
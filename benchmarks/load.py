@@ -0,0 +1,133 @@
+"""
+Load harness: a mixed /shorten, /{code}, /analytics workload with Zipfian code popularity.
+
+Requests are driven through the ASGI app in-process by concurrent virtual
+clients, so the numbers measure the app (and its database and Redis), not an
+HTTP server.
+
+    python -m benchmarks.load --requests 20000 --concurrency 32 --output load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from benchmarks.common import asgi_request, connect_redis, create_schema, print_summary, summarize, write_results
+
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.main import app
+from app.models import URL
+from app.services.click_ingestion import click_ingestor
+
+JSON = [(b"content-type", b"application/json")]
+
+
+def zipf_weights(count: int, exponent: float) -> list[float]:
+    """Cumulative weights where the k-th most popular code gets 1/k^exponent."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+async def create_links(count: int) -> list[str]:
+    for start in range(0, count, 1000):
+        body = json.dumps([{"url": f"https://example.com/{i}"} for i in range(start, min(count, start + 1000))]).encode()
+        # Through the app, so Redis is warmed the way the bulk endpoint does it
+        status_code, _ = await asgi_request(app, "POST", "/shorten/bulk", JSON, body)
+        assert status_code == 200, status_code
+    
+    # asgi_request doesn't keep response bodies, so read the codes back
+    async with AsyncSessionLocal() as session:
+        return list((await session.execute(select(URL.short_code).order_by(URL.id))).scalars())
+
+
+async def run(codes: list[str], requests: int, concurrency: int, mix: dict, exponent: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    weights = zipf_weights(len(codes), exponent)
+    # Popularity is independent of creation order
+    ranked = codes[:]
+    rng.shuffle(ranked)
+    
+    kinds = list(mix)
+    plan = rng.choices(kinds, weights=[mix[kind] for kind in kinds], k=requests)
+    targets = rng.choices(ranked, cum_weights=weights, k=requests)
+    samples = {kind: [] for kind in kinds}
+    errors = {kind: 0 for kind in kinds}
+    counter = itertools.count()
+    
+    async def client(worker: int) -> None:
+        while (i := next(counter)) < requests:
+            kind, code = plan[i], targets[i]
+            if kind == "shorten":
+                body = json.dumps({"url": f"https://example.com/load/{worker}/{i}"}).encode()
+                status_code, elapsed = await asgi_request(app, "POST", "/shorten", JSON, body)
+                ok = status_code == 201
+            elif kind == "redirect":
+                status_code, elapsed = await asgi_request(app, "GET", f"/{code}")
+                ok = status_code == 307
+            else:
+                status_code, elapsed = await asgi_request(app, "GET", f"/{code}/analytics")
+                ok = status_code == 200
+            samples[kind].append(elapsed)
+            if not ok:
+                errors[kind] += 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(client(worker) for worker in range(concurrency)))
+    wall = time.perf_counter() - start
+    
+    results = []
+    for kind in kinds:
+        if not samples[kind]:
+            continue
+        result = summarize(kind, samples[kind])
+        result["rps"] = round(len(samples[kind]) / wall, 1)
+        result["errors"] = errors[kind]
+        results.append(result)
+    overall = summarize("overall", [sample for kind in kinds for sample in samples[kind]])
+    overall["rps"] = round(requests / wall, 1)
+    overall["errors"] = sum(errors.values())
+    results.append(overall)
+    return results
+
+
+async def main(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    # Measure the app, not the per-IP limits every virtual client shares
+    settings.rate_limit_enabled = False
+    await connect_redis()
+    await create_schema()
+    await click_ingestor.start()
+    
+    codes = await create_links(args.links)
+    mix = {"shorten": args.shorten, "redirect": args.redirect, "analytics": args.analytics}
+    
+    # Warm-up pass fills L1/Redis the way steady-state traffic would
+    await run(codes, min(args.requests // 10, 2000), args.concurrency, mix, args.zipf, args.seed + 1)
+    results = await run(codes, args.requests, args.concurrency, mix, args.zipf, args.seed)
+    await click_ingestor.stop()
+    
+    for result in results:
+        print_summary(result)
+        print(f"{'':<28} rps={result['rps']} errors={result['errors']}")
+    write_results(
+        args.output, "load", results,
+        requests=args.requests, concurrency=args.concurrency, links=args.links, zipf=args.zipf, mix=mix,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--links", type=int, default=10000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Popularity exponent; higher is more skewed")
+    parser.add_argument("--shorten", type=float, default=0.05, help="Share of /shorten requests")
+    parser.add_argument("--redirect", type=float, default=0.9, help="Share of /{code} requests")
+    parser.add_argument("--analytics", type=float, default=0.05, help="Share of /analytics requests")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -1,10 +1,13 @@
+import fakeredis
 import pytest
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from unittest.mock import AsyncMock, patch
-from app.database import Base, get_db
+from app.database import Base, get_db, get_read_db
 from app.main import app
 from app.models import URL, Click
+from app.services.cache import local_cache
+from app.services.click_ingestion import click_ingestor
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
@@ -22,7 +25,37 @@ async def override_get_db():
             raise
 
 
+async def override_get_read_db():
+    async with TestSessionLocal() as session:
+        yield session
+
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_read_db
+
+
+@pytest.fixture(autouse=True)
+def mock_session_factory():
+    """Point sessions opened outside the request (e.g. click ingestion) at the test DB."""
+    with patch("app.services.click_ingestion.AsyncSessionLocal", TestSessionLocal), \
+            patch("app.services.click_counters.AsyncSessionLocal", TestSessionLocal), \
+            patch("app.services.code_filter.AsyncSessionLocal", TestSessionLocal), \
+            patch("app.services.partitions.AsyncSessionLocal", TestSessionLocal), \
+            patch("app.services.shortener.AsyncSessionLocal", TestSessionLocal), \
+            patch("app.services.cache_warmer.ReadSessionLocal", TestSessionLocal), \
+            patch("app.services.click_export.ReadSessionLocal", TestSessionLocal), \
+            patch("app.services.analytics_cache.AsyncSessionLocal", TestSessionLocal), \
+            patch("app.services.analytics_cache.ReadSessionLocal", TestSessionLocal), \
+            patch("app.routers.urls.ReadSessionLocal", TestSessionLocal):
+        yield
+
+
+@pytest.fixture(autouse=True)
+async def ingestor(setup_database, mock_session_factory):
+    """Run the click ingestion worker as the app lifespan would."""
+    await click_ingestor.start()
+    yield click_ingestor
+    await click_ingestor.stop()
 
 
 @pytest.fixture(autouse=True)
@@ -35,37 +68,24 @@ async def setup_database():
 
 
 @pytest.fixture(autouse=True)
-def mock_redis():
-    """Mock Redis for all tests."""
-    cache_storage = {}
-    
-    async def mock_get(key):
-        return cache_storage.get(key)
-    
-    async def mock_set(key, value, ex=None):
-        cache_storage[key] = value
-    
-    async def mock_delete(key):
-        cache_storage.pop(key, None)
-    
-    async def mock_incr(key):
-        cache_storage[key] = cache_storage.get(key, 0) + 1
-        return cache_storage[key]
-    
-    with patch("app.services.cache.redis_client") as mock_client:
-        mock_client.get = AsyncMock(side_effect=mock_get)
-        mock_client.set = AsyncMock(side_effect=mock_set)
-        mock_client.delete = AsyncMock(side_effect=mock_delete)
-        mock_client.incr = AsyncMock(side_effect=mock_incr)
-        yield mock_client
+async def mock_redis():
+    """In-memory Redis (with Lua support) for all tests."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    local_cache.clear()
+    with patch("app.redis_client.redis_manager.client", client):
+        yield client
+    local_cache.clear()
+    await client.flushall()
+    await client.aclose()
 
 
 @pytest.fixture(autouse=True)
 def mock_rate_limiter():
     """Disable rate limiting for tests."""
-    with patch("app.routers.urls.rate_limit_shorten", new_callable=AsyncMock):
-        with patch("app.routers.urls.rate_limit_by_ip", new_callable=AsyncMock):
-            yield
+    with patch("app.routers.urls.rate_limit_shorten", new_callable=AsyncMock, return_value=None):
+        with patch("app.routers.urls.rate_limit_shorten_bulk", new_callable=AsyncMock, return_value=None):
+            with patch("app.routers.urls.rate_limit_by_ip", new_callable=AsyncMock, return_value=None):
+                yield
 
 
 @pytest.fixture
@@ -0,0 +1,82 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services import analytics_cache
+from app.services.analytics_cache import get_cached_click_analytics, pack_analytics, unpack_analytics
+
+ANALYTICS = {
+    "total_clicks": 3,
+    "daily_clicks": [{"date": "2026-01-01", "clicks": 3}],
+    "top_referrers": [{"referrer": "https://a.com", "count": 2}],
+}
+
+
+@pytest.fixture
+def compute():
+    async def slow_analytics(db, url_id, days):
+        await asyncio.sleep(0.01)
+        return ANALYTICS
+
+    with patch("app.services.analytics_cache.get_click_analytics", AsyncMock(side_effect=slow_analytics)) as mock:
+        yield mock
+
+
+def test_pack_round_trip():
+    analytics, meta = unpack_analytics(pack_analytics(ANALYTICS, "42", 1000))
+    assert analytics == ANALYTICS
+    assert meta["version"] == "42"
+    assert meta["window"] == 1000
+
+
+@pytest.mark.asyncio
+async def test_cached_until_version_changes(mock_redis, compute):
+    assert await get_cached_click_analytics(1, 7, "v1") == (ANALYTICS, "v1")
+    assert await get_cached_click_analytics(1, 7, "v1") == (ANALYTICS, "v1")
+    assert compute.await_count == 1
+
+    # Another window is another key
+    await get_cached_click_analytics(1, 30, "v1")
+    assert compute.await_count == 2
+
+    await get_cached_click_analytics(1, 7, "v2")
+    assert compute.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_bounded_staleness(mock_redis, compute, monkeypatch):
+    monkeypatch.setattr(analytics_cache.settings, "analytics_cache_max_staleness", 60.0)
+    await get_cached_click_analytics(1, 7, "v1")
+
+    # Served with the version it was computed for, so its ETag stays honest
+    assert await get_cached_click_analytics(1, 7, "v2") == (ANALYTICS, "v1")
+    assert compute.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_compute_once(mock_redis, compute):
+    results = await asyncio.gather(*(get_cached_click_analytics(1, 7, "v1") for _ in range(5)))
+    assert results == [(ANALYTICS, "v1")] * 5
+    assert compute.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_no_cache_without_version(mock_redis, compute):
+    await get_cached_click_analytics(1, 7, None)
+    await get_cached_click_analytics(1, 7, None)
+    assert compute.await_count == 2
+    assert await mock_redis.keys("analytics:result:*") == []
+
+
+@pytest.mark.asyncio
+async def test_fresh_version_computed_on_primary(mock_redis, compute):
+    primary, replica = AsyncMock(), AsyncMock()
+    stamp = time.time_ns()
+    with patch("app.services.analytics_cache.AsyncSessionLocal", return_value=primary), \
+            patch("app.services.analytics_cache.ReadSessionLocal", return_value=replica):
+        await get_cached_click_analytics(1, 7, str(stamp))
+        assert primary.__aenter__.await_count == 1
+
+        # Once the replica has had time to catch up it takes the load again
+        await get_cached_click_analytics(1, 7, str(stamp - 60 * 10**9))
+        assert replica.__aenter__.await_count == 1
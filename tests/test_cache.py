@@ -0,0 +1,179 @@
+import asyncio
+import pytest
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from app.models import URL
+from app.services import cache
+from app.services.cache import (
+    LocalCache,
+    InvalidationListener,
+    get_cached_url,
+    set_cached_url,
+    delete_cached_url,
+    cache_ttl,
+    local_cache,
+)
+from app.services.shortener import load_url_entry
+from app.utils.singleflight import SingleFlight
+from tests.conftest import TestSessionLocal
+
+
+def make_url(short_code: str = "abc1234", expires_at=None) -> URL:
+    return URL(id=1, short_code=short_code, original_url="https://example.com", is_active=True, expires_at=expires_at)
+
+
+def test_local_cache_lru_eviction():
+    lru = LocalCache(max_items=2, ttl=60)
+    lru.set("a", 1, size=10)
+    lru.set("b", 2, size=10)
+    lru.get("a")
+    lru.set("c", 3, size=10)
+    
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert lru.evictions == 1
+
+
+def test_local_cache_byte_limit():
+    lru = LocalCache(max_items=100, max_bytes=3 * (cache.ENTRY_OVERHEAD_BYTES + 100), ttl=60)
+    for key in "abcd":
+        lru.set(key, key, size=100)
+    
+    assert len(lru) == 3
+    assert lru.size_bytes <= lru.max_bytes
+    assert lru.get("a") is None
+
+
+def test_local_cache_ttl():
+    lru = LocalCache(ttl=60)
+    with patch("app.services.cache.time.monotonic", return_value=1000.0):
+        lru.set("a", 1, size=10, ttl=5)
+    with patch("app.services.cache.time.monotonic", return_value=1004.0):
+        assert lru.get("a") == 1
+    with patch("app.services.cache.time.monotonic", return_value=1006.0):
+        assert lru.get("a") is None
+    assert lru.stats()["hits"] == 1
+    assert lru.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_l1_serves_hits_without_redis(mock_redis):
+    await set_cached_url(make_url())
+    
+    with patch.object(mock_redis, "get", side_effect=AssertionError("Redis GET on L1 hit")):
+        entry = await get_cached_url("abc1234")
+    assert entry["original_url"] == "https://example.com"
+
+
+@pytest.mark.asyncio
+async def test_l1_populated_from_redis(mock_redis):
+    await set_cached_url(make_url())
+    local_cache.clear()
+    
+    assert await get_cached_url("abc1234") is not None
+    assert local_cache.get("abc1234") is not None
+
+
+@pytest.mark.asyncio
+async def test_l1_ttl_capped_at_expiry(mock_redis):
+    await set_cached_url(make_url(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+    assert local_cache.get("abc1234") is None
+
+
+def test_cache_ttl_is_jittered():
+    ttls = {cache_ttl(None) for _ in range(50)}
+    assert len(ttls) > 1
+    assert all(3240 <= ttl <= 3960 for ttl in ttls)
+
+
+def test_cache_ttl_capped_at_expiry():
+    assert cache_ttl(datetime.now(timezone.utc) + timedelta(seconds=90)) <= 90
+    assert cache_ttl(datetime.now(timezone.utc) - timedelta(seconds=1)) == cache.settings.negative_cache_ttl
+
+
+@pytest.mark.asyncio
+async def test_redis_ttl_capped_at_expiry(mock_redis):
+    await set_cached_url(make_url(expires_at=datetime.now(timezone.utc) + timedelta(seconds=90)))
+    assert 0 < await mock_redis.ttl("url:abc1234") <= 90
+
+
+@pytest.mark.asyncio
+async def test_entry_near_expiry_is_refreshed_early(mock_redis):
+    await set_cached_url(make_url(), expire_seconds=60, load_seconds=0.05)
+    local_cache.clear()
+    
+    assert await get_cached_url("abc1234") is not None
+    # Within a few load times of the end of its TTL, a read is likely reported as a miss
+    results = []
+    with patch("app.services.cache.time.time", return_value=time.time() + 59.99):
+        for _ in range(20):
+            local_cache.clear()
+            results.append(await get_cached_url("abc1234"))
+    assert None in results
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_result_and_errors():
+    flight = SingleFlight()
+    calls = 0
+    
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+    
+    assert await asyncio.gather(*(flight.do("a", load) for _ in range(3))) == [1, 1, 1]
+    assert flight.shared == 2
+    assert "a" not in flight
+    
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+    
+    results = await asyncio.gather(flight.do("b", fail), flight.do("b", fail), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_l1_only_mode_without_redis():
+    with patch("app.redis_client.redis_manager.client", None):
+        await set_cached_url(make_url())
+        assert (await get_cached_url("abc1234"))["id"] == 1
+        await delete_cached_url("abc1234")
+        assert await get_cached_url("abc1234") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers(mock_redis):
+    listener = InvalidationListener()
+    await listener.start()
+    await asyncio.sleep(0.05)
+    
+    # Entry held only in this worker's L1; another worker deactivates the link
+    local_cache.set("abc1234", {"id": 1}, size=10)
+    await mock_redis.publish(cache.INVALIDATION_CHANNEL, "abc1234")
+    for _ in range(50):
+        if local_cache.get("abc1234") is None:
+            break
+        await asyncio.sleep(0.01)
+    
+    assert local_cache.get("abc1234") is None
+    await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_cache_fill_reads_the_primary(mock_redis):
+    async with TestSessionLocal() as session:
+        session.add(URL(short_code="abc1234", original_url="https://example.com", is_active=False))
+        await session.commit()
+    # A replica could still hold the row as active; the fill must not ask it
+    primary = MagicMock(side_effect=TestSessionLocal)
+    
+    with patch("app.services.shortener.AsyncSessionLocal", primary):
+        entry = await load_url_entry("abc1234")
+    
+    assert primary.call_count == 1
+    assert entry["is_active"] is False
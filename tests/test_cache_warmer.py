@@ -0,0 +1,60 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from app.models import URL, ClickHourly
+from app.services.cache import get_local_url, local_cache
+from app.services.cache_warmer import warm_cache
+from app.services.rollups import hour_bucket
+from tests.conftest import TestSessionLocal
+
+
+async def create_links(clicks_by_code: dict[str, int], is_active: bool = True) -> None:
+    bucket = hour_bucket(datetime.now(timezone.utc) - timedelta(hours=1))
+    async with TestSessionLocal() as session:
+        for short_code, clicks in clicks_by_code.items():
+            url = URL(short_code=short_code, original_url=f"https://{short_code}.example.com", is_active=is_active)
+            session.add(url)
+            await session.flush()
+            session.add(ClickHourly(url_id=url.id, bucket=bucket, clicks=clicks))
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_warm_cache_loads_top_links(mock_redis):
+    await create_links({"hot": 50, "warm": 20, "cold": 1})
+    await create_links({"gone": 100}, is_active=False)
+
+    progress = []
+    result = await warm_cache(top_n=2, days=7, batch_size=1, progress=progress.append)
+
+    assert result["warmed"] == 2
+    assert result["complete"]
+    assert progress == [1, 2]
+    assert await mock_redis.exists("url:hot", "url:warm") == 2
+    assert not await mock_redis.exists("url:cold")
+    assert not await mock_redis.exists("url:gone")
+    # Redis only by default
+    assert local_cache.get("hot") is None
+
+
+@pytest.mark.asyncio
+async def test_warm_cache_seeds_l1_up_to_its_limit(mock_redis, monkeypatch):
+    await create_links({"hot": 50, "warm": 20, "cold": 1})
+    monkeypatch.setattr(local_cache, "max_items", 2)
+
+    await warm_cache(top_n=10, days=7, batch_size=2, fill_local=True)
+
+    assert get_local_url("hot")["original_url"] == "https://hot.example.com"
+    assert get_local_url("warm") is not None
+    assert get_local_url("cold") is None
+    assert await mock_redis.exists("url:cold")
+
+
+@pytest.mark.asyncio
+async def test_warm_cache_stops_at_time_budget(mock_redis):
+    await create_links({"hot": 50, "warm": 20, "cold": 1})
+
+    result = await warm_cache(top_n=10, days=7, batch_size=1, time_budget=0)
+
+    assert result == {"warmed": 1, "seconds": result["seconds"], "complete": False}
+    assert await mock_redis.exists("url:hot")
+    assert not await mock_redis.exists("url:warm")
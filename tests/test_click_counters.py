@@ -0,0 +1,156 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import select
+from app.models import URL, ClickFlush
+from app.services.cache import increment_clicks_cache
+from app.services import click_counters
+from app.services.click_counters import (
+    EPOCH_KEY,
+    LOCK_KEY,
+    PENDING_KEY,
+    PENDING_EPOCH_KEY,
+    flush_click_counters,
+    get_total_clicks,
+    get_total_clicks_many,
+)
+from tests.conftest import TestSessionLocal
+
+
+async def create_url(short_code: str) -> URL:
+    async with TestSessionLocal() as session:
+        url = URL(short_code=short_code, original_url="https://example.com", clicks=0)
+        session.add(url)
+        await session.commit()
+        return url
+
+
+async def db_clicks(short_code: str) -> int:
+    async with TestSessionLocal() as session:
+        result = await session.execute(select(URL.clicks).where(URL.short_code == short_code))
+        return result.scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_flush_moves_counters_into_db(mock_redis):
+    await create_url("aaa1111")
+    await create_url("bbb2222")
+    for _ in range(3):
+        await increment_clicks_cache("aaa1111")
+    await increment_clicks_cache("bbb2222")
+    
+    flushed = await flush_click_counters(batch_size=1)
+    
+    assert flushed == 4
+    assert await db_clicks("aaa1111") == 3
+    assert await db_clicks("bbb2222") == 1
+    assert await mock_redis.get("clicks:aaa1111") is None
+    assert await mock_redis.exists(PENDING_KEY) == 0
+
+
+@pytest.mark.asyncio
+async def test_total_clicks_exact_across_flush(mock_redis):
+    url = await create_url("aaa1111")
+    for _ in range(5):
+        await increment_clicks_cache("aaa1111")
+    
+    async with TestSessionLocal() as session:
+        assert await get_total_clicks(session, url) == 5
+    
+    # Counters moved to pending but the DB write fails: still counted once
+    with patch("app.services.click_counters.add_clicks", side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            await flush_click_counters()
+    async with TestSessionLocal() as session:
+        assert await get_total_clicks(session, url) == 5
+    
+    await increment_clicks_cache("aaa1111")
+    await flush_click_counters()
+    async with TestSessionLocal() as session:
+        assert await get_total_clicks(session, url) == 6
+    assert await db_clicks("aaa1111") == 6
+
+
+@pytest.mark.asyncio
+async def test_committed_batch_not_applied_twice(mock_redis):
+    url = await create_url("aaa1111")
+    for _ in range(2):
+        await increment_clicks_cache("aaa1111")
+    
+    # Simulate dying after the commit, before the pending hash is cleared
+    with patch.object(mock_redis, "delete", side_effect=RuntimeError("crash")):
+        with pytest.raises(RuntimeError):
+            await flush_click_counters()
+    assert await mock_redis.exists(PENDING_KEY) == 1
+    
+    async with TestSessionLocal() as session:
+        assert await get_total_clicks(session, url) == 2
+    
+    await flush_click_counters()
+    assert await db_clicks("aaa1111") == 2
+    assert await mock_redis.exists(PENDING_EPOCH_KEY) == 0
+    async with TestSessionLocal() as session:
+        epochs = (await session.execute(select(ClickFlush.epoch))).scalars().all()
+    assert epochs == [1]
+
+
+@pytest.mark.asyncio
+async def test_flush_stops_when_lock_is_lost(mock_redis):
+    await create_url("aaa1111")
+    await create_url("bbb2222")
+    await increment_clicks_cache("aaa1111")
+    await increment_clicks_cache("bbb2222")
+    apply_pending = click_counters._apply_pending
+    
+    async def apply_then_lose_lock(epoch):
+        applied = await apply_pending(epoch)
+        # The lock expired and another worker's flush took it
+        await mock_redis.set(LOCK_KEY, "other-worker")
+        return applied
+    
+    with patch("app.services.click_counters._apply_pending", side_effect=apply_then_lose_lock):
+        flushed = await flush_click_counters(batch_size=1)
+    
+    assert flushed == 1
+    assert len(await mock_redis.keys("clicks:*")) == 1
+    assert await mock_redis.get(LOCK_KEY) == "other-worker"
+
+
+@pytest.mark.asyncio
+async def test_total_clicks_many_matches_single(mock_redis):
+    urls = [await create_url(code) for code in ("aaa1111", "bbb2222", "ccc3333")]
+    for _ in range(3):
+        await increment_clicks_cache("aaa1111")
+    await increment_clicks_cache("bbb2222")
+    await flush_click_counters()
+    await increment_clicks_cache("aaa1111")
+    
+    async with TestSessionLocal() as session:
+        totals = await get_total_clicks_many(session, ["aaa1111", "bbb2222", "ccc3333", "missing"])
+        by_code = {url.short_code: total for url, total in totals}
+        assert by_code == {"aaa1111": 4, "bbb2222": 1, "ccc3333": 0}
+        for url in urls:
+            assert await get_total_clicks(session, url) == by_code[url.short_code]
+
+
+@pytest.mark.asyncio
+async def test_lagging_replica_falls_back_to_primary(mock_redis):
+    url = await create_url("aaa1111")
+    await increment_clicks_cache("aaa1111", amount=2)
+    # A flush the replica hasn't caught up with: the epoch check never passes there
+    await mock_redis.set(EPOCH_KEY, 5)
+    primary = MagicMock(side_effect=TestSessionLocal)
+    
+    with patch("app.services.click_counters.is_replica_session", return_value=True), \
+            patch("app.services.click_counters.AsyncSessionLocal", primary):
+        async with TestSessionLocal() as session:
+            assert await get_total_clicks(session, url, attempts=3) == 2
+            assert primary.call_count == 1
+            totals = await get_total_clicks_many(session, ["aaa1111"], attempts=3)
+            assert primary.call_count == 2
+    assert [total for _, total in totals] == [2]
+
+
+@pytest.mark.asyncio
+async def test_flush_without_redis():
+    with patch("app.redis_client.redis_manager.client", None):
+        assert await flush_click_counters() == 0
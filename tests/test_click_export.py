@@ -0,0 +1,100 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from httpx import AsyncClient
+from app import cli
+from app.models import URL, Click
+from app.services.sketches import visitor_id
+from tests.conftest import TestSessionLocal
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+async def create_clicks(count: int) -> None:
+    async with TestSessionLocal() as session:
+        url = URL(short_code="abc1234", original_url="https://example.com")
+        session.add(url)
+        await session.flush()
+        session.add_all(
+            Click(url_id=url.id, clicked_at=START + timedelta(hours=i), referrer=f"https://ref{i}.com", ip_address="10.0.0.1")
+            for i in range(count)
+        )
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_export_csv(client: AsyncClient):
+    await create_clicks(5)
+
+    with patch("app.routers.urls.settings.click_export_batch_size", 2):
+        response = await client.get("/abc1234/clicks/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="abc1234-clicks.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 5
+    assert rows[0]["referrer"] == "https://ref0.com"
+    assert datetime.fromisoformat(rows[0]["clicked_at"]) == START
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson_time_range(client: AsyncClient):
+    await create_clicks(5)
+
+    response = await client.get(
+        "/abc1234/clicks/export",
+        params={"format": "ndjson", "since": (START + timedelta(hours=1)).isoformat(), "until": (START + timedelta(hours=3)).isoformat()},
+    )
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    clicks = [json.loads(line) for line in response.text.splitlines()]
+    assert [c["referrer"] for c in clicks] == ["https://ref1.com", "https://ref2.com"]
+    # Hashed over HTTP, never the raw IP
+    assert clicks[0]["visitor"] == visitor_id("10.0.0.1", None)
+    assert "ip_address" not in clicks[0]
+
+
+@pytest.mark.asyncio
+async def test_export_gzip(client: AsyncClient):
+    await create_clicks(3)
+
+    response = await client.get("/abc1234/clicks/export", params={"format": "ndjson", "gzip": "true"})
+
+    assert response.headers["content-type"] == "application/gzip"
+    assert len(gzip.decompress(response.content).splitlines()) == 3
+
+
+@pytest.mark.asyncio
+async def test_export_not_found(client: AsyncClient):
+    response = await client.get("/nonexistent/clicks/export")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_cli_export_to_file(tmp_path):
+    await create_clicks(3)
+    output = tmp_path / "clicks.csv.gz"
+    args = cli.build_parser().parse_args(["clicks", "export", "abc1234", "--gzip", "-o", str(output)])
+
+    with patch("app.cli.ReadSessionLocal", TestSessionLocal):
+        await args.handler(args)
+
+    assert len(gzip.decompress(output.read_bytes()).splitlines()) == 4
+
+
+@pytest.mark.asyncio
+async def test_cli_export_with_pii(tmp_path):
+    await create_clicks(1)
+    output = tmp_path / "clicks.csv"
+    args = cli.build_parser().parse_args(["clicks", "export", "abc1234", "--include-pii", "-o", str(output)])
+
+    with patch("app.cli.ReadSessionLocal", TestSessionLocal):
+        await args.handler(args)
+
+    rows = list(csv.DictReader(io.StringIO(output.read_text())))
+    assert rows[0]["ip_address"] == "10.0.0.1"
@@ -0,0 +1,206 @@
+import asyncio
+import fcntl
+import json
+import os
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from app.models import URL, Click
+from app.services.click_ingestion import ClickIngestor
+from tests.conftest import TestSessionLocal
+
+
+async def create_url() -> int:
+    async with TestSessionLocal() as session:
+        url = URL(short_code="abc1234", original_url="https://example.com")
+        session.add(url)
+        await session.commit()
+        return url.id
+
+
+async def count_clicks() -> int:
+    async with TestSessionLocal() as session:
+        return (await session.execute(select(func.count()).select_from(Click))).scalar()
+
+
+def make_click(url_id: int) -> dict:
+    return {
+        "url_id": url_id,
+        "ip_address": "127.0.0.1",
+        "user_agent": "pytest",
+        "referrer": None,
+        "clicked_at": datetime.now(timezone.utc),
+    }
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_batched_rows():
+    url_id = await create_url()
+    ingestor = ClickIngestor(batch_size=3, flush_interval=60)
+    await ingestor.start()
+    
+    for _ in range(7):
+        await ingestor.enqueue(make_click(url_id))
+    await ingestor.flush()
+    
+    assert await count_clicks() == 7
+    assert ingestor.stats()["queued"] == 7
+    assert ingestor.stats()["flushed"] == 7
+    await ingestor.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_queue():
+    url_id = await create_url()
+    ingestor = ClickIngestor(flush_interval=60)
+    await ingestor.start()
+    
+    for _ in range(5):
+        await ingestor.enqueue(make_click(url_id))
+    await ingestor.stop()
+    
+    assert await count_clicks() == 5
+    assert not ingestor.running
+
+
+@pytest.mark.asyncio
+async def test_drop_policy_counts_overflow():
+    url_id = await create_url()
+    ingestor = ClickIngestor(max_size=2, flush_interval=60, overflow_policy="drop")
+    # Not started: nothing consumes the queue
+    ingestor._queue = asyncio.Queue(maxsize=2)
+    
+    for _ in range(5):
+        await ingestor.enqueue(make_click(url_id))
+    
+    assert ingestor.queued == 2
+    assert ingestor.dropped == 3
+
+
+@pytest.mark.asyncio
+async def test_spill_policy_replays_on_start(tmp_path):
+    url_id = await create_url()
+    spill_path = str(tmp_path / "spill.ndjson")
+    ingestor = ClickIngestor(max_size=10, flush_interval=60, overflow_policy="spill", spill_path=spill_path)
+    ingestor._queue = asyncio.Queue(maxsize=1)
+    
+    for _ in range(4):
+        await ingestor.enqueue(make_click(url_id))
+    # Buffered by enqueue, written in one batch by the spill task
+    assert ingestor.spilled == 0
+    await ingestor.flush_overflow()
+    assert ingestor.spilled == 3
+    with open(spill_path) as f:
+        assert len(f.readlines()) == 3
+    
+    ingestor._queue = None
+    await ingestor.start()
+    await ingestor.flush()
+    
+    assert await count_clicks() == 3
+    await ingestor.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_write_is_counted():
+    url_id = await create_url()
+    ingestor = ClickIngestor(flush_interval=60)
+    await ingestor.start()
+    
+    with patch("app.services.click_ingestion.AsyncSessionLocal", side_effect=RuntimeError("db down")):
+        await ingestor.enqueue(make_click(url_id))
+        await ingestor.flush()
+    
+    assert ingestor.failed == 1
+    assert ingestor.flushed == 0
+    await ingestor.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_rollup_writes_no_raw_rows():
+    url_id = await create_url()
+    ingestor = ClickIngestor(flush_interval=60)
+    await ingestor.start()
+    
+    with patch("app.services.click_ingestion.apply_rollups", side_effect=RuntimeError("rollup failed")):
+        await ingestor.enqueue(make_click(url_id))
+        await ingestor.flush()
+    
+    assert await count_clicks() == 0
+    assert ingestor.failed == 1
+    await ingestor.stop()
+
+
+@pytest.mark.asyncio
+async def test_bad_row_is_quarantined_and_good_rows_land(tmp_path):
+    url_id = await create_url()
+    spill_path = str(tmp_path / "spill.ndjson")
+    ingestor = ClickIngestor(flush_interval=60, overflow_policy="spill", spill_path=spill_path)
+    insert_rows = ingestor._insert
+    
+    async def reject_bad_row(batch):
+        # Like a constraint violation: the whole statement fails, on every attempt
+        if any(click["user_agent"] == "bad" for click in batch):
+            raise IntegrityError("INSERT INTO clicks", {}, Exception("violates constraint"))
+        await insert_rows(batch)
+    
+    await ingestor.start()
+    with patch.object(ingestor, "_insert", side_effect=reject_bad_row):
+        for i in range(5):
+            await ingestor.enqueue({**make_click(url_id), "user_agent": "bad" if i == 2 else "pytest"})
+        await ingestor.flush()
+    
+    assert await count_clicks() == 4
+    assert ingestor.quarantined == 1
+    assert ingestor.spilled == 0
+    with open(f"{spill_path}.quarantine") as f:
+        assert len(f.readlines()) == 1
+    await ingestor.stop()
+
+
+@pytest.mark.asyncio
+async def test_spilled_batch_quarantined_after_max_attempts(tmp_path):
+    url_id = await create_url()
+    spill_path = str(tmp_path / "spill.ndjson")
+    ingestor = ClickIngestor(overflow_policy="spill", spill_path=spill_path)
+    batch = [make_click(url_id)]
+    
+    with patch("app.services.click_ingestion.MAX_SPILL_ATTEMPTS", 3), \
+            patch.object(ingestor, "_insert", side_effect=RuntimeError("table missing")):
+        for _ in range(3):
+            await ingestor._write_batch(batch)
+    
+    # Counted once however often it is spilled again
+    assert ingestor.spilled == 1
+    assert ingestor.quarantined == 1
+    with open(spill_path) as f:
+        assert len(f.readlines()) == 2
+
+
+@pytest.mark.asyncio
+async def test_abandoned_replay_resumed_on_start(tmp_path):
+    url_id = await create_url()
+    spill_path = str(tmp_path / "spill.ndjson")
+    lines = [json.dumps({**make_click(url_id), "clicked_at": None}) + "\n" for _ in range(5)]
+    # A worker died after writing the first two spilled clicks
+    abandoned = f"{spill_path}.replay.dead"
+    with open(abandoned, "w") as f:
+        f.writelines(lines)
+    with open(f"{abandoned}.offset", "w") as f:
+        f.write(str(len("".join(lines[:2]))))
+    # One still held by a live worker is left alone
+    busy = f"{spill_path}.replay.busy"
+    with open(busy, "w") as f:
+        f.writelines(lines)
+    
+    ingestor = ClickIngestor(flush_interval=60, overflow_policy="spill", spill_path=spill_path)
+    with open(busy, "rb") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        await ingestor.start()
+        await ingestor.flush()
+    
+    assert await count_clicks() == 3
+    assert sorted(os.listdir(tmp_path)) == ["spill.ndjson.replay.busy"]
+    await ingestor.stop()
@@ -0,0 +1,92 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy import select, func
+from app.models import URL
+from app.services.code_allocator import CounterCodeAllocator, RandomCodeAllocator
+from app.services.shortener import ShortCodeTakenError, create_short_url
+from app.utils.base62 import BASE
+from app.utils.feistel import permute, unpermute
+from tests.conftest import TestSessionLocal
+
+
+def test_permute_is_bijective():
+    key = b"secret"
+    for domain in (1, 62, 1000):
+        image = [permute(i, domain, key) for i in range(domain)]
+        assert sorted(image) == list(range(domain))
+        assert all(unpermute(permute(i, domain, key), domain, key) == i for i in range(domain))
+
+
+def test_counter_encoding_unique_across_lengths():
+    allocator = CounterCodeAllocator(min_length=2, shuffle_key="secret")
+    codes = [allocator.encode_id(i) for i in range(BASE ** 2 + 500)]
+    
+    assert len(set(codes)) == len(codes)
+    assert all(len(code) == 2 for code in codes[:BASE ** 2])
+    assert all(len(code) == 3 for code in codes[BASE ** 2:])
+
+
+def test_counter_encoding_without_shuffle_is_sequential():
+    allocator = CounterCodeAllocator(min_length=7)
+    assert allocator.encode_id(0) == "0000000"
+    assert allocator.encode_id(63) == "0000011"
+
+
+@pytest.mark.asyncio
+async def test_counter_allocator_leases_blocks(mock_redis):
+    allocator = CounterCodeAllocator(backend="redis", block_size=100)
+    async with TestSessionLocal() as session:
+        first = await allocator.allocate(session, 5)
+        second = await allocator.allocate(session, 200)
+    
+    assert len(set(first + second)) == 205
+    # One block of 100, then one lease for the 105 still missing
+    assert int(await mock_redis.get("short_code:counter")) == 205
+
+
+@pytest.mark.asyncio
+async def test_sequence_lease_takes_one_nextval_per_block():
+    db = AsyncMock()
+    db.execute.side_effect = [
+        MagicMock(scalar_one=MagicMock(return_value=100)),  # the sequence's INCREMENT BY
+        [(1,)],
+        [(101,), (201,)],
+    ]
+    allocator = CounterCodeAllocator(backend="postgres", block_size=100)
+    
+    first = await allocator._lease(db, 100)
+    second = await allocator._lease(db, 150)
+    
+    assert first == list(range(1, 101))
+    assert second == list(range(101, 301))
+    assert db.execute.await_args_list[2].args[1] == {"blocks": 2}
+
+
+@pytest.mark.asyncio
+async def test_random_allocation_retries_on_conflict():
+    async with TestSessionLocal() as session:
+        await create_short_url(session, "https://example.com", custom_code="taken12")
+        
+        codes = iter(["taken12", "taken12", "fresh12"])
+        with patch("app.services.code_allocator.generate_short_code", side_effect=lambda length: next(codes)):
+            url = await create_short_url(session, "https://example.org")
+        await session.commit()
+        
+        assert url.short_code == "fresh12"
+        assert (await session.execute(select(func.count()).select_from(URL))).scalar() == 2
+
+
+@pytest.mark.asyncio
+async def test_custom_code_conflict_raises():
+    async with TestSessionLocal() as session:
+        await create_short_url(session, "https://example.com", custom_code="mine123")
+        with pytest.raises(ShortCodeTakenError):
+            await create_short_url(session, "https://example.org", custom_code="mine123")
+
+
+@pytest.mark.asyncio
+async def test_random_allocator_grows_after_repeated_collisions():
+    allocator = RandomCodeAllocator(length=7)
+    async with TestSessionLocal() as session:
+        assert len((await allocator.allocate(session, 1, attempt=0))[0]) == 7
+        assert len((await allocator.allocate(session, 1, attempt=10))[0]) == 8
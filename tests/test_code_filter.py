@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.models import URL
+from app.services.cache import MISSING, InvalidationListener, get_cached_url, announce_new_url, set_cached_urls
+from app.services.code_filter import CodeFilter, rebuild_code_filter
+from app.utils.bloom import BloomFilter
+from tests.conftest import TestSessionLocal
+
+
+def test_bloom_filter_membership():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    codes = [f"code{i}" for i in range(1000)]
+    for code in codes:
+        bloom.add(code)
+    
+    assert all(code in bloom for code in codes)
+    false_positives = sum(f"other{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+    assert 0 < bloom.false_positive_rate < 0.03
+    assert 900 < bloom.approximate_count < 1100
+
+
+def test_bloom_filter_sizing():
+    bloom = BloomFilter(capacity=1_000_000, error_rate=0.001)
+    # ~14.4 bits per item at 0.1%
+    assert 1_700_000 < bloom.size_bytes < 1_900_000
+    assert bloom.num_hashes == 10
+
+
+def test_disabled_filter_allocates_nothing():
+    code_filter = CodeFilter(capacity=1_000_000, error_rate=0.001, enabled=False)
+    code_filter.add("abc1234")
+    
+    assert code_filter.might_exist("abc1234")
+    assert code_filter._bloom is None
+
+
+@pytest.fixture
+def enabled_filter():
+    code_filter = CodeFilter(capacity=1000, error_rate=0.001)
+    # As if the cache listener were subscribed
+    code_filter.listening = True
+    with patch("app.services.code_filter.code_filter", code_filter), \
+            patch("app.services.cache.code_filter", code_filter):
+        yield code_filter
+
+
+@pytest.mark.asyncio
+async def test_rebuild_loads_existing_codes(enabled_filter):
+    async with TestSessionLocal() as session:
+        session.add(URL(short_code="exists1", original_url="https://example.com"))
+        await session.commit()
+    
+    assert enabled_filter.might_exist("unknown")
+    await rebuild_code_filter()
+    
+    assert enabled_filter.ready
+    assert enabled_filter.might_exist("exists1")
+    assert not enabled_filter.might_exist("unknown")
+
+
+@pytest.mark.asyncio
+async def test_filter_off_without_subscription(enabled_filter):
+    enabled_filter.listening = False
+    await rebuild_code_filter()
+    
+    assert not enabled_filter.ready
+    assert enabled_filter.might_exist("unknown")
+
+
+@pytest.mark.asyncio
+async def test_listener_builds_filter_once_subscribed(enabled_filter, mock_redis):
+    enabled_filter.listening = False
+    listener = InvalidationListener()
+    await listener.start()
+    for _ in range(50):
+        if enabled_filter.ready:
+            break
+        await asyncio.sleep(0.01)
+    
+    assert enabled_filter.listening and enabled_filter.ready
+    await listener.stop()
+    assert not enabled_filter.listening
+
+
+@pytest.mark.asyncio
+async def test_unknown_code_answered_from_redis_alone(enabled_filter, mock_redis):
+    await rebuild_code_filter()
+    
+    assert await get_cached_url("unknown") is MISSING
+    assert await mock_redis.exists("url:unknown") == 0
+
+
+@pytest.mark.asyncio
+async def test_code_from_another_worker_found_before_announcement(enabled_filter, mock_redis):
+    await rebuild_code_filter()
+    # Created and cached by another worker; its announcement hasn't arrived
+    await set_cached_urls([URL(id=1, short_code="other12", original_url="https://example.com", is_active=True)])
+    
+    assert not enabled_filter.might_exist("other12")
+    assert (await get_cached_url("other12"))["id"] == 1
+
+
+@pytest.mark.asyncio
+async def test_new_code_added_to_filter(enabled_filter):
+    await rebuild_code_filter()
+    await announce_new_url("fresh12")
+    
+    assert enabled_filter.might_exist("fresh12")
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from unittest.mock import patch
+from app.database import POOL_STATS, InstrumentedPool
+from app.metrics import render_metrics
+
+
+@pytest.mark.asyncio
+async def test_instrumented_pool_records_checkouts_and_timeouts():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///./test.db",
+        poolclass=InstrumentedPool,
+        pool_logging_name="pool-test",
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        # The only connection is checked out, so a second checkout waits and times out
+        with pytest.raises(PoolTimeoutError):
+            async with engine.connect():
+                pass
+    await engine.dispose()
+    
+    stats = POOL_STATS.pop("pool-test")
+    assert stats.checkouts == 2
+    assert stats.timeouts == 1
+    assert stats.max_wait_seconds >= 0.05
+
+
+def test_pool_metrics_are_labelled_by_pool():
+    status = {"primary": {
+        "size": 10, "checked_out": 3, "overflow": 0, "capacity": 30,
+        "checkouts": 42, "timeouts": 0, "wait_seconds": 0.5, "max_wait_seconds": 0.1,
+    }}
+    with patch("app.metrics.pool_status", return_value=status):
+        body = render_metrics()
+    
+    assert 'url_shortener_db_pool_checked_out{pool="primary"} 3' in body
+    assert body.count("# TYPE url_shortener_db_pool_checkouts_total counter") == 1
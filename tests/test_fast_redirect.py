@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi import HTTPException
+from httpx import AsyncClient, ASGITransport
+from app.fast_redirect import FastRedirectMiddleware
+from app.main import app
+from app.services.cache import delete_cached_url
+
+
+class Downstream:
+    """Stands in for the FastAPI app behind the fast path and records what reaches it."""
+
+    def __init__(self):
+        self.paths = []
+
+    async def __call__(self, scope, receive, send):
+        self.paths.append(scope["path"])
+        await send({"type": "http.response.start", "status": 299, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def shorten(client: AsyncClient) -> str:
+    response = await client.post("/shorten", json={"url": "https://www.google.com"})
+    return response.json()["short_code"]
+
+
+@pytest.fixture
+async def fast_client():
+    downstream = Downstream()
+    transport = ASGITransport(app=FastRedirectMiddleware(downstream, api=app))
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c, downstream
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_never_reaches_the_app(client: AsyncClient, fast_client):
+    short_code = await shorten(client)
+    fast, downstream = fast_client
+
+    response = await fast.get(f"/{short_code}", follow_redirects=False)
+
+    assert response.status_code == 307
+    assert response.headers["location"] == "https://www.google.com/"
+    assert downstream.paths == []
+
+
+@pytest.mark.asyncio
+async def test_other_paths_fall_through(fast_client):
+    fast, downstream = fast_client
+
+    for path in ("/", "/health", "/shorten", "/urls", "/docs", "/abc1234/stats"):
+        assert (await fast.get(path)).status_code == 299
+    assert (await fast.post("/abc1234")).status_code == 299
+    assert downstream.paths == ["/", "/health", "/shorten", "/urls", "/docs", "/abc1234/stats", "/abc1234"]
+
+
+@pytest.mark.asyncio
+async def test_cache_miss_falls_through_without_second_lookup(client: AsyncClient):
+    short_code = await shorten(client)
+    await delete_cached_url(short_code)
+
+    with patch("app.routers.urls.rate_limit_by_ip", new_callable=AsyncMock, return_value=None) as rate_limit:
+        response = await client.get(f"/{short_code}", follow_redirects=False)
+
+    assert response.status_code == 307
+    rate_limit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_errors_are_answered_like_fastapi(client: AsyncClient, fast_client):
+    short_code = await shorten(client)
+    await client.delete(f"/{short_code}")
+    # Reloaded into the cache as a deactivated link
+    await client.get(f"/{short_code}")
+    fast, downstream = fast_client
+
+    gone = await fast.get(f"/{short_code}")
+    assert gone.status_code == 410
+    assert gone.json() == {"detail": "URL has been deactivated"}
+
+    limited = HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": "3"})
+    with patch("app.routers.urls.rate_limit_by_ip", new_callable=AsyncMock, side_effect=limited):
+        response = await fast.get(f"/{short_code}")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "3"
+    assert downstream.paths == []
@@ -0,0 +1,89 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from httpx import AsyncClient
+from app.services.http_cache import etag_matches
+
+
+async def shorten(client: AsyncClient, **fields) -> str:
+    response = await client.post("/shorten", json={"url": "https://www.google.com", **fields})
+    assert response.status_code == 201, response.text
+    return response.json()["short_code"]
+
+
+def test_etag_matching():
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"xyz", "abc"', 'W/"abc"')
+    assert etag_matches("*", 'W/"abc"')
+    assert not etag_matches('"xyz"', 'W/"abc"')
+    assert not etag_matches(None, 'W/"abc"')
+
+
+@pytest.mark.asyncio
+async def test_permanent_redirect_is_cacheable(client: AsyncClient):
+    short_code = await shorten(client, redirect_status=308)
+
+    for _ in range(2):  # database, then cache
+        response = await client.get(f"/{short_code}", follow_redirects=False)
+        assert response.status_code == 308
+        assert response.headers["cache-control"] == "public, max-age=86400"
+
+
+@pytest.mark.asyncio
+async def test_permanent_redirect_max_age_capped_at_expiry(client: AsyncClient):
+    expires_at = (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat()
+    short_code = await shorten(client, redirect_status=301, expires_at=expires_at)
+
+    response = await client.get(f"/{short_code}", follow_redirects=False)
+
+    assert response.status_code == 301
+    assert 0 < int(response.headers["cache-control"].split("=")[1]) <= 600
+
+
+@pytest.mark.asyncio
+async def test_temporary_redirect_is_not_cacheable(client: AsyncClient):
+    short_code = await shorten(client)
+
+    response = await client.get(f"/{short_code}", follow_redirects=False)
+
+    assert response.status_code == 307
+    assert "cache-control" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_unsupported_redirect_status_rejected(client: AsyncClient):
+    response = await client.post("/shorten", json={"url": "https://www.google.com", "redirect_status": 302})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_stats_etag(client: AsyncClient):
+    short_code = await shorten(client)
+    first = await client.get(f"/{short_code}/stats")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "public, max-age=5"
+
+    unchanged = await client.get(f"/{short_code}/stats", headers={"if-none-match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["etag"] == etag
+
+    await client.get(f"/{short_code}", follow_redirects=False)
+    changed = await client.get(f"/{short_code}/stats", headers={"if-none-match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["clicks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_analytics_etag_changes_with_ingested_clicks(client: AsyncClient, ingestor):
+    short_code = await shorten(client)
+    etag = (await client.get(f"/{short_code}/analytics")).headers["etag"]
+
+    unchanged = await client.get(f"/{short_code}/analytics", headers={"if-none-match": etag})
+    assert unchanged.status_code == 304
+    other_window = await client.get(f"/{short_code}/analytics?days=30", headers={"if-none-match": etag})
+    assert other_window.status_code == 200
+
+    await client.get(f"/{short_code}", follow_redirects=False)
+    await ingestor.flush()
+    changed = await client.get(f"/{short_code}/analytics", headers={"if-none-match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["total_clicks"] == 1
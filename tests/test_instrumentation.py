@@ -0,0 +1,47 @@
+import pytest
+from httpx import AsyncClient
+from unittest.mock import patch
+from app.instrumentation import Histogram, http_request_duration, redis_errors, timed
+from app.services.cache import get_cached_url
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Test latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, "/x")
+    
+    lines = histogram.render("test")
+    
+    assert 'test_latency_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="/x",le="1.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{route="/x"} 4' in lines
+
+
+def test_timed_is_a_noop_when_disabled():
+    async def lookup():
+        pass
+    
+    with patch("app.instrumentation.ENABLED", False):
+        assert timed("lookup")(lookup) is lookup
+
+
+@pytest.mark.asyncio
+async def test_requests_are_timed_by_route_template(client: AsyncClient):
+    short_code = (await client.post("/shorten", json={"url": "https://www.google.com"})).json()["short_code"]
+    before = http_request_duration.count("GET", "/{short_code}", 307)
+    
+    await client.get(f"/{short_code}", follow_redirects=False)
+    
+    assert http_request_duration.count("GET", "/{short_code}", 307) == before + 1
+    response = await client.get("/metrics")
+    assert 'route="/{short_code}"' in response.text
+    assert "url_shortener_cache_hit_ratio" in response.text
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_are_counted(mock_redis):
+    before = redis_errors.value("get")
+    with patch.object(mock_redis, "get", side_effect=ConnectionError("down")):
+        assert await get_cached_url("abc1234") is None
+    assert redis_errors.value("get") == before + 1
@@ -0,0 +1,42 @@
+import pytest
+from datetime import date
+from app.cli import build_parser
+from app.services.partitions import (
+    PARTITION_NAME,
+    add_months,
+    create_click_partitions,
+    drop_click_partitions,
+    partition_name,
+)
+
+
+def test_add_months_rolls_over_years():
+    assert add_months(date(2026, 11, 1), 1) == date(2026, 12, 1)
+    assert add_months(date(2026, 12, 1), 1) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -13) == date(2024, 12, 1)
+
+
+def test_partition_name_round_trips():
+    name = partition_name(date(2026, 3, 1))
+    assert name == "clicks_y2026m03"
+    assert PARTITION_NAME.match(name).groups() == ("2026", "03")
+    assert PARTITION_NAME.match("clicks_default") is None
+
+
+@pytest.mark.asyncio
+async def test_partition_commands_are_noops_when_not_partitioned():
+    # The test database is SQLite, where clicks is a plain table
+    assert await create_click_partitions(3) == []
+    assert await drop_click_partitions(12) == []
+
+
+@pytest.mark.asyncio
+async def test_prune_requires_a_retention_window():
+    with pytest.raises(ValueError):
+        await drop_click_partitions(0)
+
+
+def test_cli_parses_partition_commands():
+    args = build_parser().parse_args(["partitions", "prune", "--retain-months", "6", "--dry-run"])
+    assert args.retain_months == 6
+    assert args.dry_run
@@ -0,0 +1,124 @@
+import pytest
+from fastapi import HTTPException
+from unittest.mock import patch
+from app.services.rate_limiter import LocalRateLimiter, check_rate_limit
+
+
+@pytest.fixture
+def limiter_redis(mock_redis):
+    # The limiter shares the app's Redis client
+    return mock_redis
+
+
+@pytest.mark.asyncio
+async def test_allows_up_to_limit_then_blocks(limiter_redis):
+    for expected_remaining in (2, 1, 0):
+        result = await check_rate_limit("rate_limit:test", max_requests=3, window_seconds=60)
+        assert result.allowed
+        assert result.remaining == expected_remaining
+    
+    with pytest.raises(HTTPException) as exc:
+        await check_rate_limit("rate_limit:test", max_requests=3, window_seconds=60)
+    assert exc.value.status_code == 429
+    assert exc.value.headers["X-RateLimit-Remaining"] == "0"
+    # One slot frees up every 20 seconds
+    assert 19 <= int(exc.value.headers["Retry-After"]) <= 20
+
+
+@pytest.mark.asyncio
+async def test_single_round_trip_per_check(limiter_redis):
+    with patch.object(limiter_redis, "get", side_effect=AssertionError("separate GET")), \
+            patch.object(limiter_redis, "incr", side_effect=AssertionError("separate INCR")):
+        result = await check_rate_limit("rate_limit:test", max_requests=5, window_seconds=60)
+    assert result.remaining == 4
+    assert result.headers()["X-RateLimit-Limit"] == "5"
+    assert 0 < result.reset_after <= 12
+
+
+@pytest.mark.asyncio
+async def test_keys_are_independent(limiter_redis):
+    await check_rate_limit("rate_limit:a", max_requests=1, window_seconds=60)
+    result = await check_rate_limit("rate_limit:b", max_requests=1, window_seconds=60)
+    assert result.allowed
+
+
+@pytest.mark.asyncio
+async def test_skipped_without_redis():
+    with patch("app.redis_client.redis_manager.client", None):
+        assert await check_rate_limit("rate_limit:test") is None
+
+
+@pytest.fixture
+def fresh_local_limiter():
+    limiter = LocalRateLimiter(max_keys=100)
+    with patch("app.services.rate_limiter.local_limiter", limiter):
+        yield limiter
+
+
+@pytest.mark.asyncio
+async def test_local_mode_needs_no_redis(fresh_local_limiter):
+    with patch("app.redis_client.redis_manager.client", None), \
+            patch("app.services.rate_limiter.settings.rate_limit_mode", "local"):
+        for _ in range(3):
+            await check_rate_limit("rate_limit:test", max_requests=3, window_seconds=60)
+        with pytest.raises(HTTPException):
+            await check_rate_limit("rate_limit:test", max_requests=3, window_seconds=60)
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_fall_back_to_local(limiter_redis, fresh_local_limiter):
+    with patch.object(limiter_redis, "evalsha", side_effect=ConnectionError("down")):
+        for _ in range(2):
+            result = await check_rate_limit("rate_limit:test", max_requests=2, window_seconds=60)
+            assert result.allowed
+        with pytest.raises(HTTPException):
+            await check_rate_limit("rate_limit:test", max_requests=2, window_seconds=60)
+
+
+@pytest.mark.asyncio
+async def test_hybrid_syncs_every_n_requests(limiter_redis, fresh_local_limiter):
+    calls = 0
+    real_evalsha = limiter_redis.evalsha
+    
+    async def counting_evalsha(*args):
+        nonlocal calls
+        calls += 1
+        return await real_evalsha(*args)
+    
+    with patch("app.services.rate_limiter.settings.rate_limit_mode", "hybrid"), \
+            patch("app.services.rate_limiter.settings.rate_limit_sync_every", 5), \
+            patch("app.services.rate_limiter.settings.rate_limit_sync_interval_ms", 60_000), \
+            patch.object(limiter_redis, "evalsha", side_effect=counting_evalsha):
+        for _ in range(11):
+            await check_rate_limit("rate_limit:test", max_requests=100, window_seconds=60)
+    
+    # First request, then after every 5
+    assert calls == 3
+    # All 11 requests reached the shared bucket
+    tat_ms = float(await limiter_redis.get("rate_limit:test"))
+    now_s, now_us = await limiter_redis.time()
+    assert 10 <= round((tat_ms - (now_s * 1000 + now_us / 1000)) / 600) <= 11
+
+
+@pytest.mark.asyncio
+async def test_hybrid_adopts_shared_remaining(limiter_redis, fresh_local_limiter):
+    # Another worker has used up the shared bucket
+    for _ in range(3):
+        await check_rate_limit("rate_limit:test", max_requests=3, window_seconds=60)
+    
+    with patch("app.services.rate_limiter.settings.rate_limit_mode", "hybrid"):
+        await check_rate_limit("rate_limit:test", max_requests=3, window_seconds=60)
+        with pytest.raises(HTTPException):
+            await check_rate_limit("rate_limit:test", max_requests=3, window_seconds=60)
+
+
+def test_local_limiter_evicts_idle_keys():
+    limiter = LocalRateLimiter(max_keys=2)
+    limiter.take("a", 10, 60)
+    limiter.take("b", 10, 60)
+    limiter.take("a", 10, 60)
+    limiter.take("c", 10, 60)
+    
+    assert len(limiter) == 2
+    assert limiter.evictions == 1
+    assert "b" not in limiter._buckets
@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+from redis.exceptions import NoScriptError
+from unittest.mock import AsyncMock, patch
+from app.redis_client import RedisBatch
+
+
+@pytest.mark.asyncio
+async def test_batch_sends_concurrent_commands_in_one_round_trip(mock_redis):
+    await mock_redis.set("a", "1")
+    batch = RedisBatch(mock_redis)
+    
+    value, count = await asyncio.gather(batch.get("a"), batch.incr("b"))
+    
+    assert (value, count) == ("1", 1)
+    assert batch.round_trips == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_errors_only_fail_their_own_command(mock_redis):
+    batch = RedisBatch(mock_redis)
+    
+    results = await asyncio.gather(
+        batch.evalsha("0" * 40, 0),
+        batch.incr("b"),
+        return_exceptions=True,
+    )
+    
+    assert isinstance(results[0], NoScriptError)
+    assert results[1] == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_unknown_commands(mock_redis):
+    with pytest.raises(AttributeError):
+        RedisBatch(mock_redis).not_a_command
+
+
+@pytest.mark.asyncio
+async def test_redirect_counts_l1_hits_inline(client: AsyncClient, mock_redis):
+    short_code = (await client.post("/shorten", json={"url": "https://www.google.com"})).json()["short_code"]
+    await client.get(f"/{short_code}", follow_redirects=False)
+    
+    # Now in L1: the click is counted in the same round trip as the rate-limit check
+    await client.get(f"/{short_code}", follow_redirects=False)
+    assert await mock_redis.get(f"clicks:{short_code}") == "2"
+    
+    limited = HTTPException(status_code=429, detail="Rate limit exceeded")
+    with patch("app.routers.urls.rate_limit_by_ip", new_callable=AsyncMock, side_effect=limited):
+        response = await client.get(f"/{short_code}", follow_redirects=False)
+    assert response.status_code == 429
+    assert await mock_redis.get(f"clicks:{short_code}") == "2"
@@ -0,0 +1,66 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from app.models import URL
+from app.services.analytics import get_click_analytics, get_click_analytics_raw
+from app.services.click_ingestion import ClickIngestor
+from app.services.rollups import aggregate_clicks, hour_bucket
+from tests.conftest import TestSessionLocal
+
+
+async def create_url() -> int:
+    async with TestSessionLocal() as session:
+        url = URL(short_code="abc1234", original_url="https://example.com")
+        session.add(url)
+        await session.commit()
+        return url.id
+
+
+def make_click(url_id: int, clicked_at: datetime, referrer: str | None = None) -> dict:
+    return {
+        "url_id": url_id,
+        "ip_address": "127.0.0.1",
+        "user_agent": "pytest",
+        "referrer": referrer,
+        "clicked_at": clicked_at,
+    }
+
+
+def test_aggregate_clicks_buckets_by_hour_and_referrer():
+    at = datetime(2026, 1, 1, 10, 15, tzinfo=timezone.utc)
+    clicks = [
+        make_click(1, at, "https://a.com"),
+        make_click(1, at + timedelta(minutes=30), "https://a.com"),
+        make_click(1, at + timedelta(hours=1)),
+        make_click(2, at, "https://b.com"),
+    ]
+    
+    hourly, referrers = aggregate_clicks(clicks)
+    
+    assert hourly[(1, hour_bucket(at))] == 2
+    assert hourly[(1, hour_bucket(at + timedelta(hours=1)))] == 1
+    assert hourly[(2, hour_bucket(at))] == 1
+    assert referrers[(1, at.date(), "https://a.com")] == 2
+    assert sum(referrers.values()) == 3
+
+
+@pytest.mark.asyncio
+async def test_rollup_analytics_match_raw():
+    url_id = await create_url()
+    now = datetime.now(timezone.utc)
+    ingestor = ClickIngestor(batch_size=4, flush_interval=60)
+    await ingestor.start()
+    
+    # Spread over several batches so the rollups are upserted repeatedly
+    for i in range(12):
+        referrer = ["https://a.com", "https://b.com", None][i % 3]
+        await ingestor.enqueue(make_click(url_id, now - timedelta(hours=i * 5), referrer))
+    await ingestor.stop()
+    
+    async with TestSessionLocal() as session:
+        rollup = await get_click_analytics(session, url_id, days=7)
+        raw = await get_click_analytics_raw(session, url_id, days=7)
+    
+    assert rollup["total_clicks"] == raw["total_clicks"] == 12
+    assert rollup["daily_clicks"] == raw["daily_clicks"]
+    assert sorted(rollup["top_referrers"], key=lambda r: r["referrer"]) == \
+        sorted(raw["top_referrers"], key=lambda r: r["referrer"])
@@ -0,0 +1,33 @@
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import select, func
+from unittest.mock import patch
+from app import database
+from app.main import app
+from app.models import URL, Click
+from app.server import build_parser
+from app.services.click_ingestion import click_ingestor
+from tests.conftest import TestSessionLocal
+
+
+def test_workers_default_to_web_concurrency():
+    with patch("app.server.settings.web_concurrency", 6):
+        assert build_parser().parse_args([]).workers == 6
+
+
+@pytest.mark.asyncio
+async def test_lifespan_owns_engine_and_drains_clicks():
+    async with TestSessionLocal() as session:
+        url = URL(short_code="abc1234", original_url="https://example.com")
+        session.add(url)
+        await session.commit()
+    
+    async with app.router.lifespan_context(app):
+        assert database.engine is not None
+        assert database.AsyncSessionLocal.kw["bind"] is database.engine
+        await click_ingestor.enqueue({"url_id": url.id, "clicked_at": datetime.now(timezone.utc)})
+    
+    # Shutdown wrote the queued click and released the engine
+    assert database.engine is None
+    async with TestSessionLocal() as session:
+        assert (await session.execute(select(func.count()).select_from(Click))).scalar() == 1
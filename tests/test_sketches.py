@@ -0,0 +1,82 @@
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from httpx import AsyncClient
+from app.services.sketches import get_top_referrers, get_unique_visitors, update_sketches, visitor_id
+
+
+def make_click(ip_address: str, user_agent: str = "pytest", referrer: str | None = None) -> dict:
+    return {
+        "url_id": 1,
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "referrer": referrer,
+        "clicked_at": datetime.now(timezone.utc),
+    }
+
+
+def test_visitor_id_hashes_ip_and_user_agent():
+    assert visitor_id("1.2.3.4", "a") == visitor_id("1.2.3.4", "a")
+    assert visitor_id("1.2.3.4", "a") != visitor_id("1.2.3.4", "b")
+    assert "1.2.3.4" not in visitor_id("1.2.3.4", "a")
+    assert visitor_id(None, None) is None
+
+
+@pytest.mark.asyncio
+async def test_unique_visitors_counts_distinct_visitors():
+    await update_sketches([make_click("10.0.0.1"), make_click("10.0.0.1"), make_click("10.0.0.2")])
+    await update_sketches([make_click("10.0.0.2"), make_click("10.0.0.2", user_agent="curl")])
+    
+    assert await get_unique_visitors(1, days=7) == 3
+    assert await get_unique_visitors(2, days=7) == 0
+
+
+@pytest.mark.asyncio
+async def test_top_referrers_keeps_heaviest_hitters():
+    clicks = [make_click("10.0.0.1", referrer="https://a.com")] * 5
+    clicks += [make_click("10.0.0.1", referrer="https://b.com")] * 3
+    clicks += [make_click("10.0.0.1", referrer=f"https://tail{i}.com") for i in range(10)]
+    
+    with patch("app.services.sketches.settings.sketch_top_k", 3):
+        await update_sketches(clicks)
+    
+    top = await get_top_referrers(1, days=7, limit=5)
+    assert len(top) == 3
+    assert top[:2] == [
+        {"referrer": "https://a.com", "count": 5},
+        {"referrer": "https://b.com", "count": 3},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_analytics_reports_approximate_figures(client: AsyncClient, ingestor):
+    create_response = await client.post("/shorten", json={"url": "https://www.google.com"})
+    short_code = create_response.json()["short_code"]
+    
+    for agent in ("a", "b", "b"):
+        await client.get(f"/{short_code}", follow_redirects=False, headers={"user-agent": agent, "referer": "https://x.com"})
+    await ingestor.flush()
+    
+    data = (await client.get(f"/{short_code}/analytics", params={"approximate": True})).json()
+    assert data["unique_visitors"] == 2
+    assert data["approximate"] is True
+    assert data["top_referrers"] == [{"referrer": "https://x.com", "count": 3}]
+
+
+@pytest.mark.asyncio
+async def test_sketch_reads_capped_at_retention(mock_redis):
+    with patch("app.services.sketches.settings.sketch_ttl_days", 30), \
+            patch.object(mock_redis, "pfcount", wraps=mock_redis.pfcount) as pfcount:
+        await get_unique_visitors(1, days=300)
+    
+    assert len(pfcount.call_args.args) == 31
+
+
+@pytest.mark.asyncio
+async def test_analytics_days_bounded(client: AsyncClient):
+    create_response = await client.post("/shorten", json={"url": "https://www.google.com"})
+    short_code = create_response.json()["short_code"]
+    
+    for days in (0, 3000):
+        response = await client.get(f"/{short_code}/analytics", params={"days": days})
+        assert response.status_code == 422
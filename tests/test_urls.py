@@ -1,5 +1,17 @@
+import asyncio
+import base64
+import json
 import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
 from httpx import AsyncClient
+from app.main import app
+from app.schemas.url import RESERVED_CODES
+from app.services import cache, shortener
+from app.services.shortener import add_clicks
+from app.services.cache import delete_cached_url
+from app.services.rate_limiter import RateLimitResult
+from tests.conftest import TestSessionLocal
 
 
 @pytest.mark.asyncio
@@ -45,6 +57,24 @@ async def test_shorten_url_duplicate_custom_code(client: AsyncClient):
     assert response.json()["detail"] == "Custom code already in use"
 
 
+@pytest.mark.asyncio
+async def test_shorten_url_reserved_custom_code(client: AsyncClient):
+    for code in ("urls", "metrics"):
+        response = await client.post(
+            "/shorten",
+            json={"url": "https://www.github.com", "custom_code": code}
+        )
+        assert response.status_code == 422
+
+
+def test_reserved_codes_cover_static_routes():
+    static = {
+        route.path[1:] for route in app.routes
+        if "{" not in route.path and route.path.count("/") == 1 and route.path != "/"
+    }
+    assert static <= RESERVED_CODES
+
+
 @pytest.mark.asyncio
 async def test_shorten_url_invalid_url(client: AsyncClient):
     response = await client.post(
@@ -155,7 +185,305 @@ async def test_deactivate_url(client: AsyncClient):
     assert stats_response.json()["is_active"] is False
 
 
+@pytest.mark.asyncio
+async def test_deactivate_caches_committed_state(client: AsyncClient, mock_redis):
+    short_code = (await client.post("/shorten", json={"url": "https://www.google.com"})).json()["short_code"]
+    replace_cached_url = cache.replace_cached_url
+    
+    async def check_committed(url):
+        # The cache only changes once the deactivation is visible to other sessions
+        async with TestSessionLocal() as session:
+            assert (await shortener.get_url_by_code(session, short_code)).is_active is False
+        await replace_cached_url(url)
+    
+    with patch("app.routers.urls.replace_cached_url", side_effect=check_committed):
+        assert (await client.delete(f"/{short_code}")).status_code == 204
+    
+    # Overwritten, not deleted: a miss can't reload the active row
+    assert json.loads(await mock_redis.get(f"url:{short_code}"))["is_active"] is False
+
+
 @pytest.mark.asyncio
 async def test_deactivate_not_found(client: AsyncClient):
     response = await client.delete("/nonexistent")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_redirect_records_click(client: AsyncClient, ingestor):
+    create_response = await client.post(
+        "/shorten",
+        json={"url": "https://www.google.com"}
+    )
+    short_code = create_response.json()["short_code"]
+    
+    await client.get(f"/{short_code}", follow_redirects=False)
+    await client.get(f"/{short_code}", follow_redirects=False, headers={"referer": "https://twitter.com"})
+    await ingestor.flush()
+    
+    response = await client.get(f"/{short_code}/analytics")
+    data = response.json()
+    assert data["total_clicks"] == 2
+    assert data["top_referrers"] == [{"referrer": "https://twitter.com", "count": 1}]
+
+
+@pytest.mark.asyncio
+async def test_redirect_cache_hit_skips_database(client: AsyncClient):
+    create_response = await client.post(
+        "/shorten",
+        json={"url": "https://www.google.com"}
+    )
+    short_code = create_response.json()["short_code"]
+    
+    with patch("app.services.shortener.get_url_by_code", new_callable=AsyncMock) as mock_lookup:
+        response = await client.get(f"/{short_code}", follow_redirects=False)
+    
+    assert response.status_code == 307
+    assert response.headers["location"] == "https://www.google.com/"
+    mock_lookup.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_redirect_cached_expired(client: AsyncClient):
+    create_response = await client.post(
+        "/shorten",
+        json={"url": "https://www.google.com", "expires_at": "2020-01-01T00:00:00Z"}
+    )
+    short_code = create_response.json()["short_code"]
+    
+    response = await client.get(f"/{short_code}", follow_redirects=False)
+    assert response.status_code == 410
+    assert response.json()["detail"] == "URL has expired"
+
+
+@pytest.mark.asyncio
+async def test_redirect_not_found_is_negatively_cached(client: AsyncClient):
+    await client.get("/nonexistent", follow_redirects=False)
+    
+    with patch("app.services.shortener.get_url_by_code", new_callable=AsyncMock) as mock_lookup:
+        response = await client.get("/nonexistent", follow_redirects=False)
+    
+    assert response.status_code == 404
+    mock_lookup.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_redirect_misses_share_one_load(client: AsyncClient):
+    create_response = await client.post(
+        "/shorten",
+        json={"url": "https://www.google.com"}
+    )
+    short_code = create_response.json()["short_code"]
+    await delete_cached_url(short_code)
+    
+    lookup = AsyncMock(wraps=shortener.get_url_by_code)
+    with patch("app.services.shortener.get_url_by_code", lookup):
+        responses = await asyncio.gather(*(
+            client.get(f"/{short_code}", follow_redirects=False) for _ in range(5)
+        ))
+    
+    assert [r.status_code for r in responses] == [307] * 5
+    assert lookup.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_custom_code_clears_negative_cache(client: AsyncClient):
+    await client.get("/latecode", follow_redirects=False)
+    await client.post(
+        "/shorten",
+        json={"url": "https://www.github.com", "custom_code": "latecode"}
+    )
+    
+    response = await client.get("/latecode", follow_redirects=False)
+    assert response.status_code == 307
+
+
+@pytest.mark.asyncio
+async def test_health_and_metrics(client: AsyncClient):
+    response = await client.get("/health")
+    assert response.json() == {"status": "healthy"}
+    
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert "url_shortener_l1_cache_hits_total" in response.text
+
+
+@pytest.mark.asyncio
+async def test_bulk_shorten_json(client: AsyncClient):
+    await client.post(
+        "/shorten",
+        json={"url": "https://www.google.com", "custom_code": "taken"}
+    )
+    
+    response = await client.post(
+        "/shorten/bulk",
+        json=[
+            {"url": "https://www.google.com"},
+            {"url": "https://www.github.com", "custom_code": "bulkcode"},
+            {"url": "https://www.github.com", "custom_code": "taken"},
+            {"url": "not-a-valid-url"},
+            {"url": "https://www.python.org", "custom_code": "bulkcode"},
+        ]
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert data["failed"] == 3
+    
+    results = data["results"]
+    assert results[0]["url"]["original_url"] == "https://www.google.com/"
+    assert results[1]["url"]["short_code"] == "bulkcode"
+    assert results[2]["error"] == "Custom code already in use"
+    assert results[3]["error"].startswith("url:")
+    assert results[4]["error"] == "Custom code already in use"
+    
+    # Created links are cached and redirect
+    redirect = await client.get("/bulkcode", follow_redirects=False)
+    assert redirect.status_code == 307
+
+
+@pytest.mark.asyncio
+async def test_bulk_shorten_ndjson(client: AsyncClient):
+    body = "\n".join(f'{{"url": "https://example.com/{i}"}}' for i in range(50)) + "\n"
+    response = await client.post(
+        "/shorten/bulk",
+        content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 50
+    assert len({r["url"]["short_code"] for r in data["results"]}) == 50
+
+
+@pytest.mark.asyncio
+async def test_bulk_shorten_limits(client: AsyncClient):
+    with patch("app.routers.urls.settings.bulk_shorten_max_items", 2):
+        response = await client.post(
+            "/shorten/bulk",
+            json=[{"url": "https://example.com"}] * 3
+        )
+    assert response.status_code == 413
+    
+    response = await client.post("/shorten/bulk", json={"url": "https://example.com"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_redirect_rate_limit_headers(client: AsyncClient):
+    create_response = await client.post(
+        "/shorten",
+        json={"url": "https://www.google.com"}
+    )
+    short_code = create_response.json()["short_code"]
+    
+    result = RateLimitResult(allowed=True, limit=10, remaining=7, retry_after=0, reset_after=18.2)
+    with patch("app.routers.urls.rate_limit_by_ip", new_callable=AsyncMock, return_value=result):
+        response = await client.get(f"/{short_code}", follow_redirects=False)
+    
+    assert response.headers["x-ratelimit-limit"] == "10"
+    assert response.headers["x-ratelimit-remaining"] == "7"
+    assert response.headers["x-ratelimit-reset"] == "19"
+
+
+@pytest.mark.asyncio
+async def test_batch_stats(client: AsyncClient):
+    codes = []
+    for i in range(3):
+        response = await client.post("/shorten", json={"url": f"https://example.com/{i}"})
+        codes.append(response.json()["short_code"])
+    await client.get(f"/{codes[1]}", follow_redirects=False)
+    
+    with patch("app.routers.urls.settings.stats_batch_chunk_size", 2):
+        response = await client.post("/stats/batch", json={"short_codes": [codes[2], "nonexistent", codes[1], codes[0], codes[2]]})
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["short_code"] for r in data["results"]] == [codes[2], codes[1], codes[0]]
+    assert [r["clicks"] for r in data["results"]] == [0, 1, 0]
+    assert data["not_found"] == ["nonexistent"]
+
+
+@pytest.mark.asyncio
+async def test_batch_stats_streams_ndjson(client: AsyncClient):
+    create_response = await client.post("/shorten", json={"url": "https://www.google.com"})
+    short_code = create_response.json()["short_code"]
+    
+    response = await client.post(
+        "/stats/batch",
+        json={"short_codes": [short_code, "nonexistent"]},
+        headers={"accept": "application/x-ndjson"},
+    )
+    
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["short_code"] == short_code
+    assert lines[0]["original_url"] == "https://www.google.com/"
+    assert lines[1] == {"short_code": "nonexistent", "error": "URL not found"}
+
+
+@pytest.mark.asyncio
+async def test_batch_stats_limit(client: AsyncClient):
+    with patch("app.routers.urls.settings.stats_batch_max_codes", 2):
+        response = await client.post("/stats/batch", json={"short_codes": ["a", "b", "c"]})
+    assert response.status_code == 413
+
+
+async def list_all(client: AsyncClient, **params) -> list[dict]:
+    items, cursor = [], None
+    while True:
+        page = (await client.get("/urls", params={**params, **({"cursor": cursor} if cursor else {})})).json()
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+@pytest.mark.asyncio
+async def test_list_urls_keyset_pages(client: AsyncClient):
+    codes = []
+    for i in range(5):
+        response = await client.post("/shorten", json={"url": f"https://example.com/{i}"})
+        codes.append(response.json()["short_code"])
+    await client.delete(f"/{codes[0]}")
+    
+    first = (await client.get("/urls", params={"limit": 2})).json()
+    assert len(first["items"]) == 2
+    assert first["next_cursor"]
+    
+    # Newest first, every link exactly once
+    assert [item["short_code"] for item in await list_all(client, limit=2)] == codes[::-1]
+    assert [item["short_code"] for item in await list_all(client, limit=2, is_active="false")] == [codes[0]]
+
+
+@pytest.mark.asyncio
+async def test_list_urls_by_clicks_and_expiry(client: AsyncClient):
+    expires_at = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    await client.post("/shorten", json={"url": "https://example.com/a", "custom_code": "linka", "expires_at": expires_at})
+    await client.post("/shorten", json={"url": "https://example.com/b", "custom_code": "linkb"})
+    await client.post("/shorten", json={"url": "https://example.com/c", "custom_code": "linkc"})
+    async with TestSessionLocal() as session:
+        await add_clicks(session, {"linka": 5, "linkb": 9})
+        await session.commit()
+    
+    by_clicks = await list_all(client, limit=1, sort="clicks")
+    assert [item["short_code"] for item in by_clicks] == ["linkb", "linka", "linkc"]
+    
+    await client.delete("/linkb")
+    active_by_clicks = await list_all(client, limit=1, sort="clicks", is_active="true")
+    assert [item["short_code"] for item in active_by_clicks] == ["linka", "linkc"]
+    
+    before = (datetime.now(timezone.utc) + timedelta(days=2)).isoformat()
+    expiring = await list_all(client, expires_before=before)
+    assert [item["short_code"] for item in expiring] == ["linka"]
+
+
+@pytest.mark.asyncio
+async def test_list_urls_rejects_bad_cursor(client: AsyncClient):
+    for i in range(2):
+        await client.post("/shorten", json={"url": f"https://example.com/{i}"})
+    cursor = (await client.get("/urls", params={"limit": 1})).json()["next_cursor"]
+    
+    assert (await client.get("/urls", params={"cursor": "garbage"})).status_code == 400
+    assert (await client.get("/urls", params={"cursor": cursor, "sort": "clicks"})).status_code == 400
+    
+    forged = base64.urlsafe_b64encode(b'["clicks","abc",1]').decode()
+    assert (await client.get("/urls", params={"cursor": forged, "sort": "clicks"})).status_code == 400